@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+"""
+End-to-end benchmark of the installer, with real pip, startproject and
+migrate runs against a local package index
+
+The wheels are served from a wheelhouse directory, built once (network
+access required) with ``--build-wheelhouse`` from the versions and hashes
+pinned in ``benchmarks/wheelhouse.txt``, which the benchmark needs for its
+results to be comparable::
+
+    python benchmarks/e2e.py --wheelhouse ~/wheelhouse --build-wheelhouse
+    python benchmarks/e2e.py --wheelhouse ~/wheelhouse --runs 5 --output .benchmarks/e2e.json
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import warnings
+from collections import OrderedDict
+from timeit import default_timer
+
+from six.moves import BaseHTTPServer, SimpleHTTPServer
+from six.moves.urllib.request import pathname2url
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, REPOSITORY_DIR)
+
+from djangocms_installer.config import specifiers  # NOQA
+
+import results  # NOQA
+
+# Pinned versions and hashes of the wheelhouse packages
+WHEELHOUSE_LOCK = os.path.join(BENCHMARKS_DIR, 'wheelhouse.txt')
+PROJECT_ARGS = ['-q', '-u', '--db=sqlite://localhost/project.db', '-len', '--timezone=UTC']
+# Installation scenarios: options given to the installer, whether the virtualenv
+# already contains the project requirements and whether the caches are warm
+SCENARIOS = OrderedDict([
+    ('cold', {'args': [], 'installed': False, 'warm': False}),
+    ('warm', {'args': [], 'installed': False, 'warm': True}),
+    ('no-deps', {'args': ['--no-deps'], 'installed': True, 'warm': False}),
+    ('no-sync', {'args': ['--no-sync'], 'installed': False, 'warm': False}),
+])
+# Runs the installer in the virtualenv, recording the duration of its stages
+DRIVER = (
+    'import sys; sys.path.insert(0, {0!r}); import e2e; e2e.drive(sys.argv[1], sys.argv[2:])'
+).format(BENCHMARKS_DIR)
+
+
+def installer_requirements():
+    """
+    Returns the requirements of the installer itself
+    """
+    with open(os.path.join(REPOSITORY_DIR, 'requirements.txt')) as fd:
+        requirements = [line.strip() for line in fd if line.strip()]
+    # pip is in the virtualenv, argparse in the standard library
+    return [line for line in requirements
+            if specifiers.canonical_name(specifiers.parse_requirement(line)[0])
+            not in ('pip', 'argparse')]
+
+
+def project_requirements(args):
+    """
+    Returns the requirements the installer would install for the options
+    """
+    from djangocms_installer import config
+
+    directory = tempfile.mkdtemp(prefix='djangocms-installer-e2e-')
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            config_data = config.parse(args + ['-p', directory, 'example_prj'])
+    finally:
+        shutil.rmtree(directory, True)
+    return config_data.requirements.split()
+
+
+def locked_versions(lock=WHEELHOUSE_LOCK):
+    """
+    Returns the versions pinned in the lock file
+
+    :return: dictionary of the canonical project names and their versions
+    """
+    versions = {}
+    with open(lock) as fd:
+        for line in fd:
+            if line.strip() and not line[0].isspace() and not line.startswith('#'):
+                name, version = line.split('\\')[0].strip().split('==')
+                versions[specifiers.canonical_name(name)] = version
+    return versions
+
+
+def unlocked_requirements(requirements, lock=WHEELHOUSE_LOCK):
+    """
+    Returns the requirements whose project is not pinned in the lock file
+    """
+    versions = locked_versions(lock)
+    return [requirement for requirement in requirements
+            if specifiers.canonical_name(specifiers.parse_requirement(requirement)[0])
+            not in versions]
+
+
+def build_wheelhouse(wheelhouse, lock=WHEELHOUSE_LOCK):
+    """
+    Download and build the wheels of the versions pinned in the lock file,
+    checking the hashes of the downloaded files
+    """
+    subprocess.check_call([
+        sys.executable, '-m', 'pip', 'wheel', '-q', '--require-hashes', '--wheel-dir', wheelhouse,
+        '-r', lock,
+    ])
+
+
+def build_index(wheelhouse, directory):
+    """
+    Build a PEP 503 simple index of the wheels in the wheelhouse
+
+    :param wheelhouse: directory containing the wheels
+    :param directory: index root, the index is in its ``simple`` directory
+    :return: index directory
+    """
+    index = os.path.join(directory, 'simple')
+    projects = {}
+    for path in sorted(glob.glob(os.path.join(wheelhouse, '*.whl'))):
+        name = specifiers.canonical_name(os.path.basename(path).split('-')[0])
+        projects.setdefault(name, []).append(path)
+    for name, paths in projects.items():
+        os.makedirs(os.path.join(index, name))
+        links = []
+        for path in paths:
+            filename = os.path.basename(path)
+            # Links are relative: the same index is used as a file:// URL and over HTTP
+            os.symlink(os.path.abspath(path), os.path.join(index, name, filename))
+            links.append('<a href="{0}">{0}</a><br>'.format(filename))
+        with open(os.path.join(index, name, 'index.html'), 'w') as fd:
+            fd.write('<html><body>\n{0}\n</body></html>\n'.format('\n'.join(links)))
+    with open(os.path.join(index, 'index.html'), 'w') as fd:
+        fd.write('<html><body>\n{0}\n</body></html>\n'.format('\n'.join(
+            '<a href="{0}/">{0}</a><br>'.format(name) for name in sorted(projects)
+        )))
+    return index
+
+
+def serve_index(index):
+    """
+    Serve the index on a loopback HTTP port, in a daemon thread
+
+    :return: tuple of the server and of the index URL
+    """
+    class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+        def translate_path(self, path):
+            path = SimpleHTTPServer.SimpleHTTPRequestHandler.translate_path(self, path)
+            return os.path.join(index, os.path.relpath(path, os.getcwd()))
+
+        def log_message(self, *args):
+            pass
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+
+
+def create_virtualenv(directory):
+    """
+    Create a virtualenv with pip, without network access
+
+    :return: path of the virtualenv python
+    """
+    try:
+        import venv  # NOQA
+        command = [sys.executable, '-m', 'venv', directory]
+    except ImportError:  # pragma: no cover
+        command = [sys.executable, '-m', 'virtualenv', '-q', directory]
+    subprocess.check_call(command)
+    return os.path.join(directory, 'bin', 'python')
+
+
+def environment(virtualenv, index_url):
+    """
+    Returns the environment of the installer: the virtualenv comes first in
+    the path and pip only uses the local index
+    """
+    env = dict(
+        (key, value) for key, value in os.environ.items()
+        if not key.startswith(('PIP_', 'DJANGOCMS_INSTALLER_', 'PYTHON'))
+    )
+    env.update({
+        'PATH': os.pathsep.join([os.path.join(virtualenv, 'bin'), env.get('PATH', '')]),
+        'PYTHONPATH': REPOSITORY_DIR,
+        'PIP_INDEX_URL': index_url,
+        'PIP_CONFIG_FILE': os.devnull,
+        'PIP_DISABLE_PIP_VERSION_CHECK': '1',
+    })
+    return dict((str(key), str(value)) for key, value in env.items())
+
+
+def drive(output, args):
+    """
+    Run the installer with the arguments, writing the duration of the whole
+    run and of its stages, and the failed stage if any, to the output file
+    """
+    from djangocms_installer import main, stages
+
+    run_stage = stages._run_stage
+    measures = {'stages': [], 'stage': None, 'error': None}
+
+    def timed_stage(config_data, name, function):
+        start = default_timer()
+        measures['stage'] = name
+        outputs = run_stage(config_data, name, function)
+        measures['stages'].append({'name': name, 'duration': default_timer() - start})
+        measures['stage'] = None
+        return outputs
+
+    stages._run_stage = timed_stage
+    sys.argv = ['djangocms'] + args
+    start = default_timer()
+    try:
+        main.execute()
+    except BaseException as e:
+        measures['error'] = repr(e)
+        raise
+    finally:
+        measures['total'] = default_timer() - start
+        with open(output, 'w') as fd:
+            json.dump(measures, fd)
+
+
+class Benchmark(object):
+    """
+    Runs the installation scenarios in throwaway virtualenvs, project and
+    cache directories
+    """
+
+    def __init__(self, workdir, index_url, options=()):
+        self.workdir = workdir
+        self.index_url = index_url
+        self.options = PROJECT_ARGS + list(options)
+        self.counter = 0
+
+    def path(self, prefix):
+        self.counter += 1
+        return os.path.join(self.workdir, '{0}-{1}'.format(prefix, self.counter))
+
+    def virtualenv(self, requirements):
+        """
+        Create a virtualenv and install the requirements, returning its path
+        """
+        directory = self.path('venv')
+        create_virtualenv(directory)
+        subprocess.check_call(
+            [os.path.join(directory, 'bin', 'pip'), 'install', '-q'] + requirements,
+            env=environment(directory, self.index_url)
+        )
+        return directory
+
+    def start(self, virtualenv, cache_dir, args):
+        """
+        Start the creation of a project in the background
+
+        :return: running installation, to be given to ``finish``
+        """
+        name = self.path('run')
+        command = [os.path.join(virtualenv, 'bin', 'python'), '-c', DRIVER, name + '.json']
+        command += self.options + ['--cache-dir', cache_dir] + args
+        command += ['-p', name, 'example_prj']
+        with open(name + '.log', 'w') as log:
+            process = subprocess.Popen(command, env=environment(virtualenv, self.index_url),
+                                       stdout=log, stderr=subprocess.STDOUT)
+        return {'name': name, 'process': process, 'start': default_timer(), 'args': args}
+
+    def finish(self, installation, end=None):
+        """
+        Wait for the installation to complete
+
+        :param installation: installation returned by ``start``
+        :param end: time the installation was seen completed, if already known
+        :return: dictionary of the durations of the process, of the installer
+                 and of its stages, and of the ``failure`` details (stage,
+                 error and output) if the installation failed
+        """
+        installation['process'].wait()
+        duration = (end or default_timer()) - installation['start']
+        try:
+            with open(installation['name'] + '.json') as fd:
+                measures = json.load(fd)
+        except (IOError, ValueError):
+            measures = {'stages': [], 'stage': None, 'error': 'No measures recorded'}
+        durations = OrderedDict([('process', duration), ('total', measures.get('total'))])
+        for stage in measures['stages']:
+            durations[stage['name']] = stage['duration']
+        durations['failure'] = None
+        if installation['process'].returncode:
+            with open(installation['name'] + '.log') as fd:
+                log = fd.read()
+            durations['failure'] = {
+                'stage': measures['stage'], 'error': measures['error'], 'log': log,
+            }
+        return durations
+
+    def install(self, virtualenv, cache_dir, args):
+        """
+        Create a project, returning the durations of the process, of the
+        installer and of its stages
+        """
+        durations = self.finish(self.start(virtualenv, cache_dir, args))
+        failure = durations.pop('failure')
+        if failure:
+            raise RuntimeError('Installation failed ({0}):\n{1}'.format(
+                ' '.join(args) or 'default options', failure['log'][-3000:]
+            ))
+        return durations
+
+    def scenario(self, name, runs):
+        """
+        Run the scenario, returning the list of durations of each run
+        """
+        options = SCENARIOS[name]
+        installer = installer_requirements()
+        requirements = project_requirements(self.options) if options['installed'] else []
+        installed = None
+        warm_cache = None
+        if options['installed']:
+            installed = self.virtualenv(installer + requirements)
+        if options['warm']:
+            # Untimed run filling the stages and pip caches
+            warm_cache = self.path('cache')
+            self.install(self.virtualenv(installer), warm_cache, options['args'])
+        measures = []
+        for run in range(runs):
+            virtualenv = installed or self.virtualenv(installer)
+            measures.append(self.install(virtualenv, warm_cache or self.path('cache'),
+                                         options['args']))
+            sys.stderr.write('{0} run {1}: {2:.1f}s\n'.format(
+                name, run + 1, measures[-1]['process']
+            ))
+        return measures
+
+
+def run(wheelhouse, scenarios, runs, http=False, options=()):
+    """
+    Run the scenarios against an index of the wheelhouse
+
+    :param options: installer options added to ``PROJECT_ARGS``
+
+    :return: dictionary mapping ``<scenario>:<stage>`` to the statistics of
+             its durations; ``process`` is the duration of the installer
+             process and ``total`` the one of ``main.execute``
+    """
+    workdir = tempfile.mkdtemp(prefix='djangocms-installer-e2e-')
+    server = None
+    try:
+        index = build_index(wheelhouse, workdir)
+        if http:
+            server, index_url = serve_index(index)
+        else:
+            index_url = 'file:{0}/'.format(pathname2url(index))
+        benchmark = Benchmark(workdir, index_url, options)
+        output = {}
+        for name in scenarios:
+            measures = benchmark.scenario(name, runs)
+            for key in measures[0]:
+                output['{0}:{1}'.format(name, key)] = results.stats(
+                    [measure[key] for measure in measures if key in measure]
+                )
+        return output
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(workdir, True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run the installer end-to-end benchmark against a local package index.'
+    )
+    parser.add_argument('--wheelhouse', dest='wheelhouse', action='store', required=True,
+                        help='Directory containing the wheels of the installer and project '
+                             'requirements')
+    parser.add_argument('--build-wheelhouse', dest='build_wheelhouse', action='store_true',
+                        default=False, help='Download and build the wheels pinned in '
+                                            'benchmarks/wheelhouse.txt in the wheelhouse '
+                                            '(requires network access)')
+    parser.add_argument('--scenario', dest='scenarios', action='append', default=[],
+                        choices=list(SCENARIOS),
+                        help='Scenario to run, can be repeated (default: all)')
+    parser.add_argument('--runs', dest='runs', action='store', type=int, default=3,
+                        help='Number of runs of each scenario (default: %(default)s)')
+    parser.add_argument('--http', dest='http', action='store_true', default=False,
+                        help='Serve the index over loopback HTTP instead of a file:// URL')
+    parser.add_argument('--installer-option', dest='options', action='append', default=[],
+                        help='Option given to the installer, can be repeated (e.g.: '
+                             '--installer-option=--filer)')
+    results.add_arguments(parser)
+    args = parser.parse_args(args)
+    if args.build_wheelhouse:
+        unlocked = unlocked_requirements(installer_requirements() +
+                                         project_requirements(PROJECT_ARGS + args.options))
+        if unlocked:
+            parser.error('Requirements not pinned in {0}: {1}'.format(
+                WHEELHOUSE_LOCK, ', '.join(unlocked)
+            ))
+        build_wheelhouse(args.wheelhouse)
+    if not glob.glob(os.path.join(args.wheelhouse, '*.whl')):
+        parser.error('No wheels in {0}: build them with --build-wheelhouse'.format(
+            args.wheelhouse
+        ))
+    scenarios = args.scenarios or list(SCENARIOS)
+    try:
+        output = run(args.wheelhouse, scenarios, args.runs, args.http, args.options)
+    except (RuntimeError, subprocess.CalledProcessError) as e:
+        sys.stderr.write('{0}\n'.format(e))
+        return 2
+    return results.report(args, 'e2e', output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks of the functions run in the installer process for each project
+
+Run from the repository root::
+
+    python benchmarks/microbench.py --output .benchmarks/microbench.json
+    python benchmarks/microbench.py --compare .benchmarks/microbench.json
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import gc
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import warnings
+from timeit import default_timer
+
+from six import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from djangocms_installer import config, django, simulate, utils  # NOQA
+from djangocms_installer.config import ini, layers  # NOQA
+
+import results  # NOQA
+
+CONFIGS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'fixtures', 'configs'
+)
+COMMAND_LINE = ['-q', '-s', '-p', '.', '--db=sqlite://localhost/project.db', '-len',
+                '--timezone=UTC']
+VERSIONS = (('stable', 'stable'), ('1.8', '3.2'), ('1.9', '3.3'), ('1.8', 'develop'))
+
+
+def calibration():
+    """
+    Reference workload: benchmarks are compared relatively to its duration,
+    measured along them, so that the changes of the machine speed (frequency
+    scaling, noisy neighbours) cancel out
+    """
+    values = {'name': 'example_prj', 'languages': ['en', 'de'], 'versions': list(range(50))}
+    for item in range(100):
+        json.loads(json.dumps(values))
+        re.sub(r'\W', '_', 'config-{0}.ini'.format(item))
+
+
+def measure(function, setup=None, min_time=0.2, min_runs=5):
+    """
+    Time the calls of the function until min_time seconds have been spent
+    in it, and at least min_runs times; the garbage collector is disabled
+    while timing, so that its pauses are not counted in random calls
+
+    :param function: function to call without arguments
+    :param setup: function called before each call, not timed
+    :return: list of durations in seconds
+    """
+    timings = []
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        while sum(timings) < min_time or len(timings) < min_runs:
+            if setup:
+                setup()
+            start = default_timer()
+            function()
+            timings.append(default_timer() - start)
+    finally:
+        if enabled:
+            gc.enable()
+    return timings
+
+
+def _parse_args(filename):
+    return ['--config-file', filename, '-s', '-q', 'example_prj']
+
+
+def config_benchmarks(workdir):
+    """
+    Returns the benchmarks of each fixture configuration file, skipping the
+    ones the installer rejects
+
+    :param workdir: directory where projects and dumped files are written
+    :return: list of (name, function, setup) tuples
+    """
+    benchmarks = [
+        ('config.parse[command line]', lambda: config.parse(COMMAND_LINE + ['example_prj']),
+         None),
+    ]
+    for django_version, cms in VERSIONS:
+        benchmarks.append((
+            'utils.supported_versions[{0},{1}]'.format(django_version, cms),
+            lambda cms=cms, django_version=django_version: utils.supported_versions(
+                django_version, cms
+            ),
+            None
+        ))
+    for filename in sorted(glob.glob(os.path.join(CONFIGS_DIR, 'config-*.ini'))):
+        label = os.path.basename(filename)
+        stderr = sys.stderr
+        try:
+            sys.stderr = StringIO()
+            config_data = config.parse(_parse_args(filename))
+        except (SystemExit, Exception):
+            message = sys.stderr.getvalue().strip().splitlines()
+            stderr.write('Skipping {0}: {1}\n'.format(label, message[-1] if message else ''))
+            continue
+        finally:
+            sys.stderr = stderr
+        project_directory = os.path.join(workdir, re.sub(r'\W', '_', label))
+        config.set_project_directory(config_data, project_directory)
+        simulate.start_project(config_data.project_name, project_directory,
+                               {'latency': simulate.parse_latency('0'), 'fail': None})
+        with open(config_data.settings_path) as fd:
+            settings = fd.read()
+
+        def restore_settings(config_data=config_data, settings=settings):
+            with open(config_data.settings_path, 'w') as fd:
+                fd.write(settings)
+
+        dump_path = os.path.join(workdir, 'dump-{0}'.format(label))
+        parser = config.get_parser()
+        benchmarks.extend([
+            ('config.parse[{0}]'.format(label),
+             lambda filename=filename: config.parse(_parse_args(filename)), None),
+            ('ini.dump_config_file[{0}]'.format(label),
+             lambda config_data=config_data, dump_path=dump_path, parser=parser:
+             ini.dump_config_file(dump_path, config_data, parser), None),
+            ('ini.project_items[{0}]'.format(label),
+             lambda filename=filename, parser=parser: layers.apply_items(
+                 parser, ini.project_items(ini.read_config_file(filename), 'example_prj'),
+                 layers.CONFIG_FILE
+             ), None),
+            ('django.patch_settings[{0}]'.format(label),
+             lambda config_data=config_data: django.patch_settings(config_data),
+             restore_settings),
+            ('django._build_settings[{0}]'.format(label),
+             lambda config_data=config_data: django._build_settings(config_data), None),
+        ])
+    return benchmarks
+
+
+def run(pattern=None, min_time=0.2, rounds=10):
+    """
+    Run the benchmarks whose name matches the pattern.
+
+    Each benchmark is called once to warm it up, then timed in several rounds;
+    the rounds of all the benchmarks are interleaved, so that a slower period
+    of the machine affects one round of many benchmarks rather than all the
+    rounds of one.
+
+    :param pattern: regular expression searched in the benchmark names
+    :param min_time: seconds spent in each benchmark, over all the rounds
+    :param rounds: number of rounds
+    :return: dictionary mapping the benchmark names to their statistics
+    """
+    workdir = tempfile.mkdtemp(prefix='djangocms-installer-bench-')
+    current = os.getcwd()
+    stdout = sys.stdout
+    output = {}
+    try:
+        os.chdir(workdir)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            # Functions output is not part of the report
+            sys.stdout = StringIO()
+            benchmarks = [
+                benchmark for benchmark in config_benchmarks(workdir)
+                if not pattern or re.search(pattern, benchmark[0])
+            ]
+            for name, function, setup in benchmarks:
+                measure(function, setup, 0, 1)
+            timings = dict((benchmark[0], []) for benchmark in benchmarks)
+            references = dict((benchmark[0], []) for benchmark in benchmarks)
+            for round_number in range(rounds):
+                for name, function, setup in benchmarks:
+                    references[name].append(
+                        results.percentile(sorted(measure(calibration, None, 0, 3)), 50)
+                    )
+                    timings[name].append(measure(function, setup, min_time / rounds, 3))
+            for name, measures in timings.items():
+                output[name] = results.stats(sum(measures, []), measures, references[name])
+    finally:
+        sys.stdout = stdout
+        os.chdir(current)
+        shutil.rmtree(workdir, True)
+    return output
+
+
+def confirm(output, args):
+    """
+    Measure again the benchmarks slower than the baseline, keeping their best
+    results: a slowdown caused by the machine is rarely measured several times
+
+    :param output: results, updated in place
+    :param args: options added by ``results.add_arguments``
+    :return: the results
+    """
+    baseline = results.load(args.compare)
+    for attempt in range(args.confirm):
+        slower = [row[0] for row in results.compare(baseline, output, args.threshold, args.metric)
+                  if row[4] == 'regression']
+        if not slower:
+            break
+        sys.stderr.write('Measuring again {0} benchmarks slower than the baseline\n'.format(
+            len(slower)
+        ))
+        again = run('^({0})$'.format('|'.join(re.escape(name) for name in slower)),
+                    args.min_time, args.rounds)
+        for name, values in again.items():
+            if values[args.metric] < output[name][args.metric]:
+                output[name] = values
+    return output
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Run the installer microbenchmarks.')
+    parser.add_argument('--filter', '-k', dest='pattern', action='store', default=None,
+                        help='Run the benchmarks matching this regular expression')
+    parser.add_argument('--min-time', dest='min_time', action='store', type=float,
+                        default=0.2, help='Seconds spent in each benchmark '
+                                          '(default: %(default)s)')
+    parser.add_argument('--rounds', dest='rounds', action='store', type=int, default=10,
+                        help='Number of interleaved measurement rounds (default: %(default)s)')
+    parser.add_argument('--confirm', dest='confirm', action='store', type=int, default=2,
+                        help='Times the benchmarks slower than the baseline are measured '
+                             'again before reporting a regression (default: %(default)s)')
+    results.add_arguments(parser, 'relative')
+    args = parser.parse_args(args)
+    output = run(args.pattern, args.min_time, args.rounds)
+    if args.compare:
+        output = confirm(output, args)
+    return results.report(args, 'microbench', output, args.pattern)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark results: statistics, JSON files and comparison with a baseline
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+from djangocms_installer import __version__
+
+METRICS = ('min', 'median', 'mean', 'p90', 'p95', 'min_median', 'relative')
+DEFAULT_THRESHOLD = 10
+
+
+def percentile(timings, percent):
+    """
+    Returns the percentile of sorted durations, interpolating between the
+    closest ones
+    """
+    position = (len(timings) - 1) * percent / 100.0
+    lower = int(position)
+    upper = min(lower + 1, len(timings) - 1)
+    return timings[lower] + (timings[upper] - timings[lower]) * (position - lower)
+
+
+def stats(timings, rounds=None, references=None):
+    """
+    Returns the statistics of a list of durations, in seconds
+
+    :param rounds: the same durations grouped by measurement round, to add the
+                   smallest round median (``min_median``) and the ``spread``
+                   of the round medians: how much slower than the smallest one
+                   their third quartile is, in percent
+    :param references: duration of a reference workload measured along each
+                       round, to add the smallest ratio of the round median
+                       to it (``relative``), less sensitive to the machine
+                       speed changes; the spread is then the one of the ratios
+    """
+    timings = sorted(timings)
+    result = {
+        'min': timings[0],
+        'median': percentile(timings, 50),
+        'mean': sum(timings) / len(timings),
+        'p90': percentile(timings, 90),
+        'p95': percentile(timings, 95),
+        'max': timings[-1],
+        'runs': len(timings),
+    }
+    if rounds:
+        medians = [percentile(sorted(values), 50) for values in rounds]
+        result['min_median'] = min(medians)
+        if references:
+            medians = [median / reference for median, reference in zip(medians, references)]
+            result['relative'] = min(medians)
+        medians.sort()
+        result['spread'] = (
+            (percentile(medians, 75) - medians[0]) * 100.0 / medians[0] if medians[0] else 0.0
+        )
+    return result
+
+
+def save(filename, suite, results):
+    """
+    Write the results to a JSON file, with the details of the environment
+
+    :param filename: output file path, parent directories are created if needed
+    :param suite: benchmark suite name
+    :param results: dictionary mapping the benchmark names to their statistics
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(filename, 'w') as fd:
+        json.dump({
+            'suite': suite,
+            'installer': __version__,
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+        }, fd, indent=2, sort_keys=True)
+
+
+def load(filename):
+    """
+    Returns the results saved in a JSON file by ``save``
+    """
+    with open(filename) as fd:
+        return json.load(fd)['results']
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, metric='median'):
+    """
+    Compare the results with a baseline
+
+    :param baseline: baseline results, as returned by ``load``
+    :param current: current results
+    :param threshold: maximum accepted slowdown, in percent
+    :param metric: statistic to compare, one of ``METRICS``
+    :return: list of (name, baseline, current, change percent, status) tuples,
+             status being ``ok``, ``faster``, ``regression``, ``new``, ``missing``
+             or ``noisy`` for a slowdown within the ``spread`` measured in the
+             baseline or in the current results
+    """
+    rows = []
+    for name in sorted(set(baseline) | set(current)):
+        if name not in baseline:
+            rows.append((name, None, current[name][metric], None, 'new'))
+            continue
+        if name not in current:
+            rows.append((name, baseline[name][metric], None, None, 'missing'))
+            continue
+        before, after = baseline[name][metric], current[name][metric]
+        change = (after - before) * 100.0 / before if before else 0.0
+        spread = max(baseline[name].get('spread', 0), current[name].get('spread', 0))
+        if change > max(threshold, spread):
+            status = 'regression'
+        elif change > threshold:
+            status = 'noisy'
+        elif change < -threshold:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, before, after, change, status))
+    return rows
+
+
+def format_duration(seconds):
+    """
+    Returns a human readable duration
+    """
+    if seconds is None:
+        return '-'
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '{0:.2f}{1}'.format(seconds * scale, unit)
+    return '{0:.0f}ns'.format(seconds * 1e9)
+
+
+def format_value(value, metric):
+    """
+    Returns a human readable statistic: relative values have no unit
+    """
+    if metric == 'relative' and value is not None:
+        return '{0:.4f}x'.format(value)
+    return format_duration(value)
+
+
+def format_results(results, metric='median'):
+    """
+    Returns the table of the results
+    """
+    width = max([len(name) for name in results] + [9])
+    line = '{0:<{width}} {1:>10} {2:>10} {3:>10} {4:>7}'
+    lines = [line.format('Benchmark', metric, 'p90', 'min', 'runs', width=width)]
+    for name in sorted(results):
+        lines.append(line.format(
+            name, format_value(results[name][metric], metric),
+            format_duration(results[name].get('p90')), format_duration(results[name]['min']),
+            results[name]['runs'], width=width
+        ))
+    return '\n'.join(lines) + '\n'
+
+
+def format_comparison(rows, threshold=DEFAULT_THRESHOLD, metric='median'):
+    """
+    Returns the table of the comparison returned by ``compare``
+    """
+    width = max([len(row[0]) for row in rows] + [9])
+    lines = ['{0:<{width}} {1:>10} {2:>10} {3:>8}  {4}'.format(
+        'Benchmark', 'baseline', 'current', 'change', 'status', width=width
+    )]
+    for name, before, after, change, status in rows:
+        lines.append('{0:<{width}} {1:>10} {2:>10} {3:>8}  {4}'.format(
+            name, format_value(before, metric), format_value(after, metric),
+            '-' if change is None else '{0:+.1f}%'.format(change), status, width=width
+        ))
+    regressions = len([row for row in rows if row[4] == 'regression'])
+    lines.append('{0} regressions over {1}%'.format(regressions, threshold))
+    return '\n'.join(lines) + '\n'
+
+
+def add_arguments(parser, metric='median'):
+    """
+    Add the output and comparison options shared by the benchmark scripts
+
+    :param metric: statistic compared by default
+    """
+    parser.add_argument('--output', '-o', dest='output', action='store', default=None,
+                        help='Save the results to this JSON file')
+    parser.add_argument('--compare', dest='compare', action='store', default=None,
+                        help='Compare the results with this JSON file, failing if a '
+                             'benchmark is slower than the threshold')
+    parser.add_argument('--threshold', dest='threshold', action='store', type=float,
+                        default=DEFAULT_THRESHOLD,
+                        help='Maximum accepted slowdown, in percent (default: %(default)s)')
+    parser.add_argument('--metric', dest='metric', action='store', choices=METRICS,
+                        default=metric, help='Statistic compared (default: %(default)s)')
+
+
+def report(args, suite, results, pattern=None):
+    """
+    Show, save and compare the results according to the options added by
+    ``add_arguments``
+
+    :param pattern: regular expression selecting the benchmarks which were run,
+                    the others are not compared
+    :return: exit status, 1 if a regression is found
+    """
+    # The baseline is read first: it can be replaced by the new results
+    baseline = load(args.compare) if args.compare else None
+    if baseline and pattern:
+        baseline = dict(
+            (name, values) for name, values in baseline.items() if re.search(pattern, name)
+        )
+    sys.stdout.write(format_results(results, args.metric))
+    if args.output:
+        save(args.output, suite, results)
+    if baseline is not None:
+        rows = compare(baseline, results, args.threshold, args.metric)
+        sys.stdout.write('\n' + format_comparison(rows, args.threshold, args.metric))
+        if [row for row in rows if row[4] == 'regression']:
+            return 1
+    return 0
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrency stress benchmark: N installer runs started at once on the
+machine, each in its own project directory and virtualenv, sharing the
+cache directory, the temporary directory and the package index
+
+Throughput, latency and failures are measured for each concurrency level,
+and the scaling curve shows where adding runs stops paying off::
+
+    python benchmarks/stress.py --wheelhouse ~/wheelhouse --output .benchmarks/stress.json
+    python benchmarks/stress.py --wheelhouse ~/wheelhouse --levels 1,4,16 --cache separate
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import glob
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer
+
+from six.moves.urllib.request import pathname2url
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import e2e  # NOQA
+import results  # NOQA
+
+DEFAULT_LEVELS = '1,2,4,8,16,32'
+# Minimum throughput gain for a concurrency level to be worth it
+SCALING_GAIN = 10
+POLL_INTERVAL = 0.05
+# Failure causes, recognised in the output of the failed runs; the first
+# matching one is reported
+CONTENTION_PATTERNS = (
+    ('sqlite', r'database is locked|database table is locked|unable to open database file'),
+    ('pip-cache', r'[\\/]pip[\\/](http|wheels|selfcheck)|[Cc]ache entry deserialization|'
+                  r'BadZipFile|is not a valid wheel|CRC check failed'),
+    ('download', r'archive/[^\s]+\.zip\?[\d.]+|Connection (reset|refused|aborted)|'
+                 r'Read timed out|HTTPError|[Ee]rrno 104'),
+    ('temp-dir', r'[Ee]rrno (2|17|39)\]|No space left on device|[Tt]emporary (file|director)'),
+)
+
+
+def classify(failure):
+    """
+    Returns the cause of a failed run: one of the ``CONTENTION_PATTERNS``
+    names or ``other``
+    """
+    text = '\n'.join(filter(None, (failure['error'], failure['log'])))
+    for name, pattern in CONTENTION_PATTERNS:
+        if re.search(pattern, text):
+            return name
+    return 'other'
+
+
+def parse_levels(value):
+    """
+    Returns the sorted concurrency levels of a comma separated list
+    """
+    try:
+        levels = sorted(set(int(level) for level in value.split(',')))
+    except ValueError:
+        raise argparse.ArgumentTypeError('{0} is not a list of integers'.format(value))
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError('Concurrency levels must be positive')
+    return levels
+
+
+def _wait(benchmark, installations):
+    """
+    Wait for the concurrent installations, each being timed when it completes
+    """
+    measures = [None] * len(installations)
+    while None in measures:
+        for position, installation in enumerate(installations):
+            if measures[position] is None and installation['process'].poll() is not None:
+                measures[position] = benchmark.finish(installation, default_timer())
+        time.sleep(POLL_INTERVAL)
+    return measures
+
+
+def level(benchmark, concurrency, cache, args, requirements):
+    """
+    Run the installations of one concurrency level
+
+    :param cache: ``shared`` for a cache directory common to the runs,
+                  ``separate`` for one cache directory per run
+    :return: dictionary of the wall time of the level and of the measures
+             of each run, as returned by ``Benchmark.finish``
+    """
+    # Virtualenvs are created beforehand, out of the measures
+    pool = ThreadPool(min(concurrency, 8))
+    try:
+        virtualenvs = pool.map(benchmark.virtualenv, [requirements] * concurrency)
+    finally:
+        pool.close()
+    shared_cache = benchmark.path('cache')
+    start = default_timer()
+    installations = [
+        benchmark.start(virtualenv,
+                        shared_cache if cache == 'shared' else benchmark.path('cache'), args)
+        for virtualenv in virtualenvs
+    ]
+    measures = _wait(benchmark, installations)
+    return {'wall': default_timer() - start, 'measures': measures}
+
+
+def summarize(concurrency, outcome):
+    """
+    Returns the throughput, latency and failures of a concurrency level
+
+    :param outcome: concurrency level outcome, as returned by ``level``
+    :return: dictionary of the ``latency`` statistics of the successful runs,
+             of the ``throughput`` in projects per minute and of the
+             ``failures`` count by cause
+    """
+    latencies = []
+    failures = OrderedDict()
+    for measure in outcome['measures']:
+        if measure['failure']:
+            cause = classify(measure['failure'])
+            if measure['failure']['stage']:
+                cause = '{0}@{1}'.format(cause, measure['failure']['stage'])
+            failures[cause] = failures.get(cause, 0) + 1
+        else:
+            latencies.append(measure['process'])
+    return {
+        'concurrency': concurrency,
+        'wall': outcome['wall'],
+        'throughput': len(latencies) * 60.0 / outcome['wall'],
+        'latency': results.stats(latencies) if latencies else None,
+        'failures': failures,
+    }
+
+
+def scaling_limit(summaries, gain=SCALING_GAIN):
+    """
+    Returns the concurrency level after which the throughput grows by less
+    than ``gain`` percent, None if it scales up to the highest level
+    """
+    for current, following in zip(summaries, summaries[1:]):
+        if following['throughput'] <= current['throughput'] * (1 + gain / 100.0):
+            return current['concurrency']
+    return None
+
+
+def format_scaling(summaries, width=30):
+    """
+    Returns the scaling curve: throughput, speedup over a single run, tail
+    latencies and failures of each concurrency level
+    """
+    base = summaries[0]['throughput'] / summaries[0]['concurrency'] or None
+    highest = max(summary['throughput'] for summary in summaries) or 1
+    line = '{0:>4} {1:>10} {2:>8} {3:>6} {4:>9} {5:>9} {6:>9} {7:>8}  {8}'
+    lines = [line.format('N', 'proj/min', 'speedup', 'eff.', 'median', 'p95', 'max',
+                         'failures', 'throughput')]
+    for summary in summaries:
+        latency = summary['latency'] or {}
+        speedup = summary['throughput'] / base if base else 0
+        lines.append(line.format(
+            summary['concurrency'], '{0:.1f}'.format(summary['throughput']),
+            '{0:.2f}x'.format(speedup),
+            '{0:.0f}%'.format(speedup * 100.0 / summary['concurrency']),
+            results.format_duration(latency.get('median')),
+            results.format_duration(latency.get('p95')),
+            results.format_duration(latency.get('max')),
+            sum(summary['failures'].values()),
+            '#' * int(round(width * summary['throughput'] / highest)),
+        ))
+    limit = scaling_limit(summaries)
+    if limit is None:
+        lines.append('Throughput scales up to N={0}'.format(summaries[-1]['concurrency']))
+    else:
+        lines.append('Throughput stops scaling at N={0} (gain below {1}%)'.format(
+            limit, SCALING_GAIN
+        ))
+    failed = [summary for summary in summaries if summary['failures']]
+    if failed:
+        lines.extend(['', 'Failures:'])
+        for summary in failed:
+            lines.append('  N={0}: {1}'.format(summary['concurrency'], ', '.join(
+                '{0} x{1}'.format(cause, count) for cause, count in summary['failures'].items()
+            )))
+    return '\n'.join(lines) + '\n'
+
+
+def run(wheelhouse, levels, cache='shared', http=False, options=()):
+    """
+    Run the concurrency levels against an index of the wheelhouse
+
+    :param options: installer options added to ``PROJECT_ARGS``
+    :return: list of the summaries of each level, as returned by ``summarize``
+    """
+    workdir = tempfile.mkdtemp(prefix='djangocms-installer-stress-')
+    server = None
+    try:
+        index = e2e.build_index(wheelhouse, workdir)
+        if http:
+            server, index_url = e2e.serve_index(index)
+        else:
+            index_url = 'file:{0}/'.format(pathname2url(index))
+        benchmark = e2e.Benchmark(workdir, index_url, options)
+        requirements = e2e.installer_requirements()
+        summaries = []
+        for concurrency in levels:
+            outcome = level(benchmark, concurrency, cache, [], requirements)
+            summaries.append(summarize(concurrency, outcome))
+            sys.stderr.write('N={0}: {1:.1f}s, {2} failures\n'.format(
+                concurrency, outcome['wall'], sum(summaries[-1]['failures'].values())
+            ))
+            # Projects and virtualenvs of the level are not needed anymore
+            for path in glob.glob(os.path.join(workdir, '*-*')):
+                if os.path.isdir(path):
+                    shutil.rmtree(path, True)
+        return summaries
+    finally:
+        if server:
+            server.shutdown()
+        shutil.rmtree(workdir, True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Run concurrent installations and report how the installer scales.'
+    )
+    parser.add_argument('--wheelhouse', dest='wheelhouse', action='store', required=True,
+                        help='Directory containing the wheels of the installer and project '
+                             'requirements (see benchmarks/e2e.py --build-wheelhouse)')
+    parser.add_argument('--levels', dest='levels', action='store', type=parse_levels,
+                        default=parse_levels(DEFAULT_LEVELS),
+                        help='Comma separated numbers of concurrent installations '
+                             '(default: {0})'.format(DEFAULT_LEVELS))
+    parser.add_argument('--cache', dest='cache', action='store', default='shared',
+                        choices=('shared', 'separate'),
+                        help='Give the concurrent installations the same cache directory or '
+                             'one each (default: %(default)s)')
+    parser.add_argument('--http', dest='http', action='store_true', default=False,
+                        help='Serve the index over loopback HTTP instead of a file:// URL')
+    parser.add_argument('--installer-option', dest='options', action='append', default=[],
+                        help='Option given to the installer, can be repeated (e.g.: '
+                             '--installer-option=--cms-version=develop)')
+    results.add_arguments(parser)
+    args = parser.parse_args(args)
+    if not glob.glob(os.path.join(args.wheelhouse, '*.whl')):
+        parser.error('No wheels in {0}: build them with benchmarks/e2e.py '
+                     '--build-wheelhouse'.format(args.wheelhouse))
+    try:
+        summaries = run(args.wheelhouse, args.levels, args.cache, args.http, args.options)
+    except subprocess.CalledProcessError as e:
+        sys.stderr.write('{0}\n'.format(e))
+        return 2
+    sys.stdout.write(format_scaling(summaries) + '\n')
+    output = {}
+    for summary in summaries:
+        if summary['latency']:
+            output['n={0:02d}:latency'.format(summary['concurrency'])] = dict(
+                summary['latency'], throughput=summary['throughput'],
+                failures=summary['failures'], wall=summary['wall']
+            )
+    return results.report(args, 'stress', output)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
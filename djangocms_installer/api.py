@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import time
+from collections import namedtuple
+
+import six
+
+try:
+    from collections.abc import Mapping  # Python 3.
+except ImportError:
+    from collections import Mapping  # Python 2.
+
+from . import config, install, stages
+from .exceptions import ConfigurationError, InstallationError
+
+
+class Result(namedtuple('Result', ('project_name', 'project_directory', 'config_data', 'stages',
+                                   'duration'))):
+    """
+    Created project: the configuration data and the executed stages with their duration
+    """
+    __slots__ = ()
+
+
+def get_parser():
+    """
+    Returns the parser shared by the API calls
+    """
+    return config.get_parser(raise_errors=True)
+
+
+def options_to_args(options, parser=None):
+    """
+    Convert a mapping of options to command line arguments.
+
+    Keys are the names of the configuration data attributes (e.g.:
+    ``project_name``, ``cms_version``, ``filer``): flags are passed if true,
+    booleans are converted to ``yes`` and ``no`` for yes/no options and lists
+    are joined with commas.
+
+    :param options: mapping of options
+    :param parser: installer parser
+    :return: list of command line arguments
+    """
+    parser = parser or get_parser()
+    options = dict(options)
+    project_name = options.pop('project_name', None)
+    if not project_name:
+        raise ConfigurationError('project_name is required', 2)
+    actions = dict((action.dest, action) for action in parser._actions if action.option_strings)
+    args = []
+    for dest, value in sorted(options.items()):
+        if dest not in actions:
+            raise ConfigurationError('Unknown option {0}'.format(dest), 2)
+        action = actions[dest]
+        if action.nargs == 0:
+            if value:
+                args.append(action.option_strings[0])
+        elif value is not None:
+            if isinstance(value, bool) and action.choices == ('yes', 'no'):
+                value = 'yes' if value else 'no'
+            elif isinstance(value, (list, tuple)):
+                value = ','.join(six.text_type(item) for item in value)
+            args.extend([action.option_strings[0], six.text_type(value)])
+    return args + [project_name]
+
+
+def resolve(options):
+    """
+    Returns the configuration data for the options, never asking for input
+
+    :param options: mapping of options (see ``options_to_args``) or list of
+                    command line arguments
+    :raises ConfigurationError: if the options are not valid
+    """
+    parser = get_parser()
+    if isinstance(options, Mapping):
+        args = options_to_args(options, parser)
+    else:
+        args = list(options)
+    try:
+        return config.resolve(['--no-input'] + args, parser)
+    except ConfigurationError:
+        raise
+    except ValueError as e:
+        six.raise_from(ConfigurationError(six.text_type(e)), e)
+
+
+def _failed_stage(config_data, completed):
+    for name, function, condition in stages.STAGES:
+        if (not condition or condition(config_data)) and name not in completed:
+            return name
+    return None
+
+
+def create_project(options):
+    """
+    Create a project.
+
+    Unlike the command line, errors are raised and the settings defaults are
+    never modified, so many projects can be created in the same process.
+
+    :param options: mapping of options (see ``options_to_args``) or list of
+                    command line arguments
+    :return: ``Result``
+    :raises ConfigurationError: if the options are not valid
+    :raises InstallationError: if the project creation fails; the project
+                               directory is removed unless ``resume`` is set
+    """
+    config_data = resolve(options)
+    start = time.time()
+    executed = None
+    completed = []
+    try:
+        if config_data.staging:
+            install.stage_directory(config_data)
+        executed = stages.run(config_data, completed)
+        if config_data.staging:
+            install.commit_staging(config_data)
+    except Exception as e:
+        # Stages are all completed if only moving the staged project failed
+        stage = _failed_stage(config_data, completed) if executed is None else None
+        if not config_data.resume:
+            install.cleanup_directory(config_data)
+        # Typed installation errors are kept, other errors are wrapped
+        error_class = type(e) if isinstance(e, InstallationError) else InstallationError
+        six.raise_from(error_class(
+            'Creation of project {0} failed in stage {1}: {2}'.format(
+                config_data.project_name, stage, e
+            ), stage, e
+        ), e)
+    return Result(config_data.project_name, config_data.project_directory, config_data,
+                  executed, time.time() - start)
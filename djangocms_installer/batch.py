@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import glob
+import multiprocessing
+import os
+import re
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from copy import copy
+
+from . import config, install, stages, utils, workqueue
+from .config import ini
+
+
+def project_name(filename):
+    """
+    Returns a valid project name derived from the configuration file name
+    """
+    name = re.sub(r'\W', '_', os.path.splitext(os.path.basename(filename))[0]).strip('_')
+    if not name or name[0].isdigit():
+        name = 'project_{0}'.format(name)
+    return name.lower()
+
+
+def find_configs(config_dir):
+    """
+    Returns the sorted list of configuration files in the directory
+    """
+    return sorted(glob.glob(os.path.join(config_dir, '*.ini')))
+
+
+def parse_configs(filenames, output_dir, extra_args=()):
+    """
+    Parse the configuration files, each project is created in its own
+    directory in output_dir.
+
+    A file with ``[djangocms_installer:<name>]`` sections defines one project
+    per section, otherwise the file defines a single project named after it.
+    Each file is read once.
+
+    :param filenames: list of configuration files
+    :param output_dir: parent directory of the created projects
+    :param extra_args: additional arguments given to every project
+    :return: tuple of the list of configurations and the list of errors
+    """
+    projects = []
+    errors = []
+    for filename in filenames:
+        try:
+            config_file = ini.read_config_file(filename)
+            sections = ini.parse_projects(config_file)
+        except (IOError, ValueError, ini.Error) as e:
+            errors.append({
+                'name': project_name(filename), 'status': 'error', 'duration': 0,
+                'error': str(e),
+            })
+            continue
+        if not sections:
+            sections = {project_name(filename): ini.project_items(config_file)}
+        for name, items in sections.items():
+            args = ['-q', '-p', os.path.join(output_dir, name)] + list(extra_args) + [name]
+            config_data, error = config.try_resolve(args, items)
+            if error:
+                errors.append({'name': name, 'status': 'error', 'duration': 0, 'error': error})
+            else:
+                projects.append(config_data)
+    return projects, errors
+
+
+def submit_configs(filenames, output_dir, queue_dir, extra_args=()):
+    """
+    Add a job for each project defined in the configuration files to the
+    queue directory; configurations are validated by the workers
+
+    :param filenames: list of configuration files
+    :param output_dir: parent directory of the created projects
+    :param queue_dir: queue directory
+    :param extra_args: additional arguments given to every project
+    :return: 1 if any configuration file can't be read, 0 otherwise
+    """
+    status = 0
+    for filename in filenames:
+        try:
+            names = list(ini.parse_projects(ini.read_config_file(filename)).keys())
+        except (IOError, ValueError, ini.Error) as e:
+            sys.stdout.write(format_result({'name': project_name(filename), 'error': e,
+                                            'status': 'error'}))
+            status = 1
+            continue
+        for name in names or [project_name(filename)]:
+            directory = os.path.abspath(os.path.join(output_dir, name))
+            args = [
+                '--config-file', os.path.abspath(filename), '-q', '-p', directory,
+            ] + list(extra_args) + [name]
+            sys.stdout.write('Queued {0}\n'.format(
+                workqueue.submit(queue_dir, name, args, directory)
+            ))
+    return status
+
+
+def requirements_key(config_data):
+    """
+    Returns the key identifying the packages to be installed for the project
+    """
+    if config_data.no_deps:
+        return None
+    if config_data.requirements_file:
+        return ('file', os.path.abspath(config_data.requirements_file), config_data.pip_options)
+    return ('requirements', tuple(sorted(config_data.requirements.split())),
+            config_data.pip_options)
+
+
+def group_by_requirements(projects):
+    """
+    Group the projects sharing the same requirements, in the given order
+    """
+    groups = OrderedDict()
+    for config_data in projects:
+        groups.setdefault(requirements_key(config_data), []).append(config_data)
+    return groups
+
+
+def generate(config_data):
+    """
+    Create a single project, the installation output is written in a log file
+    next to the project directory.
+
+    :param config_data: configuration data
+    :return: project result dictionary
+    """
+    start = time.time()
+    result = {
+        'name': config_data.project_name,
+        'directory': config_data.project_directory,
+        'log': '{0}.log'.format(os.path.abspath(config_data.project_directory).rstrip(os.sep)),
+    }
+    if not os.path.exists(os.path.dirname(result['log'])):
+        os.makedirs(os.path.dirname(result['log']))
+    stdout = sys.stdout
+    with open(result['log'], 'w') as log:
+        sys.stdout = log
+        try:
+            result['stages'] = stages.run(config_data)
+            result['status'] = 'ok'
+        except Exception as e:
+            traceback.print_exc(file=log)
+            result['status'] = 'error'
+            result['error'] = '{0}: {1}'.format(e.__class__.__name__, e)
+            install.cleanup_directory(config_data)
+        finally:
+            sys.stdout = stdout
+    result['duration'] = time.time() - start
+    return result
+
+
+def run(projects, jobs=None, pool_class=multiprocessing.Pool):
+    """
+    Create the projects.
+
+    Projects are grouped by their requirements: each group requirements are
+    installed once, then the group projects are created in parallel by worker
+    processes started after the installation, so that they see the installed
+    versions.
+
+    :param projects: list of configurations
+    :param jobs: number of worker processes (defaults to the number of CPUs)
+    :param pool_class: pool class, for testing
+    :return: tuple of the list of results and the list of installed requirement sets
+    """
+    results = []
+    installed = []
+    for key, group in group_by_requirements(projects).items():
+        if key is not None:
+            try:
+                stages.install_requirements(group[0])
+                installed.append(key)
+            except Exception as e:
+                results.extend({
+                    'name': config_data.project_name, 'status': 'error', 'duration': 0,
+                    'error': 'Requirements installation failed: {0}'.format(e),
+                } for config_data in group)
+                continue
+            utils.invalidate_distributions()
+        items = []
+        for config_data in group:
+            config_data = copy(config_data)
+            config_data.no_deps = True
+            items.append(config_data)
+        pool = pool_class(min(jobs or multiprocessing.cpu_count(), len(items)))
+        try:
+            for result in pool.imap_unordered(generate, items):
+                results.append(result)
+                sys.stdout.write(format_result(result))
+        finally:
+            pool.close()
+            pool.join()
+    return results, installed
+
+
+def format_result(result):
+    if result['status'] == 'ok':
+        return '[ OK ] {name} ({duration:.1f}s): {directory}\n'.format(**result)
+    return '[FAIL] {name}: {error}\n'.format(**result)
+
+
+def format_report(results, installed, duration):
+    """
+    Returns the summary of a batch run
+    """
+    succeeded = [result for result in results if result['status'] == 'ok']
+    failed = [result for result in results if result['status'] != 'ok']
+    lines = [
+        '',
+        'Projects: {0} created, {1} failed'.format(len(succeeded), len(failed)),
+        'Requirement sets installed: {0}'.format(len(installed)),
+        'Elapsed time: {0:.1f}s'.format(duration),
+    ]
+    if succeeded and duration:
+        total = sum(result['duration'] for result in succeeded)
+        lines.append('Throughput: {0:.2f} projects/minute'.format(len(succeeded) * 60 / duration))
+        lines.append('Average project creation time: {0:.1f}s'.format(total / len(succeeded)))
+    for result in failed:
+        lines.append(format_result(result).rstrip())
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from . import __version__
+from .config import data
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+_bundled_files_hash = None
+
+SIZE_UNITS = ('K', 'M', 'G', 'T')
+
+
+def get_shared_cache_dir(cache_dir=None):
+    """
+    Returns the cache root explicitly configured with ``--cache-dir`` or the
+    environment, or None if not configured
+
+    :param cache_dir: value of the ``--cache-dir`` option
+    """
+    return cache_dir or os.environ.get(data.CACHE_DIR_ENV) or None
+
+
+def get_cache_dir(cache_dir=None):
+    """
+    Returns the root directory of the installer caches
+
+    :param cache_dir: value of the ``--cache-dir`` option
+    """
+    shared = get_shared_cache_dir(cache_dir)
+    if shared:
+        return shared
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, data.CACHE_DIR_NAME)
+
+
+def bundled_files_hash():
+    """
+    Returns a hash of the files shipped with the installer and used to create
+    the projects (templates, starting page, urlconf, settings defaults)
+    """
+    global _bundled_files_hash
+    if _bundled_files_hash is None:
+        base = os.path.dirname(os.path.abspath(__file__))
+        paths = [os.path.join(base, path) for path in data.CACHE_BUNDLED_FILES]
+        checksum = hashlib.sha1()
+        for path in paths:
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith(('.pyc', '.pyo')):
+                        continue
+                    filename = os.path.join(root, name)
+                    checksum.update(os.path.relpath(filename, base).encode('utf-8'))
+                    with open(filename, 'rb') as fd:
+                        checksum.update(fd.read())
+            if os.path.isfile(path):
+                with open(path, 'rb') as fd:
+                    checksum.update(fd.read())
+        _bundled_files_hash = checksum.hexdigest()
+    return _bundled_files_hash
+
+
+def cache_key(*parts):
+    """
+    Returns the content address of the given values; the installer version and
+    the bundled files are always part of the key
+
+    :param parts: JSON serializable values
+    """
+    payload = json.dumps([__version__, bundled_files_hash()] + list(parts),
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def entry_path(namespace, key, cache_dir=None):
+    """
+    Returns the directory of the cache entry
+
+    :param namespace: cache type (e.g.: ``stages``)
+    :param key: entry key as returned by ``cache_key``
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    return os.path.join(get_cache_dir(cache_dir), namespace, key[:2], key)
+
+
+def _makedirs(path):
+    if not os.path.exists(path):
+        try:
+            os.makedirs(path)
+        except OSError:  # pragma: no cover
+            # Created by a concurrent installer
+            if not os.path.isdir(path):
+                raise
+
+
+@contextmanager
+def _file_lock(path):
+    _makedirs(os.path.dirname(path))
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+    with open(path, 'a') as fd:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+
+
+def lock(namespace, key, cache_dir=None):
+    """
+    Hold an exclusive lock on the cache entry, shared by all the processes
+    (and hosts, for network file systems supporting POSIX locks) using the cache
+
+    :param namespace: cache type
+    :param key: entry key
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    return _file_lock('{0}.lock'.format(entry_path(namespace, key, cache_dir)))
+
+
+def snapshot(directory):
+    """
+    Returns the state of the files in the directory, to detect the files
+    changed by an installation stage
+
+    :param directory: directory to inspect
+    :return: tuple of files mapped to their size and mtime and set of directories
+    """
+    files = {}
+    dirs = set()
+    for root, dirnames, filenames in os.walk(directory):
+        # Bytecode is not cached: compiled settings contain the secret key
+        dirnames[:] = [name for name in dirnames if name != '__pycache__']
+        for name in dirnames:
+            dirs.add(os.path.relpath(os.path.join(root, name), directory))
+        for name in filenames:
+            if name.endswith(('.pyc', '.pyo')):
+                continue
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            files[os.path.relpath(path, directory)] = (stat.st_size, stat.st_mtime)
+    files.pop(data.CHECKPOINT_FILE, None)
+    return files, dirs
+
+
+def changes(directory, before):
+    """
+    Returns the files and directories created or modified since the snapshot
+
+    :param directory: directory to inspect
+    :param before: snapshot taken with ``snapshot``
+    :return: tuple of sorted lists of files and directories
+    """
+    files, dirs = snapshot(directory)
+    changed = [path for path, stat in files.items() if before[0].get(path) != stat]
+    return sorted(changed), sorted(dirs - before[1])
+
+
+def store_tree(namespace, key, directory, files, dirs, cache_dir=None):
+    """
+    Store the given files and directories in the cache entry.
+
+    The entry is built in a temporary directory and renamed in place, so that
+    incomplete entries are never visible.
+
+    :param namespace: cache type
+    :param key: entry key
+    :param directory: base directory of files and dirs
+    :param files: list of files relative to directory
+    :param dirs: list of directories relative to directory
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    entry = entry_path(namespace, key, cache_dir)
+    if os.path.exists(entry):
+        return entry
+    _makedirs(os.path.dirname(entry))
+    build = tempfile.mkdtemp(prefix='.tmp-', dir=os.path.dirname(entry))
+    try:
+        tree = os.path.join(build, 'tree')
+        os.makedirs(tree)
+        for path in dirs:
+            os.makedirs(os.path.join(tree, path))
+        for path in files:
+            target = os.path.join(tree, path)
+            if not os.path.exists(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            shutil.copy2(os.path.join(directory, path), target)
+        with open(os.path.join(build, 'entry.json'), 'w') as fd:
+            json.dump({'files': list(files), 'dirs': list(dirs)}, fd)
+        os.rename(build, entry)
+    except OSError:
+        # Another installer stored the same entry in the meantime
+        if not os.path.exists(entry):
+            raise
+    finally:
+        shutil.rmtree(build, True)
+    return entry
+
+
+def entry_content(namespace, key, cache_dir=None):
+    """
+    Returns the files and directories stored in the cache entry, relative to
+    its ``tree`` directory
+
+    :param namespace: cache type
+    :param key: entry key
+    :param cache_dir: cache root, see ``get_cache_dir``
+    :return: dictionary of ``files`` and ``dirs`` lists, or None if the entry
+             does not exist
+    """
+    entry = entry_path(namespace, key, cache_dir)
+    try:
+        with open(os.path.join(entry, 'entry.json'), 'r') as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def restore_tree(namespace, key, directory, cache_dir=None):
+    """
+    Copy the content of the cache entry to the directory
+
+    :param namespace: cache type
+    :param key: entry key
+    :param directory: target directory
+    :param cache_dir: cache root, see ``get_cache_dir``
+    :return: list of restored files, or None if the entry does not exist
+    """
+    entry = entry_path(namespace, key, cache_dir)
+    content = entry_content(namespace, key, cache_dir)
+    if content is None:
+        return None
+    # The entry modification time records its last use, for pruning
+    os.utime(entry, None)
+    tree = os.path.join(entry, 'tree')
+    for path in content['dirs']:
+        if not os.path.exists(os.path.join(directory, path)):
+            os.makedirs(os.path.join(directory, path))
+    for path in content['files']:
+        target = os.path.join(directory, path)
+        if not os.path.exists(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        shutil.copy2(os.path.join(tree, path), target)
+    return content['files']
+
+
+def record_use(namespace, hit, cache_dir=None):
+    """
+    Count a cache hit or miss in the cache statistics; only the installation
+    stages (project files and SQLite databases) record them, pip doesn't
+    report the use of its cache
+
+    :param namespace: cache type
+    :param hit: whether the entry was found
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    path = os.path.join(get_cache_dir(cache_dir), data.CACHE_STATS_FILE)
+    with _file_lock('{0}.lock'.format(path)):
+        counters = load_stats(cache_dir)
+        namespace_counters = counters.setdefault(namespace, {'hits': 0, 'misses': 0})
+        namespace_counters['hits' if hit else 'misses'] += 1
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as fd:
+            json.dump(counters, fd, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+
+
+def record_durations(stages, cache_dir=None):
+    """
+    Add the duration of the executed installation stages to the moving
+    averages used to estimate them
+
+    :param stages: list of stages, as returned by ``stages.run``
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    path = os.path.join(get_cache_dir(cache_dir), data.CACHE_DURATIONS_FILE)
+    with _file_lock('{0}.lock'.format(path)):
+        durations = load_durations(cache_dir)
+        for stage in stages:
+            key = duration_key(stage['name'], stage.get('cache'))
+            average = durations.setdefault(key, {'duration': stage['duration'], 'runs': 0})
+            average['duration'] += (
+                (stage['duration'] - average['duration']) * data.PLAN_HISTORY_WEIGHT
+            )
+            average['runs'] += 1
+        tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+        with open(tmp, 'w') as fd:
+            json.dump(durations, fd, indent=2, sort_keys=True)
+        os.rename(tmp, path)
+
+
+def load_durations(cache_dir=None):
+    """
+    Returns the average duration of the installation stages, see ``record_durations``
+    """
+    try:
+        with open(os.path.join(get_cache_dir(cache_dir), data.CACHE_DURATIONS_FILE), 'r') as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def duration_key(name, cache_status=None):
+    """
+    Returns the key of the stage average duration: restored and built stages
+    are averaged separately
+    """
+    return '{0}:{1}'.format(name, cache_status) if cache_status else name
+
+
+def load_stats(cache_dir=None):
+    """
+    Returns the hits and misses recorded for each cache type
+    """
+    try:
+        with open(os.path.join(get_cache_dir(cache_dir), data.CACHE_STATS_FILE), 'r') as fd:
+            return json.load(fd)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def _tree_size(path):
+    size = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                size += os.lstat(os.path.join(root, name)).st_size
+            except OSError:  # pragma: no cover
+                pass
+    return size
+
+
+def iter_entries(cache_dir=None):
+    """
+    Yields the cache entries as (namespace, path, size, last use time) tuples.
+
+    Entries of the installer caches are directories; each file in the pip
+    cache is an entry, whose last use is its modification time.
+
+    :param cache_dir: cache root, see ``get_cache_dir``
+    """
+    root = get_cache_dir(cache_dir)
+    if not os.path.isdir(root):
+        return
+    for namespace in sorted(os.listdir(root)):
+        base = os.path.join(root, namespace)
+        if not os.path.isdir(base):
+            continue
+        if namespace == data.CACHE_PIP_DIR:
+            for dirpath, dirs, files in os.walk(base):
+                for name in files:
+                    path = os.path.join(dirpath, name)
+                    stat = os.lstat(path)
+                    yield namespace, path, stat.st_size, stat.st_mtime
+            continue
+        for prefix in sorted(os.listdir(base)):
+            if not os.path.isdir(os.path.join(base, prefix)):
+                continue
+            for name in sorted(os.listdir(os.path.join(base, prefix))):
+                path = os.path.join(base, prefix, name)
+                if name.endswith('.lock') or name.startswith('.tmp-'):
+                    continue
+                yield namespace, path, _tree_size(path), os.stat(path).st_mtime
+
+
+def stats(cache_dir=None):
+    """
+    Returns the number of entries, the size and the recorded hits and misses
+    of each cache type (see ``record_use``: the pip cache has none)
+
+    :param cache_dir: cache root, see ``get_cache_dir``
+    :return: dictionary of namespace statistics
+    """
+    result = {}
+    for namespace, counters in load_stats(cache_dir).items():
+        result[namespace] = {'entries': 0, 'size': 0}
+        result[namespace].update(counters)
+    for namespace, path, size, last_used in iter_entries(cache_dir):
+        namespace_stats = result.setdefault(namespace, {'entries': 0, 'size': 0})
+        namespace_stats['entries'] += 1
+        namespace_stats['size'] += size
+    return result
+
+
+def _remove_entry(namespace, path, cache_dir=None):
+    if namespace == data.CACHE_PIP_DIR:
+        os.unlink(path)
+        return
+    # Entries are not removed while they are restored or built
+    with lock(namespace, os.path.basename(path), cache_dir):
+        shutil.rmtree(path, True)
+
+
+def prune(max_size, cache_dir=None):
+    """
+    Remove the least recently used entries until the cache size is at most
+    max_size; incomplete entries left by interrupted installers are removed
+    as well
+
+    :param max_size: maximum cache size in bytes
+    :param cache_dir: cache root, see ``get_cache_dir``
+    :return: tuple of the number of removed entries and of freed bytes
+    """
+    root = get_cache_dir(cache_dir)
+    for dirpath, dirs, files in os.walk(root):
+        for name in list(dirs):
+            path = os.path.join(dirpath, name)
+            if (name.startswith('.tmp-') and
+                    time.time() - os.stat(path).st_mtime > data.CACHE_TMP_MAX_AGE):
+                shutil.rmtree(path, True)
+                dirs.remove(name)
+    entries = sorted(iter_entries(cache_dir), key=lambda entry: entry[3])
+    total = sum(entry[2] for entry in entries)
+    removed = 0
+    freed = 0
+    for namespace, path, size, last_used in entries:
+        if total <= max_size:
+            break
+        try:
+            _remove_entry(namespace, path, cache_dir)
+        except OSError:  # pragma: no cover
+            # Removed by a concurrent process
+            pass
+        total -= size
+        freed += size
+        removed += 1
+    return removed, freed
+
+
+def clear(cache_dir=None):
+    """
+    Remove all the cache entries and statistics
+
+    :param cache_dir: cache root, see ``get_cache_dir``
+    :return: freed bytes
+    """
+    root = get_cache_dir(cache_dir)
+    if not os.path.isdir(root):
+        return 0
+    freed = _tree_size(root)
+    for namespace, path, size, last_used in list(iter_entries(cache_dir)):
+        if namespace != data.CACHE_PIP_DIR:
+            _remove_entry(namespace, path, cache_dir)
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, True)
+        else:
+            os.unlink(path)
+    return freed
+
+
+def parse_size(value):
+    """
+    Convert a size with an optional K, M, G or T suffix to bytes
+    """
+    value = value.strip().upper().rstrip('B')
+    multiplier = 1
+    if value and value[-1] in SIZE_UNITS:
+        multiplier = 1024 ** (SIZE_UNITS.index(value[-1]) + 1)
+        value = value[:-1]
+    return int(float(value) * multiplier)
+
+
+def format_size(size):
+    """
+    Returns a human readable size
+    """
+    unit = ''
+    for unit in ('',) + SIZE_UNITS:
+        if size < 1024 or unit == SIZE_UNITS[-1]:
+            break
+        size /= 1024.0
+    return '{0:.1f} {1}B'.format(size, unit) if unit else '{0} B'.format(size)
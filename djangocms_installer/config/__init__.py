@@ -6,21 +6,43 @@ import locale
 import os.path
 import sys
 import warnings
+from copy import deepcopy
 
 import six
-from tzlocal import get_localzone
 
-from . import data, ini
-from .. import compat, utils
-from ..utils import less_than_version, supported_versions
-from .internal import DbAction, validate_project
+from . import data, ini, layers, rules, specifiers
+from .. import compat, exceptions, utils
+from ..utils import supported_versions
+from .internal import DbAction, InstallerArgumentParser, simulate_latency, validate_project
 
 
-def parse(args):
+_parsers = {}
+
+
+def get_parser(raise_errors=False):
+    """
+    Returns the parser of the available arguments, built once per process
+
+    The parser is shared by all the callers and must not be modified.
+
+    :param raise_errors: raise ``ConfigurationError`` on invalid arguments instead of exiting
+    """
+    if raise_errors not in _parsers:
+        _parsers[raise_errors] = build_parser(raise_errors)
+    return _parsers[raise_errors]
+
+
+def build_parser(raise_errors=False):
     """
     Define the available arguments
+
+    Required options are checked when the configuration sources are merged, as
+    ``--parent-dir`` can be given by any of them.
+
+    :param raise_errors: raise ``ConfigurationError`` on invalid arguments instead of exiting
     """
-    parser = argparse.ArgumentParser(description='Bootstrap a django CMS project.')
+    parser = InstallerArgumentParser(description='Bootstrap a django CMS project.',
+                                     raise_errors=raise_errors)
     parser.add_argument('--config-file', dest='config_file', action='store',
                         default=None,
                         help='Configuration file for djangocms_installer')
@@ -39,8 +61,9 @@ def parse(args):
                         choices=('yes', 'no'),
                         default='yes', help='Activate Django timezone support')
     parser.add_argument('--timezone', '-t', dest='timezone',
-                        required=False, default=get_localzone(),
-                        action='store', help='Optional default time zone')
+                        required=False, default=None,
+                        action='store', help='Optional default time zone (default: local '
+                                             'time zone)')
     parser.add_argument('--reversion', '-e', dest='reversion', action='store',
                         choices=('yes', 'no'),
                         default='yes', help='Install and configure reversion support')
@@ -59,7 +82,7 @@ def parse(args):
                         choices=data.DJANGOCMS_SUPPORTED,
                         default='stable', help='django CMS version')
     parser.add_argument('--parent-dir', '-p', dest='project_directory',
-                        required=True, default='',
+                        default='',
                         action='store', help='Optional project parent directory')
     parser.add_argument('--bootstrap', dest='bootstrap', action='store',
                         choices=('yes', 'no'),
@@ -71,7 +94,7 @@ def parse(args):
                         default='no', help='Load a starting page with examples after installation '
                                            '(english language only). Choose "no" if you use a '
                                            'custom template set.')
-    parser.add_argument(dest='project_name', action='store',
+    parser.add_argument(dest='project_name', action='store', nargs='?',
                         help='Name of the project to be created')
 
     # Command that lists the supported plugins in verbose description
@@ -83,6 +106,14 @@ def parse(args):
                         help='It dumps the requirements that would be installed according to '
                              'parameters given. Together with --requirements argument is useful '
                              'for customizing the virtualenv')
+    parser.add_argument('--dump-requirements-matrix', dest='requirements_matrix',
+                        action='store', choices=data.REQUIREMENTS_MATRIX_FORMATS, default=None,
+                        help='Dump the requirements of every supported combination of versions '
+                             'and options, in JSON or CSV format')
+    parser.add_argument('--plan', dest='plan', action='store_true', default=False,
+                        help='Show the installation stages with their cache status, '
+                             'subprocesses and estimated duration, and the requirements, '
+                             'without installing anything')
 
     # Advanced options. These have a predefined default and are not managed
     # by config wizard.
@@ -120,48 +151,124 @@ def parse(args):
     parser.add_argument('--utc', dest='utc',
                         action='store_true',
                         default=False, help='Use UTC timezone.')
+    parser.add_argument('--no-cache', dest='no_cache',
+                        action='store_true',
+                        default=False, help='Don\'t use cached project files.')
+    parser.add_argument('--cache-dir', dest='cache_dir', action='store',
+                        default=None, help='Root directory of the installer caches, can be '
+                                           'shared by many hosts (default: ${0} or user cache '
+                                           'directory).'.format(data.CACHE_DIR_ENV))
+    parser.add_argument('--simulate', dest='simulate', action='store_true',
+                        default=False, help='Run the installation with stand-ins of pip, '
+                                            'django-admin and manage.py: nothing is installed.')
+    parser.add_argument('--simulate-latency', dest='simulate_latency', action='store',
+                        default='0', type=simulate_latency,
+                        help='Seconds each stand-in takes to run, for all of them or per '
+                             'command (e.g.: pip=2,manage.py=0.5).')
+    parser.add_argument('--simulate-fail', dest='simulate_fail', action='store',
+                        default=None, choices=data.SIMULATE_COMMANDS,
+                        help='Stand-in exiting with an error.')
+    checkpoint_group = parser.add_mutually_exclusive_group()
+    checkpoint_group.add_argument('--staging', dest='staging',
+                                  action='store_true',
+                                  default=False, help='Build the project in a temporary (tmpfs if '
+                                                      'available) directory and move it into '
+                                                      'place when done.')
+    checkpoint_group.add_argument('--resume', dest='resume',
+                                  action='store_true',
+                                  default=False, help='Resume a failed installation from the '
+                                                      'last completed step and keep the project '
+                                                      'directory in case of failure.')
+    return parser
+
+
+def parse(args, parser=None, config_items=None, environ=None):
+    """
+    Parse the arguments and validate the resulting configuration, exiting with
+    an error message if the configuration is not valid.
+
+    See ``resolve`` for the arguments.
+    """
+    try:
+        return resolve(args, parser, config_items, environ)
+    except exceptions.ConfigurationError as e:
+        stream = sys.stdout if isinstance(e, exceptions.ConfigDumpError) else sys.stderr
+        stream.write('{0}\n'.format(compat.unicode(e).rstrip('\n')))
+        sys.exit(e.code)
+
+
+def try_resolve(args, config_items=None, environ=None):
+    """
+    Parse the arguments and validate the resulting configuration, without
+    exiting nor writing anything, for the commands creating many projects
+
+    See ``resolve`` for the arguments.
+
+    :return: tuple of the configuration, None if it's not valid, and of the
+             error message, None if it's valid
+    """
+    try:
+        return resolve(args, get_parser(raise_errors=True), config_items, environ), None
+    except exceptions.ConfigurationError as e:
+        return None, compat.unicode(e).strip() or 'Invalid configuration'
+
 
-    if '--utc' in args:
-        for action in parser._positionals._actions:
-            if action.dest == 'timezone':
-                action.default = 'UTC'
+def resolve(args, parser=None, config_items=None, environ=None):
+    """
+    Parse the arguments and validate the resulting configuration, raising
+    ``ConfigurationError`` if it's not valid.
+
+    Options are taken from the parser defaults, the environment, the
+    configuration file and the command line, in increasing order of precedence
+    (see ``layers.resolve``); the source of each value is stored in the
+    ``sources`` attribute.
+
+    :param args: list of command line arguments
+    :param parser: parser returned by ``get_parser``, the shared one if not given
+    :param config_items: project options as returned by ``ini.project_items``,
+                         used instead of reading ``--config-file``
+    :param environ: environment mapping (default: ``os.environ``)
+    """
+    if parser is None:
+        parser = get_parser()
 
-    # If config_args then pretend that config args came from the stdin and run parser again.
-    config_args = ini.parse_config_file(parser, args)
-    args = parser.parse_args(config_args + args)
+    args, sources = layers.resolve(parser, args, config_items, environ)
+    args.sources = sources
+    if args.requirements_matrix:
+        return args
 
     # First of all, check if the project name is valid
     if not validate_project(args.project_name):
-        sys.stderr.write(
-            'Project name "{0}" is not a valid app name, or it\'s already defined. '
-            'Please use only numbers, letters and underscores.\n'.format(args.project_name)
+        raise exceptions.InvalidProjectNameError(
+            'Project name "{0}" is not a valid app name, it\'s already defined or it\'s '
+            'reserved for a djangocms command. Please use only numbers, letters and '
+            'underscores.'.format(args.project_name)
         )
-        sys.exit(3)
 
     # Checking the given path
-    setattr(args, 'project_path',
-            os.path.join(args.project_directory, args.project_name).strip())
-    if not args.skip_project_dir_check:
+    set_project_directory(args, args.project_directory)
+    # Resumed installations are checked against the checkpoint manifest
+    resuming = args.resume and os.path.exists(
+        os.path.join(args.project_directory, data.CHECKPOINT_FILE)
+    )
+    if not args.skip_project_dir_check and not resuming:
         if (os.path.exists(args.project_directory) and
                 [path for path in os.listdir(args.project_directory) if not path.startswith('.')]):
-            sys.stderr.write(
+            raise exceptions.ProjectDirectoryError(
                 'Path "{0}" already exists and is not empty, please choose a different one\n'
-                'If you want to use this path anyway use the -s flag to skip this check.\n'
+                'If you want to use this path anyway use the -s flag to skip this check.'
                 ''.format(args.project_directory)
             )
-            sys.exit(4)
 
-    if os.path.exists(args.project_path):
-        sys.stderr.write(
-            'Path "{0}" already exists, please choose a different one\n'.format(args.project_path)
+    if os.path.exists(args.project_path) and not resuming:
+        raise exceptions.ProjectDirectoryError(
+            'Path "{0}" already exists, please choose a different one'.format(args.project_path)
         )
-        sys.exit(4)
 
     if args.config_dump and os.path.isfile(args.config_dump):
-        sys.stdout.write(
-            'Cannot dump because given configuration file "{0}" exists.\n'.format(args.config_dump)
+        raise exceptions.ConfigDumpError(
+            'Cannot dump because given configuration file "{0}" exists.'.format(args.config_dump)
         )
-        sys.exit(8)
 
     args = _manage_args(parser,  args)
 
@@ -191,99 +298,40 @@ def parse(args):
         django_version, cms_version = supported_versions(args.django_version,
                                                          args.cms_version)
     except RuntimeError as e:
-        sys.stderr.write(compat.unicode(e))
-        sys.exit(6)
+        raise exceptions.UnsupportedVersionError(compat.unicode(e))
     if django_version is None:
-        sys.stderr.write(
+        raise exceptions.UnsupportedVersionError(
             'Please provide a Django supported version: {0}. Only Major.Minor '
-            'version selector is accepted\n'.format(', '.join(data.DJANGO_SUPPORTED))
+            'version selector is accepted'.format(', '.join(data.DJANGO_SUPPORTED))
         )
-        sys.exit(6)
-    if django_version is None:
-        sys.stderr.write(
+    if cms_version is None:
+        raise exceptions.UnsupportedVersionError(
             'Please provide a django CMS supported version: {0}. Only Major.Minor '
-            'version selector is accepted\n'.format(', '.join(data.DJANGOCMS_SUPPORTED))
+            'version selector is accepted'.format(', '.join(data.DJANGOCMS_SUPPORTED))
         )
-        sys.exit(6)
 
     if not getattr(args, 'requirements_file'):
-        requirements = []
-
-        # django CMS version check
-        if args.cms_version == 'develop':
-            requirements.append(data.DJANGOCMS_DEVELOP)
-            warnings.warn(data.VERSION_WARNING.format('develop', 'django CMS'))
-        elif args.cms_version == 'rc':  # pragma: no cover
-            requirements.append(data.DJANGOCMS_RC)
-        elif args.cms_version == 'beta':  # pragma: no cover
-            requirements.append(data.DJANGOCMS_BETA)
-            warnings.warn(data.VERSION_WARNING.format('beta', 'django CMS'))
-        else:
-            requirements.append('django-cms<{0}'.format(less_than_version(cms_version)))
-
-        if cms_version >= 3.3:
-            requirements.extend(data.REQUIREMENTS['cms-3.3'])
-        elif cms_version >= 3.2:
-            requirements.extend(data.REQUIREMENTS['cms-3.2'])
-
-        if not args.no_db_driver:
-            requirements.append(args.db_driver)
-        if not args.no_plugins:
-            if args.filer:
-                requirements.extend(data.REQUIREMENTS['plugins-common'])
-                requirements.extend(data.REQUIREMENTS['filer'])
-            else:
-                requirements.extend(data.REQUIREMENTS['plugins-common'])
-                requirements.extend(data.REQUIREMENTS['plugins-basic'])
-            if cms_version >= 3.3 or cms_version == 'rc':
-                requirements.extend(data.REQUIREMENTS['ckeditor-3.3'])
-            else:
-                requirements.extend(data.REQUIREMENTS['ckeditor-3.2'])
-
-        if args.aldryn:  # pragma: no cover
-            requirements.extend(data.REQUIREMENTS['aldryn'])
-
-        # Django version check
-        if args.django_version == 'develop':  # pragma: no cover
-            requirements.append(data.DJANGO_DEVELOP)
-            warnings.warn(data.VERSION_WARNING.format('develop', 'Django'))
-        elif args.django_version == 'beta':  # pragma: no cover
-            requirements.append(data.DJANGO_BETA)
-            warnings.warn(data.VERSION_WARNING.format('beta', 'Django'))
-        else:
-            requirements.append('Django<{0}'.format(less_than_version(django_version)))
-
-        # Timezone support
-        if args.use_timezone:
-            requirements.append('pytz')
-
-        # Requirements dependendent on django version
-        # if django_version < 1.7:
-        #    requirements.extend(data.REQUIREMENTS['django-legacy'])
-
-        # Reversion package version depends on django version
-        if args.reversion:
-            if django_version == 1.8:
-                requirements.extend(data.REQUIREMENTS['reversion-django-1.8'])
-            elif django_version == 1.9:
-                requirements.extend(data.REQUIREMENTS['reversion-django-1.9'])
-
-        if django_version == 1.8:
-            requirements.extend(data.REQUIREMENTS['django-1.8'])
-        elif django_version == 1.9:
-            requirements.extend(data.REQUIREMENTS['django-1.9'])
-
-        requirements.extend(data.REQUIREMENTS['default'])
+        for version, name in ((args.cms_version, 'django CMS'), (args.django_version, 'Django')):
+            if version in ('develop', 'beta'):
+                warnings.warn(data.VERSION_WARNING.format(version, name))
+        requirements = rules.requirements_for(
+            args.cms_version, args.django_version, args.filer, args.no_plugins,
+            '' if args.no_db_driver else args.db_driver, args.aldryn
+        )
+        setattr(args, 'requirements', '\n'.join(requirements))
+    elif os.path.isfile(args.requirements_file):
+        # The file is installed as is: only check it can be satisfied
+        conflicts = specifiers.merge(specifiers.read_file(args.requirements_file))[1]
+        if conflicts:
+            raise exceptions.RequirementsConflictError(specifiers.format_conflicts(conflicts))
 
-        setattr(args, 'requirements', '\n'.join(requirements).strip())
+    # Looking up the local time zone is slow: skip it if the project is not created
+    if not args.timezone and (args.config_dump or not (args.plugins or args.dump_reqs)):
+        args.timezone = get_localzone()
 
     # Convenient shortcuts
     setattr(args, 'cms_version', cms_version)
     setattr(args, 'django_version', django_version)
-    setattr(args, 'settings_path',
-            os.path.join(args.project_directory, args.project_name, 'settings.py').strip())
-    setattr(args, 'urlconf_path',
-            os.path.join(args.project_directory, args.project_name, 'urls.py').strip())
 
     if args.config_dump:
         ini.dump_config_file(args.config_dump, args, parser)
@@ -291,9 +339,38 @@ def parse(args):
     return args
 
 
+def set_project_directory(args, project_directory):
+    """
+    Set the project directory and the paths derived from it
+    """
+    setattr(args, 'project_directory', project_directory)
+    setattr(args, 'project_path',
+            os.path.join(project_directory, args.project_name).strip())
+    setattr(args, 'settings_path',
+            os.path.join(project_directory, args.project_name, 'settings.py').strip())
+    setattr(args, 'urlconf_path',
+            os.path.join(project_directory, args.project_name, 'urls.py').strip())
+
+
 def get_settings():
+    """
+    Returns a copy of the settings defaults: callers can modify it without
+    affecting the following projects
+    """
     module = __import__(str('djangocms_installer.config'), globals(), locals(), [str('settings')])
-    return module.settings
+    return argparse.Namespace(**dict(
+        (name, deepcopy(value)) for name, value in vars(module.settings).items()
+        if name.isupper()
+    ))
+
+
+def get_localzone():
+    """
+    Returns the local time zone
+    """
+    from tzlocal import get_localzone
+
+    return get_localzone()
 
 
 def write_default(config):
@@ -307,6 +384,15 @@ def show_plugins():
     sys.stdout.write(compat.unicode(data.PLUGIN_LIST_TEXT))
 
 
+def show_requirements_matrix(output_format):
+    """
+    Prints the requirements of every supported combination of options
+
+    :param output_format: ``json`` or ``csv``
+    """
+    sys.stdout.write(rules.matrix(output_format))
+
+
 def show_requirements(args):
     """
     Prints the list of requirements according to the arguments provided
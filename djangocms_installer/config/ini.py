@@ -1,49 +1,81 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 
-import sys
+from collections import OrderedDict
 
 from .data import CMS_VERSION_MATRIX, DJANGO_VERSION_MATRIX
 
 try:
-    from configparser import ConfigParser  # Python 3.
+    from configparser import ConfigParser, Error  # NOQA # Python 3.
 except ImportError:
-    from ConfigParser import ConfigParser  # Python 2.
+    from ConfigParser import ConfigParser, Error  # NOQA # Python 2.
+
+BOOLEAN_STATES = getattr(ConfigParser, 'BOOLEAN_STATES', None) or ConfigParser._boolean_states
 
 
 SECTION = 'djangocms_installer'
+PROJECT_SECTION = '{0}:'.format(SECTION)
+INHERIT_KEY = 'inherit'
+# Options whose empty value selects the default
+EMPTY_VALUE_OPTIONS = (
+    '--extra-settings', '--languages', '--requirements', '--template', '--timezone',
+    '--cache-dir', '--simulate-fail',
+)
 
 
-def parse_config_file(parser, stdin_args):
-    """Parse config file.
+def read_config_file(filename):
+    """Read config file.
 
-    Returns a list of additional args.
+    Raises IOError if the file can't be read.
     """
-    config_args = []
-
-    # Temporary switch required args and save them to restore.
-    required_args = []
-    for action in parser._actions:
-        if action.required:
-            required_args.append(action)
-            action.required = False
-
-    parsed_args = parser.parse_args(stdin_args)
+    config = ConfigParser()
+    if not config.read(filename):
+        raise IOError('Config file "{0}" doesn\'t exists'.format(filename))
+    return config
 
-    # Restore required args.
-    for action in required_args:
-        action.required = True
 
-    if not parsed_args.config_file:
-        return config_args
+def project_items(config, project_name=None, _seen=()):
+    """Return the options of a project.
 
-    config = ConfigParser()
-    if not config.read(parsed_args.config_file):
-        sys.stderr.write('Config file "{0}" doesn\'t exists\n'.format(parsed_args.config_file))
-        sys.exit(7)  # It isn't used anythere.
+    Options of the base section are overridden by the ones in the
+    ``[djangocms_installer:<project_name>]`` section, if any; a project section
+    can inherit the options of another project section with the ``inherit`` key.
 
-    config_args = _convert_config_to_stdin(config, parser)
-    return config_args
+    Returns a list of (key, value) tuples.
+    """
+    items = OrderedDict()
+    section = '{0}{1}'.format(PROJECT_SECTION, project_name)
+    if project_name and config.has_section(section):
+        if project_name in _seen:
+            raise ValueError('Circular inheritance in section "{0}"'.format(section))
+        project = OrderedDict(config.items(section))
+        parent = project.pop(INHERIT_KEY, None)
+        if parent:
+            if not config.has_section('{0}{1}'.format(PROJECT_SECTION, parent)):
+                raise ValueError('Section "{0}" inherits from missing project "{1}"'.format(
+                    section, parent
+                ))
+            items.update(project_items(config, parent, _seen + (project_name,)))
+        elif config.has_section(SECTION):
+            items.update(config.items(SECTION))
+        items.update(project)
+    elif config.has_section(SECTION):
+        items.update(config.items(SECTION))
+    return list(items.items())
+
+
+def parse_projects(config):
+    """Parse the project sections of a config file read by :py:func:`read_config_file`.
+
+    Returns an ordered dictionary mapping the name of each
+    ``[djangocms_installer:<name>]`` section to its options, as returned by
+    :py:func:`project_items`; the dictionary is empty if the file contains no
+    project section.
+    """
+    return OrderedDict(
+        (section[len(PROJECT_SECTION):], project_items(config, section[len(PROJECT_SECTION):]))
+        for section in config.sections() if section.startswith(PROJECT_SECTION)
+    )
 
 
 def dump_config_file(filename, args, parser=None):
@@ -54,20 +86,18 @@ def dump_config_file(filename, args, parser=None):
         for attr in args:
             config.set(SECTION, attr, args.attr)
     else:
-        keys_empty_values_not_pass = (
-            '--extra-settings', '--languages', '--requirements', '--template', '--timezone')
-
         # positionals._option_string_actions
         for action in parser._actions:
-            if action.dest in ('help', 'config_file', 'config_dump', 'project_name'):
+            if action.dest in ('help', 'config_file', 'config_dump', 'project_name',
+                               'requirements_matrix'):
                 continue
 
             keyp = action.option_strings[0]
             option_name = keyp.lstrip('-')
             option_value = getattr(args, action.dest)
-            if any([i for i in keys_empty_values_not_pass if i in action.option_strings]):
+            if any([i for i in EMPTY_VALUE_OPTIONS if i in action.option_strings]):
                 if action.dest == 'timezone':
-                    config.set(SECTION, option_name, option_value.zone)
+                    config.set(SECTION, option_name, getattr(option_value, 'zone', option_value))
                 elif action.dest == 'languages':
                     if len(option_value) == 1 and option_value[0] == 'en':
                         config.set(SECTION, option_name, '')
@@ -93,33 +123,3 @@ def dump_config_file(filename, args, parser=None):
                 config.set(SECTION, option_name, str(option_value))
     with open(filename, 'w') as fp:
         config.write(fp)
-
-
-def _convert_config_to_stdin(config, parser):
-    """Convert config options to stdin args.
-
-    Especially boolean values, for more information
-    @see https://docs.python.org/3.4/library/configparser.html#supported-datatypes
-    """
-    keys_empty_values_not_pass = (
-        '--extra-settings', '--languages', '--requirements', '--template', '--timezone')
-    args = []
-    for key, val in config.items(SECTION):
-        keyp = '--{0}'.format(key)
-        action = parser._option_string_actions[keyp]
-
-        if action.const:
-            try:
-                if config.getboolean(SECTION, key):
-                    args.append(keyp)
-            except ValueError:
-                args.extend([keyp, val])  # Pass it as is to get the error from ArgumentParser.
-        elif any([i for i in keys_empty_values_not_pass if i in action.option_strings]):
-            # Some keys with empty values shouldn't be passed into args to use their defaults
-            # from ArgumentParser.
-            if val != '':
-                args.extend([keyp, val])
-        else:
-            args.extend([keyp, val])
-
-    return args
@@ -2,18 +2,45 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import keyword
+import pkgutil
 import sys
-from argparse import Action
+from argparse import Action, ArgumentParser
 
-import dj_database_url
+try:
+    from importlib.util import find_spec  # Python 3.
+except ImportError:  # pragma: no cover
+    find_spec = None  # Python 2.
 
-from .data import DRIVERS
+from .data import COMMANDS, DRIVERS
+from ..exceptions import ConfigurationError
+
+
+class InstallerArgumentParser(ArgumentParser):
+    """
+    Argument parser raising ``ConfigurationError`` instead of exiting when
+    ``raise_errors`` is set
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.raise_errors = kwargs.pop('raise_errors', False)
+        super(InstallerArgumentParser, self).__init__(*args, **kwargs)
+
+    def error(self, message):
+        if self.raise_errors:
+            raise ConfigurationError(message, 2)
+        super(InstallerArgumentParser, self).error(message)
 
 
 class DbAction(Action):
 
     def __call__(self, parser, namespace, values, option_string):
-        parsed = dj_database_url.parse(values)
+        import dj_database_url
+
+        try:
+            parsed = dj_database_url.parse(values)
+        except KeyError:
+            # Unknown scheme
+            parsed = {}
         if parsed.get('ENGINE', None):
             if DRIVERS[parsed['ENGINE']] == 'postgis':
                 sys.stdout.write('postgis installation is not supported at the moment.\n'
@@ -25,19 +52,69 @@ class DbAction(Action):
             raise ValueError('Database URL not recognized, try again')
 
 
+def simulate_latency(value):
+    """
+    Check the ``--simulate-latency`` value, see ``simulate.parse_latency``
+    """
+    from ..simulate import parse_latency
+
+    parse_latency(value)
+    return value
+
+
 def validate_project(project_name):
     """
-    Check the defined project name against keywords, builtins and existing
-    modules to avoid name clashing
+    Check the defined project name against keywords, builtins, existing
+    modules and the installer commands to avoid name clashing
     """
     if '-' in project_name:
         return None
+    if project_name in COMMANDS:
+        return None
     if keyword.iskeyword(project_name):
         return None
     if project_name in dir(__builtins__):
         return None
-    try:
-        __import__(project_name)
+    if is_importable(project_name):
         return None
-    except ImportError:
-        return project_name
+    return project_name
+
+
+_top_level_modules = None
+_importable = {}
+
+
+def top_level_modules():
+    """
+    Returns the names of the top-level modules found on ``sys.path``, computed
+    once per process
+    """
+    global _top_level_modules
+    if _top_level_modules is None:
+        names = set(sys.builtin_module_names)
+        names.update(name for _, name, _ in pkgutil.iter_modules())
+        _top_level_modules = frozenset(names)
+    return _top_level_modules
+
+
+def is_importable(name):
+    """
+    Check if a top-level module with the given name can be imported, without
+    importing it
+
+    Names not found on ``sys.path`` are looked up with the import system
+    finders (e.g.: for namespace packages and import hooks); results are cached.
+    """
+    if name in sys.modules or name in top_level_modules():
+        return True
+    if name not in _importable:
+        try:
+            if find_spec:
+                _importable[name] = find_spec(name) is not None
+            else:  # pragma: no cover
+                import imp
+                imp.find_module(name)
+                _importable[name] = True
+        except (ImportError, ValueError):
+            _importable[name] = False
+    return _importable[name]
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+from argparse import SUPPRESS, ArgumentError, Namespace
+from collections import OrderedDict
+
+from . import data, ini
+from .. import compat
+from ..exceptions import ConfigFileError
+
+DEFAULTS = 'default'
+ENVIRONMENT = 'environment'
+CONFIG_FILE = 'config file'
+COMMAND_LINE = 'command line'
+
+
+def _unset_namespace(parser):
+    # argparse doesn't set the defaults of the attributes already in the
+    # namespace: options left to None are the ones not given
+    return Namespace(**dict(
+        (action.dest, None) for action in parser._actions if action.default is not SUPPRESS
+    ))
+
+
+def defaults(parser):
+    """
+    Returns the namespace of the parser defaults
+    """
+    return Namespace(**dict(
+        (action.dest, action.default) for action in parser._actions
+        if action.default is not SUPPRESS
+    ))
+
+
+def environment_items(parser, environ=None):
+    """
+    Returns the options set in the environment
+
+    Each option is read from the ``DJANGOCMS_INSTALLER_<OPTION>`` variable,
+    e.g.: ``DJANGOCMS_INSTALLER_CMS_VERSION`` for ``--cms-version``.
+
+    :param parser: installer parser
+    :param environ: environment mapping (default: ``os.environ``)
+    :return: list of (key, value) tuples, as returned by ``ini.project_items``
+    """
+    environ = os.environ if environ is None else environ
+    items = []
+    for action in parser._actions:
+        for option in action.option_strings:
+            if not option.startswith('--') or option in data.ENV_IGNORED_OPTIONS:
+                continue
+            name = '{0}{1}'.format(data.ENV_PREFIX, option[2:].upper().replace('-', '_'))
+            if name in environ:
+                items.append((option[2:], environ[name]))
+    return items
+
+
+def apply_items(parser, items, source):
+    """
+    Convert the options read from a configuration source with the parser actions
+
+    :param parser: installer parser
+    :param items: list of (key, value) tuples
+    :param source: name of the configuration source, used in error messages
+    :return: namespace with the options not given set to None
+    """
+    namespace = _unset_namespace(parser)
+    for key, value in items:
+        option = '--{0}'.format(key)
+        action = parser._option_string_actions.get(option)
+        if action is None:
+            raise ConfigFileError('Unknown option "{0}" in {1}'.format(key, source))
+        try:
+            if action.nargs == 0:
+                if value.lower() not in ini.BOOLEAN_STATES:
+                    raise ArgumentError(action, 'invalid boolean value: \'{0}\''.format(value))
+                setattr(namespace, action.dest,
+                        action.const if ini.BOOLEAN_STATES[value.lower()] else action.default)
+            elif value == '' and option in ini.EMPTY_VALUE_OPTIONS:
+                # Empty values select the default
+                continue
+            else:
+                action(parser, namespace, parser._get_values(action, [value]), option)
+        except ArgumentError as e:
+            parser.error('{0} (from {1})'.format(e, source))
+    return namespace
+
+
+def merge(layers):
+    """
+    Merge configuration layers
+
+    :param layers: list of (source, namespace) tuples, from the lowest to the
+                   highest precedence; attributes set to None are not merged,
+                   except in the first layer
+    :return: tuple of the merged namespace and of the dictionary mapping each
+             attribute to the source it comes from
+    """
+    base_source, base = layers[0]
+    namespace = Namespace(**vars(base))
+    sources = OrderedDict((key, base_source) for key in sorted(vars(base)))
+    for source, layer in layers[1:]:
+        for key, value in vars(layer).items():
+            if value is not None:
+                setattr(namespace, key, value)
+                sources[key] = source
+    return namespace, sources
+
+
+def _check(parser, namespace, sources):
+    if [dest for dest in data.STANDALONE_OPTIONS if getattr(namespace, dest)]:
+        return
+    missing = [
+        '/'.join(action.option_strings) or action.dest for action in parser._actions
+        if action.dest in data.REQUIRED_OPTIONS and not getattr(namespace, action.dest)
+    ]
+    if missing:
+        parser.error('the following arguments are required: {0}'.format(', '.join(missing)))
+    for group in parser._mutually_exclusive_groups:
+        given = [action for action in group._group_actions
+                 if sources[action.dest] != DEFAULTS and
+                 getattr(namespace, action.dest) != action.default]
+        if len(given) > 1:
+            parser.error('argument {0}: not allowed with argument {1}'.format(
+                '/'.join(given[1].option_strings), '/'.join(given[0].option_strings)
+            ))
+
+
+def resolve(parser, args, config_items=None, environ=None):
+    """
+    Merge the parser defaults, the environment, the configuration file and the
+    command line arguments, in increasing order of precedence
+
+    Each source is parsed once and the parser is not modified.
+
+    :param parser: installer parser
+    :param args: list of command line arguments
+    :param config_items: project options as returned by ``ini.project_items``,
+                         used instead of reading ``--config-file``
+    :param environ: environment mapping (default: ``os.environ``)
+    :return: tuple of the merged namespace and of the dictionary mapping each
+             attribute to the source it comes from
+    """
+    command_line = parser.parse_args(args, _unset_namespace(parser))
+    environment = apply_items(parser, environment_items(parser, environ), ENVIRONMENT)
+    if config_items is None:
+        config_items = []
+        config_file = command_line.config_file or environment.config_file
+        if config_file:
+            try:
+                config_items = ini.project_items(
+                    ini.read_config_file(config_file), command_line.project_name
+                )
+            except (IOError, ValueError) as e:
+                raise ConfigFileError(compat.unicode(e))
+    namespace, sources = merge([
+        (DEFAULTS, defaults(parser)),
+        (ENVIRONMENT, environment),
+        (CONFIG_FILE, apply_items(parser, config_items, CONFIG_FILE)),
+        (COMMAND_LINE, command_line),
+    ])
+    # --utc only changes the default time zone
+    if namespace.utc and sources['timezone'] == DEFAULTS:
+        namespace.timezone = 'UTC'
+        sources['timezone'] = sources['utc']
+    _check(parser, namespace, sources)
+    return namespace, sources
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import csv
+import itertools
+import json
+from collections import OrderedDict
+
+from six import StringIO
+
+from . import data, specifiers
+from ..exceptions import RequirementsConflictError
+from ..utils import less_than_version, supported_versions
+
+
+def factors(cms_version, django_version, filer=False, no_plugins=False, db_driver='',
+            aldryn=False):
+    """
+    Returns the factors the requirements rules are matched against
+
+    :param cms_version: django CMS version, as given in the options
+    :param django_version: Django version, as given in the options
+    :param filer: whether django-filer is installed
+    :param no_plugins: whether the plugins are not installed
+    :param db_driver: database driver package, empty if none
+    :param aldryn: whether Aldryn boilerplate is used
+    :raises RuntimeError: if the versions are not compatible
+    """
+    django_number, cms_number = supported_versions(django_version, cms_version)
+    return {
+        'cms_release': cms_version if cms_version in data.DJANGOCMS_UNRELEASED else 'released',
+        'cms_version': cms_number,
+        'cms_next': less_than_version(cms_number),
+        'django_release': (django_version if django_version in data.DJANGO_UNRELEASED
+                           else 'released'),
+        'django_version': django_number,
+        'django_next': less_than_version(django_number),
+        'filer': bool(filer),
+        'plugins': not no_plugins,
+        'db_driver': db_driver or '',
+        'aldryn': bool(aldryn),
+    }
+
+
+def select(values, rules=data.REQUIREMENTS_RULES):
+    """
+    Returns the requirements of the rules matching the factors
+
+    :param values: factors, as returned by ``factors``
+    :param rules: requirements rules
+    :return: list of (requirement, group) tuples, group being the name of the
+             ``REQUIREMENTS`` group the requirement comes from
+    """
+    requirements = []
+    for conditions, group in rules:
+        if all(values[factor] in accepted for factor, accepted in conditions.items()):
+            requirements.extend(
+                (item.format(**values), group) for item in data.REQUIREMENTS[group]
+            )
+    return [(item, group) for item, group in requirements if item]
+
+
+def evaluate(values, rules=data.REQUIREMENTS_RULES):
+    """
+    Returns the requirements matching the factors, merged per project
+
+    :param values: factors, as returned by ``factors``
+    :param rules: requirements rules
+    :return: list of requirements
+    :raises RequirementsConflictError: if the requirements of a project conflict
+    """
+    requirements, conflicts = specifiers.merge(select(values, rules))
+    if conflicts:
+        raise RequirementsConflictError(specifiers.format_conflicts(conflicts))
+    return requirements
+
+
+def _domain():
+    db_drivers = sorted(set(data.DRIVERS.values()))
+    return itertools.product(data.DJANGOCMS_SUPPORTED, data.DJANGO_SUPPORTED, (False, True),
+                             (False, True), db_drivers)
+
+
+# Requirements of the combinations already evaluated in the process
+_requirements = {}
+
+
+def index():
+    """
+    Returns the requirements of every supported combination of options.
+
+    Every combination is evaluated: only the requirements matrix needs it,
+    use ``requirements_for`` to get the requirements of a single one.
+
+    :return: dictionary mapping the values of ``REQUIREMENTS_MATRIX_OPTIONS``
+             to the list of requirements
+    """
+    requirements = OrderedDict()
+    for key in _domain():
+        try:
+            requirements[key] = requirements_for(*key)
+        except RuntimeError:
+            # Versions not compatible
+            continue
+    return requirements
+
+
+def requirements_for(cms_version, django_version, filer=False, no_plugins=False,
+                     db_driver='', aldryn=False):
+    """
+    Returns the requirements of the options, evaluated once per process
+
+    See ``factors`` for the parameters.
+    """
+    key = (cms_version, django_version, bool(filer), bool(no_plugins), db_driver or '',
+           bool(aldryn))
+    if key not in _requirements:
+        _requirements[key] = evaluate(
+            factors(cms_version, django_version, filer, no_plugins, db_driver, aldryn)
+        )
+    return list(_requirements[key])
+
+
+def matrix(output_format):
+    """
+    Returns the requirements of every supported combination of options
+
+    :param output_format: ``json`` or ``csv``
+    :return: formatted matrix
+    """
+    rows = [
+        OrderedDict(list(zip(data.REQUIREMENTS_MATRIX_OPTIONS, key)) +
+                    [('requirements', requirements)])
+        for key, requirements in index().items()
+    ]
+    if output_format == 'json':
+        return '{0}\n'.format(json.dumps(rows, indent=2))
+    output = StringIO()
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(data.REQUIREMENTS_MATRIX_OPTIONS + ('requirements',))
+    for row in rows:
+        writer.writerow([
+            ' '.join(value) if isinstance(value, list) else value for value in row.values()
+        ])
+    return output.getvalue()
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Merge the requirements of the same project and detect the conflicting ones
+
+All the PEP 440 operators are accepted. Versions are matched with
+``packaging.specifiers.SpecifierSet``, pre-releases included (as installed
+versions are checked); whether several specifiers leave any version at all is
+only computed from their bounds (``<``, ``<=``, ``>``, ``>=``, ``~=`` and
+``==`` with wildcards), with these limitations:
+
+* ``!=`` with wildcards and ``===`` are kept as they are, and only checked
+  against ``==`` pins;
+* pre-releases are ordered as any other version: ``>=2.0.dev1,<2.0`` is not
+  reported, although ``<2.0`` excludes the pre-releases of 2.0.
+"""
+from __future__ import absolute_import, print_function, unicode_literals
+
+import re
+from collections import OrderedDict, namedtuple
+
+from packaging.version import InvalidVersion, parse as parse_version
+
+REQUIREMENT_RE = re.compile(
+    r'^(?P<name>[A-Za-z0-9][A-Za-z0-9._-]*)\s*(?P<extras>\[[^\]]*\])?\s*(?P<specifiers>.*)$'
+)
+SPECIFIER_RE = re.compile(r'^(?P<operator>~=|===|==|!=|<=|>=|<|>)\s*(?P<version>\S+)$')
+
+Conflict = namedtuple('Conflict', ('name', 'requirements', 'reason'))
+Conflict.__doc__ = """
+Conflicting requirements: ``requirements`` is the list of (requirement, source) tuples
+"""
+
+
+def canonical_name(name):
+    """
+    Returns the normalized name of a project (PEP 503)
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_requirement(line):
+    """
+    Parse a requirement made of a project name, optional extras and version specifiers
+
+    :param line: requirement
+    :return: tuple of name, extras and list of (operator, version) tuples, or None
+             for requirements that can't be merged (URLs, options, markers...)
+    """
+    line = line.strip()
+    if not line or line.startswith('-') or ';' in line or '@' in line or '://' in line:
+        return None
+    match = REQUIREMENT_RE.match(line)
+    if not match:
+        return None
+    specifiers = []
+    for item in match.group('specifiers').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        specifier = SPECIFIER_RE.match(item)
+        if not specifier:
+            return None
+        operator, version = specifier.group('operator'), specifier.group('version')
+        if operator != '===':
+            try:
+                parse_version(version[:-2] if version.endswith('.*') else version)
+            except InvalidVersion:
+                return None
+        specifiers.append((operator, version))
+    return match.group('name'), match.group('extras') or '', specifiers
+
+
+def _prefix_range(version, drop):
+    # Range of the versions starting with the version release, after removing
+    # the last drop items: ``1.2.*`` and ``~=1.2.3`` (drop 1)
+    release = list(parse_version(version).release)
+    prefix = release[:len(release) - drop] or release
+    upper = prefix[:-1] + [prefix[-1] + 1]
+    return '.'.join(str(item) for item in upper)
+
+
+def _bounds(specifiers):
+    # Expand ~= and wildcards into simple bounds
+    for operator, version in specifiers:
+        if operator == '~=':
+            yield '>=', version
+            yield '<', _prefix_range(version, 1)
+        elif operator == '==' and version.endswith('.*'):
+            yield '>=', version[:-2]
+            yield '<', _prefix_range(version[:-2], 0)
+        elif operator == '!=' and version.endswith('.*'):
+            # Can't be simplified: kept as is
+            yield '!=*', version
+        else:
+            yield operator, version
+
+
+def _format(specifiers):
+    return ','.join('{0}{1}'.format(operator, version) for operator, version in specifiers)
+
+
+def _check_pin(specifiers, version):
+    # Reason why the pinned version doesn't match the specifiers, if any
+    # packaging.specifiers is slow to import: only imported when needed
+    from packaging.specifiers import Specifier
+
+    for operator, other in specifiers:
+        if not Specifier(_format([(operator, other)])).contains(version, prereleases=True):
+            if operator == '!=':
+                return '{0} is excluded'.format(version)
+            return '{0} is not {1}{2}'.format(version, operator, other)
+    return None
+
+
+def simplify(specifiers):
+    """
+    Merge version specifiers into an equivalent minimal list
+
+    :param specifiers: list of (operator, version) tuples
+    :return: tuple of the list of (operator, version) tuples and of the reason
+             why no version can match them, if any
+    """
+    lower = upper = None
+    pins = OrderedDict()
+    excluded = OrderedDict()
+    opaque = []
+    for operator, version in _bounds(specifiers):
+        if operator == '===':
+            opaque.append((operator, version))
+            continue
+        if operator == '!=*':
+            opaque.append(('!=', version))
+            continue
+        parsed = parse_version(version)
+        if operator == '==':
+            pins[parsed] = version
+        elif operator == '!=':
+            excluded[parsed] = version
+        elif operator in ('>=', '>'):
+            bound = (parsed, operator == '>', version)
+            if lower is None or bound[:2] > lower[:2]:
+                lower = bound
+        else:
+            bound = (parsed, operator == '<=', version)
+            if upper is None or bound[:2] < upper[:2]:
+                upper = bound
+
+    def format_lower():
+        return ('>' if lower[1] else '>=', lower[2])
+
+    def format_upper():
+        return ('<=' if upper[1] else '<', upper[2])
+
+    if len(pins) > 1:
+        return specifiers, 'pinned to different versions'
+    if pins:
+        version = list(pins.values())[0]
+        reason = _check_pin(specifiers, version)
+        if reason:
+            return specifiers, reason
+        return [('==', version)] + [item for item in opaque if item[0] == '==='], None
+    if lower and upper and (lower[0] > upper[0] or (
+            lower[0] == upper[0] and (lower[1] or not upper[1]))):
+        return specifiers, 'no version is {0}{1} and {2}{3}'.format(
+            *(format_lower() + format_upper())
+        )
+    if lower and upper and lower[0] == upper[0]:
+        reason = _check_pin(specifiers, lower[2])
+        if reason:
+            return specifiers, reason
+        return [('==', lower[2])] + [item for item in opaque if item[0] == '==='], None
+    merged = []
+    if lower:
+        merged.append(format_lower())
+    if upper:
+        merged.append(format_upper())
+    for parsed, version in excluded.items():
+        if ((not lower or parsed > lower[0] or (parsed == lower[0] and not lower[1])) and
+                (not upper or parsed < upper[0] or (parsed == upper[0] and upper[1]))):
+            merged.append(('!=', version))
+    return merged + opaque, None
+
+
+def contains(specifiers, version):
+    """
+    Check if the version matches all the version specifiers
+
+    :param specifiers: list of (operator, version) tuples
+    :param version: version string
+    """
+    from packaging.specifiers import SpecifierSet
+
+    try:
+        return SpecifierSet(_format(specifiers)).contains(version, prereleases=True)
+    except InvalidVersion:
+        # Not a PEP 440 version
+        return False
+
+
+def merge(requirements):
+    """
+    Merge the requirements of the same project into a single requirement
+
+    :param requirements: list of (requirement, source) tuples, where source
+                         describes where the requirement comes from
+    :return: tuple of the list of merged requirements, in order of first
+             appearance, and of the list of ``Conflict``
+    """
+    merged = OrderedDict()
+    for requirement, source in requirements:
+        parsed = parse_requirement(requirement)
+        if parsed is None:
+            merged.setdefault(requirement, {'line': requirement, 'items': []})
+            continue
+        name, extras, specifiers = parsed
+        entry = merged.setdefault(canonical_name(name), {
+            'name': name, 'extras': set(), 'specifiers': [], 'items': []
+        })
+        entry['extras'].update(
+            extra.strip() for extra in extras.strip('[]').split(',') if extra.strip()
+        )
+        entry['specifiers'].extend(specifiers)
+        entry['items'].append((requirement, source))
+    result = []
+    conflicts = []
+    for key, entry in merged.items():
+        if 'line' in entry:
+            result.append(entry['line'])
+            continue
+        specifiers, reason = simplify(entry['specifiers'])
+        if reason:
+            conflicts.append(Conflict(entry['name'], entry['items'], reason))
+        extras = '[{0}]'.format(','.join(sorted(entry['extras']))) if entry['extras'] else ''
+        result.append('{0}{1}{2}'.format(entry['name'], extras, _format(specifiers)))
+    return result, conflicts
+
+
+def read_file(filename):
+    """
+    Returns the requirements of a requirements file
+
+    :param filename: requirements file path
+    :return: list of (requirement, source) tuples, the source being the file
+             name and line number
+    """
+    requirements = []
+    with open(filename) as fp:
+        for number, line in enumerate(fp, 1):
+            line = line.split(' #')[0].strip()
+            if line and not line.startswith('#'):
+                requirements.append((line, '{0}:{1}'.format(filename, number)))
+    return requirements
+
+
+def format_conflicts(conflicts):
+    """
+    Returns the description of the conflicts
+    """
+    return '\n'.join(
+        'Conflicting requirements for {0} ({1}): {2}'.format(
+            conflict.name, conflict.reason, ', '.join(
+                '{0} from {1}'.format(requirement, source)
+                for requirement, source in conflict.requirements
+            )
+        ) for conflict in conflicts
+    )
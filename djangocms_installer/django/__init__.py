@@ -3,67 +3,217 @@ from __future__ import absolute_import, print_function, unicode_literals
 
 import glob
 import os
+import random
 import re
 import shutil
 import subprocess
 import sys
 import tempfile
-import textwrap
 import zipfile
-from copy import copy, deepcopy
+from collections import OrderedDict
+from copy import deepcopy
+from pprint import pformat
 
-from six import BytesIO, iteritems
+from six import BytesIO
 
+from .. import exceptions, simulate
 from ..config import data, get_settings
 from ..utils import chdir, format_val
+from . import source
 
 try:
     from shlex import quote as shlex_quote
 except ImportError:
     from pipes import quote as shlex_quote
 
+try:
+    from importlib.util import find_spec  # Python 3.
+except ImportError:  # pragma: no cover
+    find_spec = None  # Python 2.
 
-def create_project(config_data):
+SECRET_KEY_RE = re.compile(r'^SECRET_KEY = ([\'"])(.*)\1[ \t]*$', re.MULTILINE)
+
+
+def startproject_command(config_data, create=True):
     """
-    Call django-admin to create the project structure
+    Returns the django-admin command line creating the project structure
 
     :param config_data: configuration data
+    :param create: whether to create the stand-in in simulate mode
     """
-    env = deepcopy(dict(os.environ))
-    env[str('DJANGO_SETTINGS_MODULE')] = str('{0}.settings'.format(config_data.project_name))
-    env[str('PYTHONPATH')] = str(os.pathsep.join(map(shlex_quote, sys.path)))
-    kwargs = {}
-    args = []
-    if config_data.template:
-        kwargs['template'] = config_data.template
-    args.append(config_data.project_name)
+    args = [config_data.project_name]
     if config_data.project_directory:
         args.append(config_data.project_directory)
-        if not os.path.exists(config_data.project_directory):
-            os.makedirs(config_data.project_directory)
-    start_cmd = os.path.join(os.path.dirname(sys.executable), 'django-admin.py')
-    cmd_args = ' '.join([sys.executable, start_cmd, 'startproject'] + args)
+    start_cmd = simulate.command(config_data, 'django-admin', create) or [
+        sys.executable, os.path.join(os.path.dirname(sys.executable), 'django-admin.py')
+    ]
+    return start_cmd + ['startproject'] + args
+
+
+def manage_command(config_data, *args, **kwargs):
+    """
+    Returns the command line running the project ``manage.py`` with the given arguments
+
+    :param config_data: configuration data
+    :param create: whether to create the stand-in in simulate mode (keyword only)
+    """
+    manage = simulate.command(config_data, 'manage.py', kwargs.get('create', True)) or [
+        sys.executable, '-W', 'ignore', 'manage.py'
+    ]
+    return manage + list(args)
+
+
+def script_command(config_data, script, create=True):
+    """
+    Returns the command line running a script in the project directory
+
+    :param config_data: configuration data
+    :param script: script path
+    :param create: whether to create the stand-in in simulate mode
+    """
+    # Project scripts are run by the manage.py stand-in in simulate mode
+    return (simulate.command(config_data, 'manage.py', create) or [sys.executable]) + [script]
+
+
+def _write_output(config_data, output):
+    # Commands output is not shown for the projects created with ``quiet``
+    # set, e.g. to warm the cache
+    if not getattr(config_data, 'quiet', False):
+        sys.stdout.write(output.decode('utf-8'))
+
+
+def create_project(config_data):
+    """
+    Call django-admin to create the project structure
+
+    :param config_data: configuration data
+    """
+    if config_data.project_directory and not os.path.exists(config_data.project_directory):
+        os.makedirs(config_data.project_directory)
+    cmd_args = ' '.join(startproject_command(config_data))
     if config_data.verbose:
         sys.stdout.write('Project creation command: {0}\n'.format(cmd_args))
     output = subprocess.check_output(cmd_args, shell=True)
-    sys.stdout.write(output.decode('utf-8'))
+    _write_output(config_data, output)
+    _check_settings(config_data, 'create_project')
+
+
+def _check_settings(config_data, stage):
+    """
+    Raise ProjectStructureError if the project has no settings file
+    """
+    if not os.path.exists(config_data.settings_path):
+        raise exceptions.ProjectStructureError(
+            'Error while creating target project, please check the given configuration: '
+            '{0} does not exist'.format(config_data.settings_path), stage
+        )
+
+
+def generate_secret_key():
+    """
+    Returns a new random value for the SECRET_KEY setting
+    """
+    chars = 'abcdefghijklmnopqrstuvwxyz0123456789!@#$%^&*(-_=+)'
+    generator = random.SystemRandom()
+    return ''.join(generator.choice(chars) for i in range(50))
+
+
+def get_secret_key(settings_path):
+    """
+    Returns the SECRET_KEY value defined in the settings file, if any
+
+    :param settings_path: path of the settings file
+    """
+    if not os.path.exists(settings_path):
+        return None
+    with open(settings_path, 'r') as fd_settings:
+        match = SECRET_KEY_RE.search(fd_settings.read())
+    if match:
+        return match.group(2)
+    return None
+
+
+def set_secret_key(settings_path, secret_key):
+    """
+    Replace the SECRET_KEY value in the settings file
+
+    :param settings_path: path of the settings file
+    :param secret_key: new value
+    """
+    with open(settings_path, 'r') as fd_settings:
+        original = fd_settings.read()
+    original = SECRET_KEY_RE.sub(
+        lambda match: 'SECRET_KEY = {0}{1}{0}'.format(match.group(1), secret_key), original, 1
+    )
+    with open(settings_path, 'w') as fd_settings:
+        fd_settings.write(original)
+
+
+_migration_layouts = {'key': None, 'modules': {}}
+
+
+def _installed_distributions_key():
+    # Installing, upgrading or removing a distribution changes the modification
+    # time of its sys.path entry, which is much cheaper to check than versions
+    key = []
+    for path in sys.path:
+        try:
+            key.append((path, os.stat(path).st_mtime))
+        except OSError:
+            continue
+    return tuple(key)
+
+
+def _package_locations(module):
+    # Directories of the package, found without importing it
+    if find_spec:
+        try:
+            spec = find_spec(module)
+        except (ImportError, ValueError):
+            return []
+        return list(spec.submodule_search_locations or []) if spec else []
+    else:  # pragma: no cover
+        import imp
+        try:
+            fd, path, description = imp.find_module(module)
+        except ImportError:
+            return []
+        if fd:
+            fd.close()
+        return [path] if os.path.isdir(path) else []
+
+
+def _migration_module(module):
+    for location in _package_locations(module):
+        if (os.path.isdir(os.path.join(location, 'migrations_django')) or
+                os.path.isfile(os.path.join(location, 'migrations_django.py'))):
+            return '{0}.migrations_django'.format(module)
+    return None
 
 
 def _detect_migration_layout(vars, apps):
     """
     Detect migrations layout for plugins
+
+    Packages are looked up on the file system without importing them; results
+    are cached until a distribution is installed, upgraded or removed.
+
     :param vars: installer settings
     :param apps: installed applications
     """
-    DJANGO_MODULES = {}
+    key = _installed_distributions_key()
+    if _migration_layouts['key'] != key:
+        _migration_layouts['key'] = key
+        _migration_layouts['modules'] = {}
+    layouts = _migration_layouts['modules']
+    DJANGO_MODULES = OrderedDict()
 
     for module in vars.MIGRATIONS_CHECK_MODULES:
         if module in apps:
-            try:
-                mod = __import__('{0}.migrations_django'.format(module))  # NOQA
-                DJANGO_MODULES[module] = '{0}.migrations_django'.format(module)
-            except Exception:
-                pass
+            if module not in layouts:
+                layouts[module] = _migration_module(module)
+            if layouts[module]:
+                DJANGO_MODULES[module] = layouts[module]
     return DJANGO_MODULES
 
 
@@ -145,16 +295,11 @@ def patch_settings(config_data):
     """
     overridden_settings = (
         'MIDDLEWARE_CLASSES', 'INSTALLED_APPS', 'TEMPLATE_LOADERS', 'TEMPLATE_CONTEXT_PROCESSORS',
-        'TEMPLATE_DIRS', 'LANGUAGES'
+        'TEMPLATE_DIRS', 'LANGUAGES', 'TEMPLATES', 'DATABASES'
     )
     extra_settings = ''
 
-    if not os.path.exists(config_data.settings_path):
-        sys.stdout.write(
-            'Error while creating target project, '
-            'please check the given configuration: {0}'.format(config_data.settings_path)
-        )
-        return sys.exit(5)
+    _check_settings(config_data, 'patch_settings')
 
     with open(config_data.settings_path, 'r') as fd_original:
         original = fd_original.read()
@@ -166,6 +311,21 @@ def patch_settings(config_data):
 
     original = original.replace('# -*- coding: utf-8 -*-\n', '')
 
+    replaced_settings = {}
+    # I18N
+    if config_data.i18n == 'no':
+        replaced_settings['USE_I18N'] = 'False'
+        replaced_settings['USE_L10N'] = 'False'
+    # TZ
+    if config_data.use_timezone == 'no':
+        replaced_settings['USE_TZ'] = 'False'
+    if config_data.languages:
+        replaced_settings['LANGUAGE_CODE'] = '\'{0}\''.format(config_data.languages[0])
+    if config_data.timezone:
+        # This is for Django 1.6 which changed the default timezone
+        replaced_settings['TIME_ZONE'] = '\'{0}\''.format(config_data.timezone)
+    original, assigned = source.patch(original, overridden_settings, replaced_settings)
+
     if config_data.aldryn:  # pragma: no cover
         DATA_DIR = (
             'DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), \'dist\')\n'
@@ -186,40 +346,7 @@ STATICFILES_DIRS = (
     {0}
 )
 """.format(STATICFILES_DIR)
-    original = original.replace('# -*- coding: utf-8 -*-\n', '')
-
-    # I18N
-    if config_data.i18n == 'no':
-        original = original.replace('I18N = True', 'I18N = False')
-        original = original.replace('L10N = True', 'L10N = False')
-
-    # TZ
-    if config_data.use_timezone == 'no':
-        original = original.replace('USE_TZ = True', 'USE_TZ = False')
-
-    if config_data.languages:
-        original = original.replace(
-            'LANGUAGE_CODE = \'en-us\'', 'LANGUAGE_CODE = \'{0}\''.format(config_data.languages[0])
-        )
-    if config_data.timezone:
-        # This is for Django 1.6 which changed the default timezone
-        original = original.replace(
-            'TIME_ZONE = \'UTC\'', 'TIME_ZONE = \'{0}\''.format(config_data.timezone)
-        )
-
-    for item in overridden_settings:
-        if config_data.django_version >= 1.9:
-            item_re = re.compile(r'{0} = [^\]]+\]'.format(item), re.DOTALL | re.MULTILINE)
-        else:
-            item_re = re.compile(r'{0} = [^\)]+\)'.format(item), re.DOTALL | re.MULTILINE)
-        original = item_re.sub('', original)
-    # TEMPLATES is special, so custom regexp needed
-    item_re = re.compile(r'TEMPLATES = .+\]$', re.DOTALL | re.MULTILINE)
-    original = item_re.sub('', original)
-    # DATABASES is a dictionary, so different regexp needed
-    item_re = re.compile(r'DATABASES = [^\}]+\}[^\}]+\}', re.DOTALL | re.MULTILINE)
-    original = item_re.sub('', original)
-    if original.find('SITE_ID') == -1:
+    if 'SITE_ID' not in assigned:
         original += 'SITE_ID = 1\n\n'
 
     original += _build_settings(config_data)
@@ -230,31 +357,25 @@ STATICFILES_DIRS = (
         fd_dest.write(original)
 
 
+def _render_items(items, indent=1, separator=','):
+    # One item per line, at the indentation of the template placeholder
+    return '{0}\n{1}'.format(separator, '    ' * indent).join(items)
+
+
 def _build_settings(config_data):
     """
     Build the django CMS settings dictionary
 
+    Settings are rendered from ``data.SETTINGS_TEMPLATE`` in a stable order:
+    identical configurations give byte-identical settings.
+
     :param config_data: configuration data
     """
-    spacer = '    '
-    text = []
     vars = get_settings()
-
-    vars.MIDDLEWARE_CLASSES.insert(0, vars.APPHOOK_RELOAD_MIDDLEWARE_CLASS)
-
+    middleware = [vars.APPHOOK_RELOAD_MIDDLEWARE_CLASS] + list(vars.MIDDLEWARE_CLASSES)
     processors = vars.TEMPLATE_CONTEXT_PROCESSORS + vars.TEMPLATE_CONTEXT_PROCESSORS_3
-    text.append(data.TEMPLATES_1_8.format(
-        loaders=(',\n' + spacer).join(['\'{0}\''.format(var) for var in vars.TEMPLATE_LOADERS]),
-        processors=(',\n' + spacer).join(['\'{0}\''.format(var) for var in processors]),
-        dirs='os.path.join(BASE_DIR, \'{0}\', \'templates\'),'.format(config_data.project_name)
-    ))
-
-    text.append('MIDDLEWARE_CLASSES = (\n{0}{1}\n)'.format(
-        spacer, (',\n' + spacer).join(['\'{0}\''.format(var) for var in vars.MIDDLEWARE_CLASSES])
-    ))
-
-    apps = list(vars.INSTALLED_APPS)
-    apps = list(vars.CMS_3_HEAD) + apps
+
+    apps = list(vars.CMS_3_HEAD) + list(vars.INSTALLED_APPS)
     apps.extend(vars.TREEBEARD_APPS)
     apps.extend(vars.CMS_3_APPLICATIONS)
 
@@ -268,86 +389,56 @@ def _build_settings(config_data):
         apps.extend(vars.ALDRYN_APPLICATIONS)
     if config_data.reversion:
         apps.extend(vars.REVERSION_APPLICATIONS)
-    text.append('INSTALLED_APPS = (\n{0}{1}\n)'.format(
-        spacer, (',\n' + spacer).join(['\'{0}\''.format(var) for var in apps] +
-                                      ['\'{0}\''.format(config_data.project_name)])
-    ))
-
-    text.append('LANGUAGES = (\n{0}{1}\n{0}{2}\n)'.format(
-        spacer, '## Customize this',
-        ('\n' + spacer).join(['(\'{0}\', gettext(\'{0}\')),'.format(item) for item in config_data.languages])  # NOQA
-    ))
-
-    cms_langs = deepcopy(vars.CMS_LANGUAGES)
-    for lang in config_data.languages:
-        lang_dict = {'code': lang, 'name': lang}
-        lang_dict.update(copy(cms_langs['default']))
-        cms_langs[1].append(lang_dict)
-    cms_text = ['CMS_LANGUAGES = {']
-    cms_text.append('{0}{1}'.format(spacer, '## Customize this'))
-    for key, value in iteritems(cms_langs):
-        if key == 'default':
-            cms_text.append('{0}\'{1}\': {{'.format(spacer, key))
-            for config_name, config_value in iteritems(value):
-                cms_text.append('{0}\'{1}\': {2},'.format(spacer * 2, config_name, config_value))
-            cms_text.append('{0}}},'.format(spacer))
-        else:
-            cms_text.append('{0}{1}: ['.format(spacer, key))
-            for lang in value:
-                cms_text.append('{0}{{'.format(spacer * 2))
-                for config_name, config_value in iteritems(lang):
-                    if config_name == 'code':
-                        cms_text.append('{0}\'{1}\': \'{2}\','.format(spacer * 3, config_name, config_value))  # NOQA
-                    elif config_name == 'name':
-                        cms_text.append('{0}\'{1}\': gettext(\'{2}\'),'.format(spacer * 3, config_name, config_value))  # NOQA
-                    else:
-                        cms_text.append('{0}\'{1}\': {2},'.format(
-                            spacer * 3, config_name, config_value
-                        ))
-                cms_text.append('{0}}},'.format(spacer * 2))
-            cms_text.append('{0}],'.format(spacer))
-    cms_text.append('}')
-
-    text.append('\n'.join(cms_text))
+
+    language_options = sorted(vars.CMS_LANGUAGES['default'].items())
+    cms_languages = [
+        data.CMS_LANGUAGE_TEMPLATE.format(code=lang, options='\n'.join(
+            '            \'{0}\': {1},'.format(*option) for option in language_options
+        ))
+        for lang in config_data.languages
+    ]
 
     if config_data.bootstrap:
-        cms_templates = 'CMS_TEMPLATES_BOOTSTRAP'
+        cms_templates = vars.CMS_TEMPLATES_BOOTSTRAP
     else:
-        cms_templates = 'CMS_TEMPLATES'
-
-    text.append('CMS_TEMPLATES = (\n{0}{1}\n{0}{2}\n)'.format(
-        spacer, '## Customize this',
-        (',\n' + spacer).join(
-            ['(\'{0}\', \'{1}\')'.format(*item) for item in getattr(vars, cms_templates)]
-        )
-    ))
-
-    text.append('CMS_PERMISSION = {0}'.format(vars.CMS_PERMISSION))
-    text.append('CMS_PLACEHOLDER_CONF = {0}'.format(vars.CMS_PLACEHOLDER_CONF))
-
-    database = ['\'{0}\': {1}'.format(key, format_val(val)) for key, val in sorted(config_data.db_parsed.items(), key=lambda x: x[0])]  # NOQA
-    text.append(textwrap.dedent("""
-        DATABASES = {{
-            'default': {{
-                {0}
-            }}
-        }}""").strip().format((',\n' + spacer * 2).join(database)))  # NOQA
-
-    DJANGO_MIGRATION_MODULES = _detect_migration_layout(vars, apps)
+        cms_templates = vars.CMS_TEMPLATES
 
-    text.append('MIGRATION_MODULES = {{\n{0}{1}\n}}'.format(
-        spacer, (',\n' + spacer).join(
-            ['\'{0}\': \'{1}\''.format(*item) for item in DJANGO_MIGRATION_MODULES.items()]
-        )
-    ))
+    database = [
+        '\'{0}\': {1}'.format(key, format_val(value))
+        for key, value in sorted(config_data.db_parsed.items())
+    ]
+    migration_modules = _detect_migration_layout(vars, apps)
 
+    thumbnail_processors = ''
     if config_data.filer:
-        text.append('THUMBNAIL_PROCESSORS = (\n{0}{1}\n)'.format(
-            spacer, (',\n' + spacer).join(
-                ['\'{0}\''.format(var) for var in vars.THUMBNAIL_PROCESSORS]
-            )
+        thumbnail_processors = data.THUMBNAIL_PROCESSORS_TEMPLATE.format(processors=_render_items(
+            ['\'{0}\''.format(var) for var in vars.THUMBNAIL_PROCESSORS]
         ))
-    return '\n\n'.join(text)
+
+    return data.SETTINGS_TEMPLATE.format(
+        loaders=_render_items(['\'{0}\''.format(var) for var in vars.TEMPLATE_LOADERS], 4),
+        processors=_render_items(['\'{0}\''.format(var) for var in processors], 4),
+        dirs='os.path.join(BASE_DIR, \'{0}\', \'templates\'),'.format(config_data.project_name),
+        middleware=_render_items(['\'{0}\''.format(var) for var in middleware]),
+        apps=_render_items(['\'{0}\''.format(var) for var in apps + [config_data.project_name]]),
+        languages=_render_items([
+            '(\'{0}\', gettext(\'{0}\')),'.format(lang) for lang in config_data.languages
+        ], separator=''),
+        cms_languages='\n'.join(cms_languages),
+        cms_languages_default='\n'.join(
+            '        \'{0}\': {1},'.format(*option) for option in language_options
+        ),
+        cms_templates=_render_items(
+            ['(\'{0}\', \'{1}\')'.format(*item) for item in cms_templates]
+        ),
+        cms_permission=vars.CMS_PERMISSION,
+        cms_placeholder_conf=pformat(vars.CMS_PLACEHOLDER_CONF),
+        database=_render_items(database, 2),
+        migration_modules=_render_items([
+            '\'{0}\': \'{1}\''.format(*item) for item in migration_modules.items()
+        ]),
+        thumbnail_processors=thumbnail_processors,
+    )
 
 
 def setup_database(config_data):
@@ -360,11 +451,7 @@ def setup_database(config_data):
         env = deepcopy(dict(os.environ))
         env[str('DJANGO_SETTINGS_MODULE')] = str('{0}.settings'.format(config_data.project_name))
         env[str('PYTHONPATH')] = str(os.pathsep.join(map(shlex_quote, sys.path)))
-        commands = []
-
-        commands.append(
-            [sys.executable, '-W', 'ignore', 'manage.py', 'migrate'],
-        )
+        commands = [manage_command(config_data, 'migrate')]
 
         if config_data.verbose:
             sys.stdout.write(
@@ -374,13 +461,12 @@ def setup_database(config_data):
             )
         for command in commands:
             output = subprocess.check_output(command, env=env)
-            sys.stdout.write(output.decode('utf-8'))
+            _write_output(config_data, output)
 
         if not config_data.no_user and not config_data.noinput:
             sys.stdout.write('Creating admin user\n')
-            subprocess.check_call(' '.join(
-                [sys.executable, '-W', 'ignore', 'manage.py', 'createsuperuser']
-            ), shell=True)
+            subprocess.check_call(' '.join(manage_command(config_data, 'createsuperuser')),
+                                  shell=True)
 
 
 def load_starting_page(config_data):
@@ -393,7 +479,7 @@ def load_starting_page(config_data):
         env = deepcopy(dict(os.environ))
         env[str('DJANGO_SETTINGS_MODULE')] = str('{0}.settings'.format(config_data.project_name))
         env[str('PYTHONPATH')] = str(os.pathsep.join(map(shlex_quote, sys.path)))
-        subprocess.check_call([sys.executable, 'starting_page.py'], env=env)
+        subprocess.check_call(script_command(config_data, 'starting_page.py'), env=env)
         for ext in ['py', 'pyc', 'json']:
             try:
                 os.remove('starting_page.{0}'.format(ext))
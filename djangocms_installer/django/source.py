@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import ast
+import tokenize
+from collections import OrderedDict
+from functools import partial
+
+from six import StringIO
+
+
+def _assigned_names(node):
+    # Names assigned by a top-level statement, None if it's not a plain assignment
+    if not isinstance(node, ast.Assign):
+        return None
+    names = [target.id for target in node.targets if isinstance(target, ast.Name)]
+    return names if len(names) == len(node.targets) else None
+
+
+def statements(source):
+    """
+    Returns the extent of the top-level statements of a Python module
+
+    Statements are found with ``ast`` and their end with ``tokenize``, so
+    values spanning many lines, brackets in strings and trailing comments are
+    handled; statements sharing a line are returned as a single item.
+
+    :param source: module source, without encoding declaration
+    :return: list of (start, end, nodes) tuples, start and end being the
+             offsets of the statement in the source
+    """
+    tree = ast.parse(source)
+    lines = StringIO(source).readlines()
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    ends = [
+        min(offsets[token[3][0] - 1] + token[3][1], len(source))
+        for token in tokenize.generate_tokens(partial(next, iter(lines), ''))
+        if token[0] in (tokenize.NEWLINE, tokenize.ENDMARKER)
+    ]
+    items = OrderedDict()
+    position = 0
+    for node in tree.body:
+        start = offsets[node.lineno - 1]
+        # The statement ends at the first logical line end following its start
+        while ends[position] <= start:
+            position += 1
+        item = items.setdefault(position, [start, ends[position], []])
+        item[2].append(node)
+    return [tuple(item) for item in items.values()]
+
+
+def patch(source, drop=(), replace=None):
+    """
+    Drop and rewrite top-level assignments of a Python module in a single pass
+
+    :param source: module source, without encoding declaration
+    :param drop: names of the assignments to remove
+    :param replace: dictionary mapping the names of the assignments to rewrite
+                    to the source of their new value
+    :return: tuple of the patched source and of the set of names assigned at
+             top level in the original source
+    """
+    replace = replace or {}
+    assigned = set()
+    patched = []
+    position = 0
+    for start, end, nodes in statements(source):
+        names = [_assigned_names(node) for node in nodes]
+        for item in names:
+            assigned.update(item or ())
+        if None in names:
+            continue
+        names = [name for item in names for name in item]
+        if all(name in drop for name in names):
+            replacement = ''
+        elif len(names) == 1 and names[0] in replace:
+            replacement = '{0} = {1}\n'.format(names[0], replace[names[0]])
+        else:
+            continue
+        patched.append(source[position:start])
+        patched.append(replacement)
+        position = end
+    patched.append(source[position:])
+    return ''.join(patched), assigned
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+
+class InstallerError(Exception):
+    """
+    Base class of the installer errors
+    """
+
+
+class ConfigurationError(InstallerError, ValueError):
+    """
+    Invalid configuration; ``code`` is the command line exit status
+    """
+    code = 1
+
+    def __init__(self, message, code=None):
+        super(ConfigurationError, self).__init__(message)
+        if code is not None:
+            self.code = code
+
+
+class InvalidProjectNameError(ConfigurationError):
+    code = 3
+
+
+class ProjectDirectoryError(ConfigurationError):
+    code = 4
+
+
+class UnsupportedVersionError(ConfigurationError):
+    code = 6
+
+
+class ConfigFileError(ConfigurationError):
+    code = 7
+
+
+class ConfigDumpError(ConfigurationError):
+    code = 8
+
+
+class RequirementsConflictError(ConfigurationError):
+    code = 9
+
+
+class InstallationError(InstallerError):
+    """
+    Error while creating the project; ``stage`` is the name of the failed stage,
+    ``error`` the original exception and ``code`` the command line exit status
+    """
+    code = 1
+
+    def __init__(self, message, stage=None, error=None):
+        super(InstallationError, self).__init__(message)
+        self.stage = stage
+        self.error = error
+
+
+class ProjectStructureError(InstallationError):
+    """
+    The project created by django-admin lacks the expected files
+    """
+    code = 5
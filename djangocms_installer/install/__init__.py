@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 
+import errno
 import os.path
 import shutil
 import subprocess
 import sys
+import tempfile
+import uuid
+from multiprocessing.pool import ThreadPool
 
+from djangocms_installer import compat
+from djangocms_installer.config import data, set_project_directory
 from djangocms_installer.utils import query_yes_no
 
 
@@ -76,7 +82,16 @@ def check_install(config_data):
         raise EnvironmentError('\n'.join(errors))
 
 
-def requirements(requirements, pip_options='', is_file=False, verbose=False):
+def requirements_command(requirements, pip_options='', is_file=False, verbose=False, pip=None):
+    """
+    Returns the pip command line installing the requirements
+
+    :param requirements: space separated requirements or requirements file path
+    :param pip_options: additional pip options
+    :param is_file: requirements is a requirements file path
+    :param verbose: show pip output
+    :param pip: pip command line (default: ``pip``)
+    """
     args = ['install']
     if not verbose:
         args.append('-q')
@@ -86,13 +101,59 @@ def requirements(requirements, pip_options='', is_file=False, verbose=False):
         args += ['-r', requirements]
     else:
         args.extend(['{0}'.format(package) for package in requirements.split()])
+    return (pip or ['pip']) + args
+
+
+def requirements(requirements, pip_options='', is_file=False, verbose=False, cache_dir=None,
+                 pip=None):
+    """
+    Install the requirements with pip
+
+    :param requirements: space separated requirements or requirements file path
+    :param pip_options: additional pip options
+    :param is_file: requirements is a requirements file path
+    :param verbose: show pip output
+    :param cache_dir: shared cache root, pip downloads and builds wheels in its
+                      ``pip`` directory
+    :param pip: pip command line (default: ``pip``)
+    """
+    command = requirements_command(requirements, pip_options, is_file, verbose, pip)
     if verbose:
-        sys.stdout.write('Package install command: {0}\n'.format(' '.join(args)))
-    output = subprocess.check_output(['pip'] + args)
+        sys.stdout.write('Package install command: {0}\n'.format(' '.join(command)))
+    output = subprocess.check_output(command, env=_pip_env(cache_dir))
     sys.stdout.write(output.decode('utf-8'))
     return True
 
 
+def wheels(requirements, pip_options='', cache_dir=None):
+    """
+    Download and build the wheels of the requirements without installing them,
+    to populate the pip cache
+
+    :param requirements: space separated requirements
+    :param pip_options: additional pip options
+    :param cache_dir: shared cache root, see ``requirements``
+    """
+    wheel_dir = tempfile.mkdtemp(prefix='djangocms-installer-wheels-')
+    try:
+        args = ['wheel', '-q', '--wheel-dir', wheel_dir]
+        args.extend([opt for opt in pip_options.split(' ') if opt])
+        args.extend(requirements.split())
+        subprocess.check_output(['pip'] + args, env=_pip_env(cache_dir),
+                                stderr=subprocess.STDOUT)
+    finally:
+        shutil.rmtree(wheel_dir, True)
+    return True
+
+
+def _pip_env(cache_dir):
+    if not cache_dir:
+        return None
+    env = dict(os.environ)
+    env[str('PIP_CACHE_DIR')] = str(os.path.join(cache_dir, data.CACHE_PIP_DIR))
+    return env
+
+
 def write_requirements(config_data):
     with open(os.path.join(config_data.project_directory, 'requirements.txt'), 'w') as reqfile:
         reqfile.write(config_data.requirements)
@@ -107,10 +168,223 @@ def cleanup(requirements):  # pragma: no cover
     return True
 
 
+def get_staging_root():
+    """
+    Returns the tmpfs mount point used to stage projects, or None to use the
+    system default temporary directory
+    """
+    for path in data.STAGING_DIRS:
+        if os.path.isdir(path) and os.access(path, os.W_OK):
+            return path
+    return None
+
+
+def stage_directory(config_data):
+    """
+    Redirect the project paths to a new staging directory; the original
+    project directory is saved in ``target_directory``
+
+    :param config_data: configuration data
+    """
+    staging_directory = tempfile.mkdtemp(prefix='djangocms-installer-', dir=get_staging_root())
+    setattr(config_data, 'target_directory', config_data.project_directory)
+    setattr(config_data, 'staging_directory', staging_directory)
+    set_project_directory(config_data, staging_directory)
+    return staging_directory
+
+
+def commit_staging(config_data):
+    """
+    Move the staged project to the target directory.
+
+    If the target directory does not exist the whole tree is moved with a
+    single rename; when the staging directory is on a different device the tree
+    is copied next to the target and then renamed into place.
+    If the target directory already exists, its content is moved entry by entry.
+
+    :param config_data: configuration data
+    """
+    staging_directory = config_data.staging_directory
+    target_directory = config_data.target_directory
+    if os.path.exists(target_directory):
+        entries = os.listdir(staging_directory)
+        for entry in entries:
+            if os.path.exists(os.path.join(target_directory, entry)):
+                raise EnvironmentError(
+                    'Path "{0}" already exists, cannot move the project in place'.format(
+                        os.path.join(target_directory, entry)
+                    )
+                )
+        for entry in entries:
+            shutil.move(os.path.join(staging_directory, entry),
+                        os.path.join(target_directory, entry))
+        os.rmdir(staging_directory)
+    else:
+        parent = os.path.dirname(os.path.abspath(target_directory))
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        try:
+            os.rename(staging_directory, target_directory)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            copy_directory = tempfile.mkdtemp(prefix='.djangocms-installer-', dir=parent)
+            try:
+                shutil.copytree(staging_directory, os.path.join(copy_directory, 'project'),
+                                symlinks=True)
+                os.rename(os.path.join(copy_directory, 'project'), target_directory)
+            finally:
+                shutil.rmtree(copy_directory, True)
+            shutil.rmtree(staging_directory, True)
+    set_project_directory(config_data, target_directory)
+    setattr(config_data, 'staging_directory', None)
+
+
+def _remove_tree(path):
+    """
+    Recursively remove path, without following symlinks
+    """
+    if compat.scandir:
+        for entry in compat.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                _remove_tree(entry.path)
+            else:
+                os.unlink(entry.path)
+    else:  # pragma: no cover
+        for name in os.listdir(path):
+            entry = os.path.join(path, name)
+            if os.path.isdir(entry) and not os.path.islink(entry):
+                _remove_tree(entry)
+            else:
+                os.unlink(entry)
+    os.rmdir(path)
+
+
+def remove_tree(path, jobs=data.CLEANUP_JOBS):
+    """
+    Remove path, deleting its top level directories in parallel
+
+    :param path: directory to remove
+    :param jobs: number of concurrent deletion threads
+    """
+    directories = []
+    for name in os.listdir(path):
+        entry = os.path.join(path, name)
+        if os.path.isdir(entry) and not os.path.islink(entry):
+            directories.append(entry)
+        else:
+            os.unlink(entry)
+    if directories:
+        pool = ThreadPool(min(jobs, len(directories)))
+        try:
+            pool.map(_remove_tree, directories)
+        finally:
+            pool.close()
+            pool.join()
+    os.rmdir(path)
+
+
+def bury_directory(path):
+    """
+    Rename path to a tombstone in the same parent directory, so that it's
+    immediately out of the way and can be deleted later.
+
+    Returns the tombstone path.
+    """
+    path = os.path.abspath(path)
+    tombstone = os.path.join(
+        os.path.dirname(path), '.{0}{1}{2}'.format(
+            os.path.basename(path), data.TOMBSTONE_MARKER, uuid.uuid4().hex
+        )
+    )
+    os.rename(path, tombstone)
+    return tombstone
+
+
+def installer_env():
+    """
+    Returns the environment to run the installer in a subprocess, making sure
+    the running installer package is importable
+    """
+    env = dict(os.environ)
+    package_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env[str('PYTHONPATH')] = str(os.pathsep.join(
+        [package_path] + [path for path in [env.get('PYTHONPATH')] if path]
+    ))
+    return env
+
+
+def spawn_reaper(paths):
+    """
+    Start a detached process deleting the given tombstones
+
+    :param paths: list of tombstones or directories containing tombstones
+    """
+    env = installer_env()
+    kwargs = {}
+    if hasattr(os, 'setsid'):
+        kwargs['preexec_fn'] = os.setsid
+    with open(os.devnull, 'r+') as devnull:
+        return subprocess.Popen(
+            [sys.executable, '-m', 'djangocms_installer', 'cleanup'] + list(paths),
+            stdin=devnull, stdout=devnull, stderr=devnull, close_fds=True, env=env, **kwargs
+        )
+
+
+def remove_directory(path):
+    """
+    Move path out of the way and delete it in the background; if it cannot
+    be renamed, it's deleted synchronously
+    """
+    try:
+        tombstone = bury_directory(path)
+    except OSError:
+        shutil.rmtree(path, True)
+        return
+    try:
+        spawn_reaper([tombstone])
+    except OSError:  # pragma: no cover
+        remove_tree(tombstone)
+
+
+def reap_tombstones(paths, jobs=data.CLEANUP_JOBS):
+    """
+    Delete tombstones left by failed installations
+
+    :param paths: list of tombstones or directories containing tombstones
+    :param jobs: number of concurrent deletion threads
+    :return: list of deleted tombstones
+    """
+    tombstones = []
+    for path in paths:
+        if data.TOMBSTONE_MARKER in os.path.basename(os.path.abspath(path)):
+            tombstones.append(path)
+        elif os.path.isdir(path):
+            tombstones.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+                if data.TOMBSTONE_MARKER in name
+            )
+    removed = []
+    for tombstone in tombstones:
+        try:
+            remove_tree(tombstone, jobs)
+            removed.append(tombstone)
+        except OSError:
+            # Most likely another reaper is already working on it
+            pass
+    return removed
+
+
 def cleanup_directory(config_data):
     """
     Asks user for removal of project directory and eventually removes it
     """
+    if getattr(config_data, 'staging_directory', None):
+        # The target directory has never been touched: just drop the staged project
+        remove_directory(config_data.staging_directory)
+        set_project_directory(config_data, config_data.target_directory)
+        setattr(config_data, 'staging_directory', None)
+        return
     if os.path.exists(config_data.project_directory):
         choice = 'N'
         if config_data.noinput is False and not config_data.verbose:
@@ -130,4 +404,4 @@ def cleanup_directory(config_data):
             sys.stdout.write('Removing everything under {0}\n'.format(
                 os.path.abspath(config_data.project_directory)
             ))
-            shutil.rmtree(config_data.project_directory, True)
+            remove_directory(config_data.project_directory)
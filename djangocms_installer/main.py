@@ -1,65 +1,276 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 
-import logging
+import argparse
 import os
 import sys
+import time
 
-from . import config, django, install
+# Only the modules needed to parse the arguments are imported at startup,
+# the others are imported by the commands using them
+from . import config, exceptions
 
 
-def execute():
+def cleanup(args):
+    """
+    Delete the directories left behind by failed installations
+    """
+    parser = argparse.ArgumentParser(
+        prog='djangocms cleanup',
+        description='Delete the directories left behind by failed installations.'
+    )
+    parser.add_argument(dest='paths', action='store', nargs='*', default=['.'],
+                        help='Leftover directories, or directories containing them '
+                             '(default: current directory)')
+    parser.add_argument('--jobs', '-j', dest='jobs', action='store', type=int,
+                        default=config.data.CLEANUP_JOBS, help='Number of deletion threads')
+    args = parser.parse_args(args)
+    from . import install
+
+    for path in install.reap_tombstones(args.paths, args.jobs):
+        sys.stdout.write('Removed {0}\n'.format(path))
+
+
+def batch(args):
+    """
+    Create a project for each configuration file in a directory
+    """
+    parser = argparse.ArgumentParser(
+        prog='djangocms batch',
+        description='Create a project for each configuration file in a directory. '
+                    'Any additional argument is passed to every project.'
+    )
+    parser.add_argument(dest='config_dir', action='store',
+                        help='Directory containing the configuration files')
+    parser.add_argument('--jobs', '-j', dest='jobs', action='store', type=int, default=None,
+                        help='Number of projects created in parallel (default: number of CPUs)')
+    parser.add_argument('--output-dir', '-o', dest='output_dir', action='store', default='.',
+                        help='Directory where projects are created, each in a directory named '
+                             'after its configuration file')
+    parser.add_argument('--queue', dest='queue', action='store', default=None,
+                        help='Add the projects to the queue directory, to be created by '
+                             '"djangocms worker" processes')
+    args, extra_args = parser.parse_known_args(args)
+    from . import batch as batch_mode
+
+    if args.queue:
+        return batch_mode.submit_configs(
+            batch_mode.find_configs(args.config_dir), args.output_dir, args.queue, extra_args
+        )
+    start = time.time()
+    projects, results = batch_mode.parse_configs(
+        batch_mode.find_configs(args.config_dir), args.output_dir, extra_args
+    )
+    for result in results:
+        sys.stdout.write(batch_mode.format_result(result))
+    created, installed = batch_mode.run(projects, args.jobs)
+    results.extend(created)
+    sys.stdout.write(batch_mode.format_report(results, installed, time.time() - start))
+    return 1 if [result for result in results if result['status'] != 'ok'] else 0
+
+
+def worker(args):
+    """
+    Create the projects added to a queue directory
+    """
+    parser = argparse.ArgumentParser(
+        prog='djangocms worker',
+        description='Create the projects added to a queue directory. Many workers, on '
+                    'different hosts, can share the same queue.'
+    )
+    parser.add_argument('--queue', dest='queue', action='store', required=True,
+                        help='Queue directory')
+    parser.add_argument('--lease', dest='lease', action='store', type=int,
+                        default=config.data.QUEUE_LEASE,
+                        help='Seconds after which the jobs of an unresponsive worker are '
+                             'run again')
+    parser.add_argument('--poll', dest='poll', action='store', type=int,
+                        default=config.data.QUEUE_POLL,
+                        help='Seconds between checks of an empty queue')
+    parser.add_argument('--max-attempts', dest='max_attempts', action='store', type=int,
+                        default=config.data.QUEUE_MAX_ATTEMPTS,
+                        help='Number of times a job is run before being marked as failed')
+    parser.add_argument('--max-jobs', dest='max_jobs', action='store', type=int, default=None,
+                        help='Exit after running this number of jobs')
+    parser.add_argument('--exit-when-empty', dest='exit_when_empty', action='store_true',
+                        default=False, help='Exit when there are no pending jobs')
+    args = parser.parse_args(args)
+    from . import workqueue
+
+    results = workqueue.work(args.queue, args.lease, args.poll, args.max_attempts,
+                             args.max_jobs, args.exit_when_empty)
+    return 1 if [result for result in results if result['status'] != 'ok'] else 0
+
+
+def cache(args):
+    """
+    Manage the installer caches
+    """
+    from . import cache as cache_mode
+
+    parser = argparse.ArgumentParser(prog='djangocms cache',
+                                     description='Manage the installer caches.')
+    parser.add_argument('--cache-dir', dest='cache_dir', action='store', default=None,
+                        help='Root directory of the installer caches (default: ${0} or user '
+                             'cache directory)'.format(config.data.CACHE_DIR_ENV))
+    actions = parser.add_subparsers(dest='action')
+    actions.required = True
+    actions.add_parser('stats', help='Show the size and the hit rate of the caches')
+    prune = actions.add_parser('prune', help='Remove the least recently used entries')
+    prune.add_argument('--max-size', dest='max_size', action='store', required=True,
+                       type=cache_mode.parse_size,
+                       help='Maximum size of the caches (e.g.: 500M, 10G)')
+    actions.add_parser('clear', help='Remove all the cache entries')
+    warm_parser = actions.add_parser(
+        'warm', help='Build the wheels of every supported combination of versions and options'
+    )
+    warm_parser.add_argument('--jobs', '-j', dest='jobs', action='store', type=int,
+                             default=None,
+                             help='Number of parallel jobs (default: number of CPUs)')
+    warm_parser.add_argument('--project-name', dest='project_names', action='append',
+                             default=[],
+                             help='Also cache the files and database of projects with this '
+                                  'name, for the installed Django and django CMS versions; '
+                                  'can be repeated')
+    args = parser.parse_args(args)
+    root = cache_mode.get_cache_dir(args.cache_dir)
+    if args.action == 'stats':
+        sys.stdout.write('Cache directory: {0}\n'.format(root))
+        total = 0
+        for namespace, values in sorted(cache_mode.stats(args.cache_dir).items()):
+            total += values['size']
+            line = '{0}: {1} entries, {2}'.format(
+                namespace, values['entries'], cache_mode.format_size(values['size'])
+            )
+            uses = values.get('hits', 0) + values.get('misses', 0)
+            if namespace == config.data.CACHE_PIP_DIR:
+                line += ', hits and misses not recorded'
+            elif uses:
+                line += ', {0} hits, {1} misses ({2:.1f}% hit rate)'.format(
+                    values['hits'], values['misses'], values['hits'] * 100.0 / uses
+                )
+            sys.stdout.write('{0}\n'.format(line))
+        sys.stdout.write('Total: {0}\n'.format(cache_mode.format_size(total)))
+    elif args.action == 'prune':
+        removed, freed = cache_mode.prune(args.max_size, args.cache_dir)
+        sys.stdout.write('Removed {0} entries, {1} freed\n'.format(
+            removed, cache_mode.format_size(freed)
+        ))
+    elif args.action == 'clear':
+        freed = cache_mode.clear(args.cache_dir)
+        sys.stdout.write('Cache cleared, {0} freed\n'.format(cache_mode.format_size(freed)))
+    elif args.action == 'warm':
+        from . import warm
+
+        start = time.time()
+        results = warm.run(args.cache_dir, args.project_names, args.jobs)
+        failed = [result for result in results if result['status'] != 'ok']
+        sys.stdout.write('\n{0} jobs completed, {1} failed in {2:.1f}s\n'.format(
+            len(results) - len(failed), len(failed), time.time() - start
+        ))
+        return 1 if failed else 0
+
+
+def serve(args):
+    """
+    Serve project creation requests from a preloaded process
+    """
+    parser = argparse.ArgumentParser(
+        prog='djangocms serve',
+        description='Preload the installer and create the projects requested on a Unix '
+                    'socket, each in a forked process. Set the ${0} environment variable to '
+                    'the socket path to have djangocms use the server.'.format(
+                        config.data.SERVER_SOCKET_ENV
+                    )
+    )
+    parser.add_argument('--socket', dest='socket', action='store', required=True,
+                        help='Path of the Unix socket')
+    parser.add_argument('--max-requests', dest='max_requests', action='store', type=int,
+                        default=None, help='Exit after accepting this number of connections')
+    args = parser.parse_args(args)
+    from . import server
+
+    server.serve(args.socket, args.max_requests)
+
+
+COMMANDS = {
+    'batch': batch,
+    'cache': cache,
+    'cleanup': cleanup,
+    'serve': serve,
+    'worker': worker,
+}
+
+
+def _setup_logging():
+    import logging
+
     # Log info and above to console
     logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
 
+
+def execute():
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        _setup_logging()
+        return COMMANDS[sys.argv[1]](sys.argv[2:])
+
+    socket_path = os.environ.get(config.data.SERVER_SOCKET_ENV)
+    if socket_path:
+        from . import server
+
+        status = server.forward(socket_path, sys.argv[1:])
+        if status is not None:
+            return status
+
     config_data = config.parse(sys.argv[1:])
+    if config_data.requirements_matrix:
+        return config.show_requirements_matrix(config_data.requirements_matrix)
+    elif config_data.plugins:
+        return config.show_plugins()
+    elif config_data.dump_reqs:
+        return config.show_requirements(config_data)
+    elif config_data.plan:
+        from . import plan
+
+        return plan.show(config_data)
+
+    _setup_logging()
+    from . import install, stages
+
     try:
-        if config_data.plugins:
-            config.show_plugins()
-        elif config_data.dump_reqs:
-            config.show_requirements(config_data)
+        sys.stdout.write('Creating the project\n'
+                         'Please wait while I install dependencies\n')
+        if config_data.staging:
+            install.stage_directory(config_data)
+        stages.run(config_data)
+        if config_data.staging:
+            install.commit_staging(config_data)
+        if config_data.aldryn:  # pragma: no cover
+            sys.stdout.write('Project created!\n')
+            sys.stdout.write('aldryn boilerplate requires action before '
+                             'you can actually run the project.\n'
+                             'See documentation at '
+                             'http://aldryn-boilerplate.readthedocs.org/'
+                             'for more information.\n')
         else:
-            sys.stdout.write('Creating the project\n'
-                             'Please wait while I install dependencies\n')
-            if not config_data.no_deps:
-                if config_data.requirements_file:
-                    install.requirements(
-                        config_data.requirements_file, config_data.pip_options, True,
-                        verbose=config_data.verbose
-                    )
-                else:
-                    install.requirements(
-                        config_data.requirements, config_data.pip_options,
-                        verbose=config_data.verbose
-                    )
-            sys.stdout.write('Dependencies installed\nCreating the project\n')
-            install.check_install(config_data)
-            django.create_project(config_data)
-            django.patch_settings(config_data)
-            django.copy_files(config_data)
-            if not config_data.no_sync:
-                django.setup_database(config_data)
-            if config_data.starting_page:
-                django.load_starting_page(config_data)
-            if not config_data.requirements_file:
-                install.write_requirements(config_data)
-            if config_data.aldryn:  # pragma: no cover
-                sys.stdout.write('Project created!\n')
-                sys.stdout.write('aldryn boilerplate requires action before '
-                                 'you can actually run the project.\n'
-                                 'See documentation at '
-                                 'http://aldryn-boilerplate.readthedocs.org/'
-                                 'for more information.\n')
-            else:
-                sys.stdout.write('All done!\n')
-                sys.stdout.write(
-                    'Get into "{0}" directory and type "python manage.py runserver" to start your '
-                    'project\n'.format(os.path.abspath(config_data.project_directory))
-                )
-    except Exception:
-        # Clean up your own mess
-        install.cleanup_directory(config_data)
+            sys.stdout.write('All done!\n')
+            sys.stdout.write(
+                'Get into "{0}" directory and type "python manage.py runserver" to start your '
+                'project\n'.format(os.path.abspath(config_data.project_directory))
+            )
+    except Exception as e:
+        if config_data.resume:
+            sys.stdout.write(
+                'The installation failed.\nFix the error and run the installer again with the '
+                'same arguments to resume it from the last completed step.\n'
+            )
+        else:
+            # Clean up your own mess
+            install.cleanup_directory(config_data)
         doc_message = 'Check documentation at http://djangocms-installer.rtfd.org'
         exception_message = '\n\n{0}\n\n{1}\n\n{0}\n\n'.format('*' * len(doc_message), doc_message)
         sys.stdout.write(exception_message)
+        if isinstance(e, exceptions.InstallationError):
+            sys.stderr.write('{0}\n'.format(e))
+            return e.code
         raise
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import copy
+import os
+import sys
+
+from . import cache, django, install, simulate, stages
+from .config import data, specifiers
+from .utils import distribution_version, requirement_name
+
+
+def _requirements_commands(config_data):
+    if config_data.requirements_file:
+        requirements, is_file = config_data.requirements_file, True
+    else:
+        requirements, is_file = config_data.requirements, False
+    return [install.requirements_command(
+        requirements, config_data.pip_options, is_file, config_data.verbose,
+        simulate.command(config_data, 'pip', create=False)
+    )]
+
+
+def _database_commands(config_data):
+    commands = [django.manage_command(config_data, 'migrate', create=False)]
+    if not config_data.no_user and not config_data.noinput:
+        commands.append(django.manage_command(config_data, 'createsuperuser', create=False))
+    return commands
+
+
+# Subprocesses spawned by the stages, mapped to the function returning their command lines;
+# the stand-ins of the simulate mode are not created when planning
+STAGE_COMMANDS = {
+    'requirements': _requirements_commands,
+    'create_project': lambda config_data: [
+        django.startproject_command(config_data, create=False)
+    ],
+    'setup_database': _database_commands,
+    'starting_page': lambda config_data: [
+        django.script_command(config_data, 'starting_page.py', create=False)
+    ],
+}
+
+
+def requirement_status(requirement):
+    """
+    Returns what pip has to do to install the requirement
+
+    :param requirement: requirement line
+    :return: tuple of the status (``installed``, ``download`` or ``url``) and of
+             the installed version, if any
+    """
+    if '://' in requirement:
+        return 'url', None
+    parsed = specifiers.parse_requirement(requirement)
+    name = parsed[0] if parsed else requirement_name(requirement)
+    version = distribution_version(name) if name else None
+    if version and (not parsed or specifiers.contains(parsed[2], version)):
+        return 'installed', version
+    return 'download', version
+
+
+def _requirements(config_data):
+    if config_data.requirements_file:
+        if not os.path.isfile(config_data.requirements_file):
+            return []
+        lines = [line for line, source in specifiers.read_file(config_data.requirements_file)]
+    else:
+        lines = config_data.requirements.split()
+    requirements = []
+    for line in lines:
+        status, version = requirement_status(line)
+        requirements.append({'requirement': line, 'status': status, 'version': version})
+    return requirements
+
+
+def _predict_cache(config_data, name, settings_path):
+    """
+    Returns the cache status the stage would have and its cache key
+
+    :param settings_path: path of the settings file the stage would find, None
+                          if it's not known before running the previous stages
+    """
+    if name not in stages.CACHED_STAGES:
+        return None, None
+    if config_data.no_cache:
+        return 'disabled', None
+    predicted = copy.copy(config_data)
+    predicted.settings_path = settings_path or os.devnull
+    key = stages.stage_cache_key(predicted, name)
+    if key is None:
+        return 'uncacheable', None
+    if settings_path is None and name in stages.SETTINGS_KEY_STAGES:
+        return 'unknown', None
+    if cache.entry_content('stages', key, config_data.cache_dir) is None:
+        return 'miss', key
+    return 'hit', key
+
+
+def _estimate(durations, name, cache_status, requirements):
+    """
+    Returns the estimated duration of the stage and where it comes from
+    """
+    average = durations.get(cache.duration_key(name, cache_status))
+    if average:
+        return average['duration'], 'history'
+    if cache_status == 'hit':
+        return data.PLAN_CACHE_HIT_DURATION, 'default'
+    duration = data.PLAN_DURATIONS.get(name, 0)
+    if name == 'requirements':
+        duration += sum(
+            data.PLAN_REQUIREMENT_DURATIONS[item['status']] for item in requirements
+        )
+    return duration, 'default'
+
+
+def _warnings(config_data, requirements, installing):
+    """
+    Returns the warnings about the slow or failing steps of the plan
+    """
+    warnings = []
+    shared_cache = not config_data.no_cache and cache.get_shared_cache_dir(config_data.cache_dir)
+    built = [specifiers.canonical_name(name) for name in data.PLAN_BUILT_PACKAGES]
+    names = set()
+    for item in requirements:
+        name = requirement_name(item['requirement'])
+        names.add(specifiers.canonical_name(name or ''))
+        if item['status'] == 'url':
+            warnings.append('{0} is downloaded and installed from source at each '
+                            'installation'.format(item['requirement']))
+        elif (item['status'] == 'download' and not shared_cache and
+                specifiers.canonical_name(name or '') in built):
+            warnings.append('{0} is not installed and may be built from source: use '
+                            '--cache-dir to keep the built wheels'.format(name))
+    driver = getattr(config_data, 'db_driver', '')
+    if (driver and driver != 'postgis' and not config_data.no_sync and
+            not distribution_version(driver) and
+            not (installing and specifiers.canonical_name(driver) in names)):
+        warnings.append('Database driver {0} is neither installed nor in the requirements: '
+                        'setup_database will fail'.format(driver))
+    return warnings
+
+
+def build(config_data):
+    """
+    Returns the installation plan: the stages which would run, with their
+    cache status, subprocesses and estimated duration, the requirements pip
+    would receive and the warnings about slow or failing steps.
+
+    Nothing is installed nor written, in the project directory or in the cache.
+
+    :param config_data: configuration data
+    :return: plan dictionary
+    """
+    warnings = []
+    completed = []
+    if config_data.resume:
+        try:
+            completed = stages.completed_stages(config_data, stages.load_manifest(config_data))
+        except EnvironmentError as e:
+            warnings.append(str(e))
+    installing = not config_data.no_deps and 'requirements' not in completed
+    requirements = _requirements(config_data) if installing else []
+    durations = cache.load_durations(config_data.cache_dir)
+    settings_file = os.path.relpath(config_data.settings_path, config_data.project_directory)
+    settings_path = None
+    if os.path.exists(config_data.settings_path):
+        settings_path = config_data.settings_path
+
+    plan_stages = []
+    for name, function, condition in stages.STAGES:
+        stage = {'name': name, 'status': 'run', 'cache': None, 'commands': [],
+                 'estimate': 0, 'source': None}
+        plan_stages.append(stage)
+        if condition and not condition(config_data):
+            stage['status'] = 'skipped'
+            continue
+        if name in completed:
+            stage['status'] = 'completed'
+            continue
+        stage['cache'], key = _predict_cache(config_data, name, settings_path)
+        if stage['cache'] == 'hit':
+            # The following stages find the settings file stored in the entry
+            if settings_file in cache.entry_content('stages', key, config_data.cache_dir)['files']:
+                settings_path = os.path.join(
+                    cache.entry_path('stages', key, config_data.cache_dir), 'tree', settings_file
+                )
+        else:
+            if name in stages.SETTINGS_STAGES:
+                settings_path = None
+            if name in STAGE_COMMANDS:
+                stage['commands'] = STAGE_COMMANDS[name](config_data)
+        stage['estimate'], stage['source'] = _estimate(
+            durations, name, stage['cache'], requirements
+        )
+    return {
+        'project_name': config_data.project_name,
+        'project_directory': os.path.abspath(config_data.project_directory),
+        'stages': plan_stages,
+        'requirements': requirements,
+        'estimate': sum(stage['estimate'] for stage in plan_stages),
+        'warnings': warnings + _warnings(config_data, requirements, installing),
+    }
+
+
+def format_plan(plan):
+    """
+    Returns the human readable installation plan
+    """
+    lines = ['Installation plan for {0} in {1}'.format(
+        plan['project_name'], plan['project_directory']
+    ), '']
+    line = '{0:<20} {1:<12} {2:>9}  {3}'
+    lines.append(line.format('Stage', 'Cache', 'Estimate', 'Source'))
+    for stage in plan['stages']:
+        if stage['status'] != 'run':
+            lines.append(line.format(stage['name'], stage['status'], '', '').rstrip())
+            continue
+        lines.append(line.format(
+            stage['name'], stage['cache'] or '-', '{0:.1f}s'.format(stage['estimate']),
+            stage['source']
+        ))
+        for command in stage['commands']:
+            lines.append('    $ {0}'.format(' '.join(command)))
+    lines.append(line.format('Total', '', '{0:.1f}s'.format(plan['estimate']), '').rstrip())
+    if plan['requirements']:
+        lines.extend(['', 'Requirements:'])
+        for item in plan['requirements']:
+            if item['status'] == 'installed':
+                status = 'installed ({0})'.format(item['version'])
+            elif item['status'] == 'url':
+                status = 'from URL'
+            elif item['version']:
+                status = 'to install (installed {0})'.format(item['version'])
+            else:
+                status = 'to install'
+            lines.append('  {0:<30} {1}'.format(status, item['requirement']))
+    if plan['warnings']:
+        lines.extend(['', 'Warnings:'])
+        lines.extend('  * {0}'.format(warning) for warning in plan['warnings'])
+    return '\n'.join(lines) + '\n'
+
+
+def show(config_data):
+    """
+    Shows the installation plan
+    """
+    sys.stdout.write(format_plan(build(config_data)))
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import codecs
+import errno
+import importlib
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import traceback
+
+from .config import data
+
+
+def preload(modules=data.SERVER_PRELOAD_MODULES):
+    """
+    Import the modules shared by the forked workers
+
+    :param modules: names of the modules; the ones not installed are skipped
+    :return: list of the imported modules
+    """
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            pass
+    return loaded
+
+
+def _send(conn, message):
+    conn.sendall('{0}\n'.format(json.dumps(message)).encode('utf-8'))
+
+
+def _messages(conn):
+    for line in conn.makefile('rb'):
+        yield json.loads(line.decode('utf-8'))
+
+
+def _relay(conn, streams):
+    """
+    Send the output written on the given pipes to the client until they are closed
+
+    :param conn: client connection
+    :param streams: dictionary mapping the pipes file descriptors to the stream names
+    """
+    decoders = dict((fd, codecs.getincrementaldecoder('utf-8')('replace')) for fd in streams)
+    streams = dict(streams)
+    while streams:
+        readable = select.select(list(streams), [], [])[0]
+        for fd in readable:
+            chunk = os.read(fd, 65536)
+            text = decoders[fd].decode(chunk, not chunk)
+            if text:
+                try:
+                    _send(conn, {streams[fd]: text})
+                except socket.error:
+                    # Client is gone: keep draining the pipes
+                    pass
+            if not chunk:
+                os.close(fd)
+                del streams[fd]
+
+
+def _execute(args):
+    from . import main
+
+    sys.argv = ['djangocms'] + list(args)
+    try:
+        return main.execute() or 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        sys.stderr.write('{0}\n'.format(e.code))
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+
+def _interpreter():
+    """
+    Returns the interpreter and the environment the projects are created with
+    """
+    return {'executable': sys.executable, 'prefix': sys.prefix}
+
+
+def handle(conn):
+    """
+    Run the installer for the request received on the connection, sending back
+    its output and exit status; called in the forked worker
+
+    Requests from another interpreter or virtualenv are refused: the
+    packages would be installed in the client environment and the project
+    created with the server one.
+
+    :param conn: client connection
+    :return: exit status
+    """
+    request = next(_messages(conn), None)
+    if request is None:
+        # Listening check
+        return 0
+    accepted = request.get('interpreter') == _interpreter()
+    if request.get('check') or not accepted:
+        _send(conn, {'accepted': accepted})
+        return 0
+    # Packages may have been installed since the server started
+    if hasattr(importlib, 'invalidate_caches'):
+        importlib.invalidate_caches()
+    streams = {}
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with open(os.devnull, 'r') as devnull:
+        os.dup2(devnull.fileno(), 0)
+    for fd, name in ((1, 'stdout'), (2, 'stderr')):
+        read, write = os.pipe()
+        os.dup2(write, fd)
+        os.close(write)
+        streams[read] = name
+    relay = threading.Thread(target=_relay, args=(conn, streams))
+    relay.start()
+
+    env = dict(request['env'])
+    env.pop(data.SERVER_SOCKET_ENV, None)
+    os.environ.clear()
+    os.environ.update(env)
+    os.chdir(request['cwd'])
+    status = _execute(request['args'])
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.close(1)
+    os.close(2)
+    relay.join()
+    try:
+        _send(conn, {'exit': status})
+    except socket.error:
+        pass
+    return status
+
+
+def _reap(children, block=False):
+    for pid in list(children):
+        try:
+            if os.waitpid(pid, 0 if block else os.WNOHANG)[0]:
+                children.discard(pid)
+        except OSError as e:
+            if e.errno != errno.ECHILD:
+                raise
+            children.discard(pid)
+
+
+def _bind(socket_path):
+    if os.path.exists(socket_path):
+        if _listening(socket_path):
+            raise RuntimeError('A server is already listening on {0}'.format(socket_path))
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # Created only accessible by the current user, with no window in which
+    # other users can connect
+    umask = os.umask(0o177)
+    try:
+        server.bind(socket_path)
+    finally:
+        os.umask(umask)
+    server.listen(data.SERVER_BACKLOG)
+    return server
+
+
+def serve(socket_path, max_requests=None):
+    """
+    Preload the installer and serve the requests received on the Unix socket,
+    each in a forked worker
+
+    :param socket_path: path of the Unix socket
+    :param max_requests: exit after accepting this number of connections
+    """
+    # The modules found on sys.path are not preloaded: packages may be
+    # installed while the server runs
+    preload()
+    server = _bind(socket_path)
+    sys.stdout.write('Listening on {0}\n'.format(socket_path))
+    sys.stdout.flush()
+    children = set()
+    served = 0
+    try:
+        while max_requests is None or served < max_requests:
+            conn = server.accept()[0]
+            pid = os.fork()
+            if pid == 0:  # pragma: no cover
+                status = 1
+                try:
+                    server.close()
+                    status = handle(conn)
+                finally:
+                    os._exit(status)
+            conn.close()
+            children.add(pid)
+            served += 1
+            _reap(children)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        _reap(children, block=True)
+
+
+def _listening(socket_path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        client.close()
+
+
+def _request(socket_path, request):
+    """
+    Send the request, with the client interpreter, to the server
+
+    :return: connected client socket, None if no server accepts the request
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(socket_path)
+        _send(client, dict(request, interpreter=_interpreter()))
+    except socket.error:
+        client.close()
+        return None
+    return client
+
+
+def forward_available(socket_path):
+    """
+    Whether a server using the same interpreter and virtualenv is listening
+    on the socket
+    """
+    client = _request(socket_path, {'check': True})
+    if client is None:
+        return False
+    try:
+        return next(_messages(client), {}).get('accepted', False)
+    except (socket.error, ValueError):
+        return False
+    finally:
+        client.close()
+
+
+def non_interactive(args, environ=None):
+    """
+    Whether the installer runs without asking for input with the given arguments:
+    in no-input mode or with a configuration file
+
+    :param args: command line arguments
+    :param environ: environment mapping (default: ``os.environ``)
+    """
+    environ = os.environ if environ is None else environ
+    for arg in args:
+        if arg in ('-q', '--no-input') or arg.split('=', 1)[0] == '--config-file':
+            return True
+    return any('{0}{1}'.format(data.ENV_PREFIX, name) in environ
+               for name in ('NO_INPUT', 'CONFIG_FILE'))
+
+
+def forward(socket_path, args, stdout=None, stderr=None):
+    """
+    Run the installer with the given arguments in the server listening on the socket
+
+    The installer runs in the current directory and environment, without reading
+    from the standard input: interactive runs (see ``non_interactive``) are not
+    forwarded.
+
+    :param socket_path: path of the Unix socket
+    :param args: command line arguments
+    :param stdout: stream the installer output is written to (default: ``sys.stdout``)
+    :param stderr: stream the installer errors are written to (default: ``sys.stderr``)
+    :return: exit status, or None if the run is interactive, no server is
+             listening on the socket or it uses another interpreter or virtualenv
+    """
+    if not non_interactive(args):
+        return None
+    streams = {'stdout': stdout or sys.stdout, 'stderr': stderr or sys.stderr}
+    client = _request(socket_path, {
+        'args': list(args), 'cwd': os.getcwd(), 'env': dict(os.environ)
+    })
+    if client is None:
+        return None
+    try:
+        for message in _messages(client):
+            if 'accepted' in message:
+                return None
+            if 'exit' in message:
+                return message['exit']
+            for name, text in message.items():
+                streams[name].write(text)
+                streams[name].flush()
+    finally:
+        client.close()
+    streams['stderr'].write('Connection to the installer server lost\n')
+    return 1
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import atexit
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from stat import S_ISDIR, S_IWGRP, S_IWOTH
+
+from . import cache
+from .config import data
+
+PACKAGE_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stand-ins directories private to the process, by settings digest
+_private_directories = {}
+
+
+def parse_latency(value):
+    """
+    Parse the latency of the stand-ins
+
+    :param value: seconds for all the commands, or comma separated
+                  ``command=seconds`` items, e.g.: ``pip=2,manage.py=0.5``
+    :return: dictionary mapping each command to its latency in seconds
+    :raises ValueError: if the value is not valid
+    """
+    latency = dict((command, 0.0) for command in data.SIMULATE_COMMANDS)
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        if '=' in item:
+            command, seconds = [part.strip() for part in item.split('=', 1)]
+            if command not in latency:
+                raise ValueError('Unknown command {0}'.format(command))
+            commands = [command]
+        else:
+            commands, seconds = data.SIMULATE_COMMANDS, item
+        seconds = float(seconds)
+        if seconds < 0:
+            raise ValueError('Latency must not be negative')
+        for command in commands:
+            latency[command] = seconds
+    return latency
+
+
+def stub_settings(config_data):
+    """
+    Returns the behaviour of the stand-ins configured in the options
+    """
+    return {
+        'latency': parse_latency(config_data.simulate_latency),
+        'fail': config_data.simulate_fail,
+    }
+
+
+def write_stub(path, command, settings):
+    """
+    Atomically write the stand-in of the command
+
+    :param path: stand-in path
+    :param command: one of ``data.SIMULATE_COMMANDS``
+    :param settings: stand-ins behaviour, see ``stub_settings``
+    """
+    temp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    # Not writable by the group and the others, whatever the umask
+    with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o755), 'w') as fd:
+        fd.write(data.SIMULATE_STUB.format(
+            command=command, package_path=PACKAGE_PATH, settings=settings
+        ))
+    os.rename(temp_path, path)
+
+
+def _trusted(directory):
+    """
+    Whether the directory is owned by the current user and only writable by
+    them, so that nobody else can change the stand-ins it contains
+    """
+    if not hasattr(os, 'geteuid'):  # pragma: no cover
+        return True
+    stat = os.lstat(directory)
+    return (
+        S_ISDIR(stat.st_mode) and stat.st_uid == os.geteuid() and
+        not stat.st_mode & (S_IWGRP | S_IWOTH)
+    )
+
+
+def _private_directory(digest):
+    """
+    Returns a directory created for this process, removed when it exits
+    """
+    if digest not in _private_directories:
+        directory = tempfile.mkdtemp(prefix='djangocms-installer-stubs-')
+        atexit.register(shutil.rmtree, directory, True)
+        _private_directories[digest] = directory
+    return _private_directories[digest]
+
+
+def stubs_directory(config_data, create=True):
+    """
+    Returns the directory of the stand-ins configured in the options, creating
+    them if needed
+
+    Projects configured alike share the directory in the cache; if it is not
+    trusted (see ``_trusted``), as in a cache root shared with other users,
+    the stand-ins are written in a directory private to the process instead.
+
+    :param create: whether to create the stand-ins; if not, the shared
+                   directory is returned and nothing is written
+    """
+    settings = stub_settings(config_data)
+    digest = hashlib.sha1(json.dumps(
+        [settings, PACKAGE_PATH, sys.executable], sort_keys=True
+    ).encode('utf-8')).hexdigest()
+    directory = cache.entry_path(data.SIMULATE_STUBS_DIR, digest,
+                                 getattr(config_data, 'cache_dir', None))
+    if not create:
+        return directory
+    try:
+        cache._makedirs(os.path.dirname(directory))
+        os.mkdir(directory, 0o700)
+    except OSError:
+        # Created by a concurrent installer, or not writable
+        pass
+    try:
+        trusted = _trusted(directory)
+    except OSError:
+        trusted = False
+    if not trusted:
+        directory = _private_directory(digest)
+    if not all(os.path.exists(os.path.join(directory, command))
+               for command in data.SIMULATE_COMMANDS):
+        for command in data.SIMULATE_COMMANDS:
+            write_stub(os.path.join(directory, command), command, settings)
+    return directory
+
+
+def command(config_data, name, create=True):
+    """
+    Returns the command line running the stand-in of the command in simulate
+    mode, None otherwise
+
+    :param config_data: configuration data
+    :param name: one of ``data.SIMULATE_COMMANDS``
+    :param create: whether to create the stand-in (see ``stubs_directory``)
+    """
+    if not getattr(config_data, 'simulate', False):
+        return None
+    return [sys.executable, os.path.join(stubs_directory(config_data, create), name)]
+
+
+def start_project(project_name, directory, settings):
+    """
+    Create a minimal Django project, as ``django-admin startproject`` does
+
+    :param project_name: project name
+    :param directory: project directory
+    :param settings: stand-ins behaviour, written in the ``manage.py`` stand-in
+    """
+    from .django import generate_secret_key
+
+    for path in data.SIMULATE_PROJECT:
+        path = os.path.join(directory, path.format(project_name=project_name))
+        # As django-admin does, existing files are not replaced
+        if os.path.exists(path):
+            raise EnvironmentError(
+                '{0} already exists, overlaying a project or app into an existing directory '
+                'won\'t replace conflicting files'.format(path)
+            )
+    for path, content in data.SIMULATE_PROJECT.items():
+        path = os.path.join(directory, path.format(project_name=project_name))
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as fd:
+            fd.write(content.format(project_name=project_name, secret_key=generate_secret_key()))
+    write_stub(os.path.join(directory, 'manage.py'), 'manage.py', settings)
+
+
+def stub(command, args, settings):
+    """
+    Run a stand-in: wait for its latency, then fail if requested or simulate
+    the command
+
+    :param command: one of ``data.SIMULATE_COMMANDS``
+    :param args: command arguments
+    :param settings: stand-ins behaviour, see ``stub_settings``
+    :return: exit status
+    """
+    time.sleep(settings['latency'][command])
+    if settings['fail'] == command:
+        sys.stderr.write('Simulated failure of {0} {1}\n'.format(command, ' '.join(args)))
+        return 1
+    if command == 'django-admin' and args[:1] == ['startproject']:
+        project_name = args[1]
+        directory = args[2] if len(args) > 2 else os.path.join(os.getcwd(), project_name)
+        try:
+            start_project(project_name, directory, settings)
+        except EnvironmentError as e:
+            sys.stderr.write('CommandError: {0}\n'.format(e))
+            return 1
+    elif command == 'pip' and '-q' not in args:
+        sys.stdout.write('Simulated pip {0}\n'.format(' '.join(args)))
+    return 0
@@ -0,0 +1,511 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+from . import __version__, cache, django, install, simulate
+from .config import data
+from .utils import distribution_version, requirement_name
+
+
+def install_requirements(config_data):
+    """
+    Install the project dependencies
+
+    :param config_data: configuration data
+    """
+    cache_dir = None
+    if not config_data.no_cache:
+        cache_dir = cache.get_shared_cache_dir(config_data.cache_dir)
+    pip = simulate.command(config_data, 'pip')
+    if config_data.requirements_file:
+        install.requirements(
+            config_data.requirements_file, config_data.pip_options, True,
+            verbose=config_data.verbose, cache_dir=cache_dir, pip=pip
+        )
+        return {'requirements': config_data.requirements_file}
+    install.requirements(
+        config_data.requirements, config_data.pip_options,
+        verbose=config_data.verbose, cache_dir=cache_dir, pip=pip
+    )
+    return {'requirements': config_data.requirements}
+
+
+def check_install(config_data):
+    """
+    Check the environment before creating the project
+
+    :param config_data: configuration data
+    """
+    sys.stdout.write('Dependencies installed\nCreating the project\n')
+    install.check_install(config_data)
+
+
+def create_project(config_data):
+    django.create_project(config_data)
+    return {'files': _file_outputs(config_data, ['manage.py', _settings_file(config_data)])}
+
+
+def patch_settings(config_data):
+    django.patch_settings(config_data)
+    return {'files': _file_outputs(config_data, [_settings_file(config_data)])}
+
+
+def copy_files(config_data):
+    django.copy_files(config_data)
+    return {'files': _file_outputs(config_data, [
+        os.path.join(config_data.project_name, 'urls.py')
+    ])}
+
+
+def setup_database(config_data):
+    django.setup_database(config_data)
+
+
+def load_starting_page(config_data):
+    django.load_starting_page(config_data)
+
+
+def write_requirements(config_data):
+    install.write_requirements(config_data)
+    return {'files': _file_outputs(config_data, ['requirements.txt'])}
+
+
+# Installation stages in execution order: name, function, condition to run the stage
+STAGES = (
+    ('requirements', install_requirements, lambda config_data: not config_data.no_deps),
+    # Nothing is installed in simulate mode
+    ('check_install', check_install, lambda config_data: not config_data.simulate),
+    ('create_project', create_project, None),
+    ('patch_settings', patch_settings, None),
+    ('copy_files', copy_files, None),
+    ('setup_database', setup_database, lambda config_data: not config_data.no_sync),
+    ('starting_page', load_starting_page, lambda config_data: config_data.starting_page),
+    ('write_requirements', write_requirements,
+     lambda config_data: not config_data.requirements_file),
+)
+
+
+def _file_checksum(path):
+    checksum = hashlib.sha1()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(65536), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _options(config_data, options):
+    return dict((option, getattr(config_data, option, None)) for option in options)
+
+
+def _directory_checksum(path):
+    """
+    Returns the checksum of the files in path
+    """
+    checksum = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            checksum.update(os.path.relpath(os.path.join(root, name), path).encode('utf-8'))
+            checksum.update(_file_checksum(os.path.join(root, name)).encode('utf-8'))
+    return checksum.hexdigest()
+
+
+def _settings_checksum(config_data):
+    """
+    Returns the checksum of the settings file, ignoring the SECRET_KEY value
+    """
+    with open(config_data.settings_path, 'r') as fd:
+        content = django.SECRET_KEY_RE.sub('', fd.read(), 1)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def _installed_versions(config_data):
+    """
+    Returns the installed versions of Django, django CMS and of the requirements
+    """
+    names = set(['Django', 'django-cms'])
+    if getattr(config_data, 'requirements', None):
+        names.update(
+            name for name in map(requirement_name, config_data.requirements.split()) if name
+        )
+    return sorted((name.lower(), distribution_version(name)) for name in names)
+
+
+def create_project_key(config_data):
+    """
+    Returns the values the output of ``create_project`` depends on, or None
+    if it cannot be cached
+    """
+    if config_data.template:
+        # External project templates may change at any time
+        return None
+    return ['create_project', config_data.project_name, distribution_version('Django')]
+
+
+def patch_settings_key(config_data):
+    """
+    Returns the values the output of ``patch_settings`` depends on, or None
+    if it cannot be cached
+    """
+    if not os.path.exists(config_data.settings_path):
+        return None
+    extra_settings = None
+    if config_data.extra_settings and os.path.exists(config_data.extra_settings):
+        extra_settings = _file_checksum(config_data.extra_settings)
+    return [
+        'patch_settings', _settings_checksum(config_data),
+        _options(config_data, data.CACHE_STAGE_OPTIONS['patch_settings']), extra_settings,
+        _installed_versions(config_data),
+    ]
+
+
+def copy_files_key(config_data):
+    """
+    Returns the values the output of ``copy_files`` depends on, or None
+    if it cannot be cached
+    """
+    templates = None
+    if config_data.templates and os.path.isdir(config_data.templates):
+        templates = _directory_checksum(config_data.templates)
+    return [
+        'copy_files', _options(config_data, data.CACHE_STAGE_OPTIONS['copy_files']), templates,
+    ]
+
+
+def setup_database_key(config_data):
+    """
+    Returns the values the database created by ``setup_database`` depends on,
+    or None if it cannot be cached: only SQLite databases inside the project
+    directory and without admin user are cached
+    """
+    db_parsed = getattr(config_data, 'db_parsed', None) or {}
+    name = db_parsed.get('NAME') or ''
+    if (not db_parsed.get('ENGINE', '').endswith('sqlite3') or not name or
+            os.path.isabs(name) or name.startswith(os.pardir) or
+            not (config_data.no_user or config_data.noinput) or
+            not os.path.exists(config_data.settings_path)):
+        return None
+    return [
+        'setup_database', _settings_checksum(config_data), name,
+        _installed_versions(config_data),
+    ]
+
+
+# Stages whose output is cached, mapped to the function returning the cache key values
+CACHED_STAGES = {
+    'create_project': create_project_key,
+    'patch_settings': patch_settings_key,
+    'copy_files': copy_files_key,
+    'setup_database': setup_database_key,
+}
+# Stages writing the settings file, and cached stages whose key depends on it
+SETTINGS_STAGES = ('create_project', 'patch_settings')
+SETTINGS_KEY_STAGES = ('patch_settings', 'setup_database')
+
+
+def stage_cache_key(config_data, name):
+    """
+    Returns the cache key of the stage output, or None if it's not cached
+
+    :param config_data: configuration data
+    :param name: stage name
+    """
+    if name not in CACHED_STAGES or config_data.no_cache:
+        return None
+    values = CACHED_STAGES[name](config_data)
+    if values is None:
+        return None
+    # Simulated projects never share cache entries with real ones
+    if config_data.simulate:
+        values = ['simulate'] + values
+    return cache.cache_key(*values)
+
+
+def _run_stage(config_data, name, function):
+    """
+    Run the stage, restoring its output from the cache if available
+
+    :param config_data: configuration data
+    :param name: stage name
+    :param function: stage function
+    :return: stage outputs
+    """
+    key = stage_cache_key(config_data, name)
+    if not key:
+        return function(config_data) or {}
+
+    # Concurrent installers wait for the one building the entry, then use it
+    with cache.lock('stages', key, config_data.cache_dir):
+        outputs = _restore_stage(config_data, name, key)
+        if outputs is None:
+            outputs = _store_stage(config_data, function, key)
+    cache.record_use('stages', outputs['cache'] == 'hit', config_data.cache_dir)
+    return outputs
+
+
+def warm(config_data):
+    """
+    Run only the cached stages, to store their output in the cache
+
+    :param config_data: configuration data
+    :return: list of executed stages with their cache status
+    """
+    executed = []
+    for name, function, condition in STAGES:
+        if name not in CACHED_STAGES or (condition and not condition(config_data)):
+            continue
+        outputs = _run_stage(config_data, name, function)
+        executed.append({'name': name, 'cache': outputs.get('cache')})
+    return executed
+
+
+def _restore_stage(config_data, name, key):
+    """
+    Restore the stage output from the cache entry
+
+    :return: stage outputs, or None if the entry does not exist
+    """
+    secret_key = django.get_secret_key(config_data.settings_path)
+    files = cache.restore_tree('stages', key, config_data.project_directory,
+                               config_data.cache_dir)
+    if files is None:
+        return None
+    if _settings_file(config_data) in files:
+        django.set_secret_key(config_data.settings_path,
+                              secret_key or django.generate_secret_key())
+    if config_data.verbose:
+        sys.stdout.write('{0} output restored from cache\n'.format(name))
+    return {'files': _file_outputs(config_data, files), 'cache': 'hit'}
+
+
+def _store_stage(config_data, function, key):
+    """
+    Run the stage and store its output in the cache entry
+
+    :return: stage outputs
+    """
+    directory = config_data.project_directory
+    before = cache.snapshot(directory)
+    outputs = function(config_data) or {}
+    files, dirs = cache.changes(directory, before)
+    # Projects must not share the secret key: it's masked in the cache entry
+    secret_key = None
+    if _settings_file(config_data) in files:
+        secret_key = django.get_secret_key(config_data.settings_path)
+    if secret_key:
+        django.set_secret_key(config_data.settings_path, data.SECRET_KEY_PLACEHOLDER)
+    try:
+        cache.store_tree('stages', key, directory, files, dirs, config_data.cache_dir)
+    finally:
+        if secret_key:
+            django.set_secret_key(config_data.settings_path, secret_key)
+    outputs['cache'] = 'miss'
+    return outputs
+
+
+def _settings_file(config_data):
+    return os.path.join(config_data.project_name, 'settings.py')
+
+
+def _file_outputs(config_data, paths):
+    """
+    Map the given paths, relative to the project directory, to their checksums
+    """
+    return dict(
+        (path, _file_checksum(os.path.join(config_data.project_directory, path)))
+        for path in paths
+    )
+
+
+def config_hash(config_data):
+    """
+    Returns a hash of the configuration values relevant for the project creation
+
+    :param config_data: configuration data
+    """
+    values = dict(
+        (key, value) for key, value in vars(config_data).items()
+        if key not in data.CHECKPOINT_IGNORED_OPTIONS
+    )
+    serialized = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+def manifest_path(config_data):
+    return os.path.join(config_data.project_directory, data.CHECKPOINT_FILE)
+
+
+def load_manifest(config_data):
+    """
+    Load the checkpoint manifest from the project directory
+
+    :param config_data: configuration data
+    :return: manifest dictionary or None if the manifest does not exists
+    """
+    try:
+        with open(manifest_path(config_data), 'r') as fd:
+            return json.load(fd)
+    except (IOError, ValueError):
+        return None
+
+
+def write_manifest(config_data, manifest):
+    """
+    Atomically write the checkpoint manifest in the project directory
+
+    :param config_data: configuration data
+    :param manifest: manifest dictionary
+    """
+    if not os.path.exists(config_data.project_directory):
+        os.makedirs(config_data.project_directory)
+    path = manifest_path(config_data)
+    with open('{0}.tmp'.format(path), 'w') as fd:
+        json.dump(manifest, fd, indent=2, sort_keys=True)
+    os.rename('{0}.tmp'.format(path), path)
+
+
+def _modified_output(config_data, manifest):
+    """
+    Returns the position of the first stage whose output files were modified
+    or removed, and the path of the file, or None if the files are unchanged
+    """
+    # Files may be modified by later stages: only their last recorded checksum is checked
+    checksums = {}
+    for stage in manifest.get('stages', []):
+        checksums.update(stage.get('outputs', {}).get('files', {}))
+    for position, stage in enumerate(manifest.get('stages', [])):
+        for path in sorted(stage.get('outputs', {}).get('files', {})):
+            full_path = os.path.join(config_data.project_directory, path)
+            if not os.path.exists(full_path) or _file_checksum(full_path) != checksums[path]:
+                return position, path
+    return None
+
+
+def completed_stages(config_data, manifest):
+    """
+    Verify the manifest against the current configuration and project files.
+
+    Returns the names of the stages completed before the first stage that must
+    be executed again.
+
+    :param config_data: configuration data
+    :param manifest: manifest dictionary
+    """
+    if not manifest:
+        return []
+    if (manifest.get('version') != __version__ or
+            manifest.get('config') != config_hash(config_data)):
+        raise EnvironmentError(
+            'Checkpoint manifest {0} was created with a different configuration or '
+            'installer version, cannot resume'.format(manifest_path(config_data))
+        )
+    completed = [stage['name'] for stage in manifest.get('stages', [])]
+    modified = _modified_output(config_data, manifest)
+    if modified:
+        return completed[:modified[0]]
+    return completed
+
+
+def _created_paths(directory, before):
+    """
+    Returns the files and directories created since the snapshot
+    """
+    files, dirs = cache.snapshot(directory)
+    return sorted((set(files) - set(before[0])) | (dirs - before[1]))
+
+
+def _remove_created(config_data, manifest, completed):
+    """
+    Remove the files and directories created by the stages which are executed
+    again, and by the failed one, so that they start from a clean state.
+    Directories are only removed if empty: files added by the user are kept.
+    """
+    modified = _modified_output(config_data, manifest)
+    if modified:
+        sys.stdout.write('{0} was modified after the {1} step: the following steps '
+                         'are executed again\n'.format(
+                             modified[1], manifest['stages'][modified[0]]['name']))
+    paths = set()
+    for stage in manifest.get('stages', [])[len(completed):]:
+        paths.update(stage.get('created', []))
+    paths.update(manifest.get('failed', {}).get('created', []))
+    full_paths = [os.path.join(config_data.project_directory, path) for path in paths]
+    for path in full_paths:
+        if os.path.isfile(path) or os.path.islink(path):
+            os.remove(path)
+    # Nested directories first
+    for path in sorted(full_paths, reverse=True):
+        if os.path.isdir(path) and not os.listdir(path):
+            os.rmdir(path)
+
+
+def run(config_data, progress=None):
+    """
+    Run the installation stages.
+
+    If ``config_data.resume`` is set, a checkpoint is recorded after each
+    stage, and stages already completed according to the checkpoint manifest
+    are skipped; the files created by the other ones are removed before they
+    are executed again.
+
+    :param config_data: configuration data
+    :param progress: list the names of the completed or skipped stages are
+                     appended to, telling where a failed installation stopped
+    :return: list of executed stages with their duration
+    """
+    progress = [] if progress is None else progress
+    completed = []
+    if config_data.resume:
+        previous = load_manifest(config_data)
+        completed = completed_stages(config_data, previous)
+        if previous:
+            _remove_created(config_data, previous, completed)
+    manifest = {
+        'version': __version__,
+        'config': config_hash(config_data),
+        'stages': [],
+    }
+    if completed:
+        manifest['stages'] = previous['stages'][:len(completed)]
+    executed = []
+    for name, function, condition in STAGES:
+        if condition and not condition(config_data):
+            continue
+        if name in completed:
+            sys.stdout.write('Skipping {0}: already completed\n'.format(name))
+            progress.append(name)
+            continue
+        start = time.time()
+        before = cache.snapshot(config_data.project_directory) if config_data.resume else None
+        try:
+            outputs = _run_stage(config_data, name, function)
+        except BaseException:
+            if config_data.resume:
+                # Partial output of the failed stage, removed before resuming
+                manifest['failed'] = {
+                    'name': name,
+                    'created': _created_paths(config_data.project_directory, before),
+                }
+                write_manifest(config_data, manifest)
+            raise
+        duration = time.time() - start
+        progress.append(name)
+        if config_data.resume:
+            manifest['stages'].append({
+                'name': name, 'duration': duration, 'outputs': outputs,
+                'created': _created_paths(config_data.project_directory, before),
+            })
+            write_manifest(config_data, manifest)
+        executed.append({'name': name, 'duration': duration, 'cache': outputs.get('cache')})
+    # The project is complete: the manifest is no longer needed
+    if os.path.exists(manifest_path(config_data)):
+        os.remove(manifest_path(config_data))
+    # Durations are used to estimate the installation plan: stand-ins are not relevant
+    if not config_data.no_cache and not config_data.simulate:
+        cache.record_durations(executed, config_data.cache_dir)
+    return executed
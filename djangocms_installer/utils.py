@@ -2,6 +2,7 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 import os
+import re
 import sys
 
 from six import text_type
@@ -124,3 +125,45 @@ def format_val(val):
         return int(val)
     else:
         return '\'{0}\''.format(val)
+
+
+def requirement_name(requirement):
+    """
+    Returns the project name of a requirement specifier, or None for URLs
+    and other non-named requirements
+    """
+    if '://' in requirement:
+        return None
+    match = re.match(r'^\s*([A-Za-z0-9][A-Za-z0-9._-]*)', requirement)
+    if match:
+        return match.group(1)
+    return None
+
+
+def invalidate_distributions():
+    """
+    Invalidate the import system caches, so that the packages installed in
+    the running interpreter are found
+    """
+    import importlib
+
+    if hasattr(importlib, 'invalidate_caches'):
+        importlib.invalidate_caches()
+
+
+def distribution_version(name):
+    """
+    Returns the version of the installed distribution, or None if not installed
+    """
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:  # pragma: no cover
+        import pkg_resources
+        # The global working set is not updated by the packages installed
+        # after it was built
+        distribution = pkg_resources.WorkingSet().find(pkg_resources.Requirement.parse(name))
+        return distribution.version if distribution else None
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
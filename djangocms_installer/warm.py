@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from . import cache, config, install, stages
+from .config import data
+from .utils import distribution_version
+
+
+def combinations():
+    """
+    Yields the supported combinations of django CMS and Django versions,
+    with and without django-filer and for each database driver
+    """
+    for cms_version in sorted(data.VERSION_MATRIX):
+        if str(cms_version) not in data.DJANGOCMS_SUPPORTED:
+            continue
+        for django_version in data.VERSION_MATRIX[cms_version]:
+            if str(django_version) not in data.DJANGO_SUPPORTED:
+                continue
+            for filer in (False, True):
+                for db in data.CACHE_WARM_DATABASES:
+                    yield OrderedDict((
+                        ('cms_version', str(cms_version)),
+                        ('django_version', str(django_version)),
+                        ('filer', filer),
+                        ('db', db),
+                    ))
+
+
+def combination_args(combination, project_directory, project_name='project'):
+    """
+    Returns the installer arguments for the combination
+    """
+    args = [
+        '-q', '-s', '-p', project_directory,
+        '--cms-version', combination['cms_version'],
+        '--django-version', combination['django_version'],
+        '--db', combination['db'],
+    ]
+    if combination['filer']:
+        args.append('--filer')
+    return args + [project_name]
+
+
+def _matches(version, installed):
+    return installed is not None and (installed == version or
+                                      installed.startswith('{0}.'.format(version)))
+
+
+def is_installed(combination):
+    """
+    Whether the installed Django and django CMS versions match the combination:
+    project files and databases are cached for the installed versions only
+    """
+    return (_matches(combination['django_version'], distribution_version('Django')) and
+            _matches(combination['cms_version'], distribution_version('django-cms')))
+
+
+def warm_wheels(job):
+    """
+    Build the wheels of a requirements set
+
+    :param job: dictionary with name, requirements and cache_dir
+    :return: job result dictionary
+    """
+    start = time.time()
+    result = {'name': job['name']}
+    try:
+        install.wheels(job['requirements'], cache_dir=job['cache_dir'])
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '{0}: {1}'.format(e.__class__.__name__, e)
+    result['duration'] = time.time() - start
+    return result
+
+
+def warm_project(config_data):
+    """
+    Create the project files and database of a combination in a temporary
+    directory, storing them in the cache
+
+    :param config_data: configuration data
+    :return: job result dictionary
+    """
+    start = time.time()
+    result = {'name': config_data.warm_name}
+    directory = config_data.project_directory
+    try:
+        result['stages'] = stages.warm(config_data)
+        result['status'] = 'ok'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '{0}: {1}'.format(e.__class__.__name__, e)
+    finally:
+        shutil.rmtree(directory, True)
+    result['duration'] = time.time() - start
+    return result
+
+
+def jobs(cache_dir=None, project_names=()):
+    """
+    Returns the wheel jobs, one for each distinct requirements set, and the
+    project jobs for the combinations matching the installed versions
+
+    :param cache_dir: value of the ``--cache-dir`` option
+    :param project_names: names of the projects whose files are cached
+    :return: tuple of wheel jobs and project configurations
+    """
+    wheel_jobs = OrderedDict()
+    project_jobs = []
+    for combination in combinations():
+        name = 'cms-{0} django-{1}{2} {3}'.format(
+            combination['cms_version'], combination['django_version'],
+            ' filer' if combination['filer'] else '', combination['db'].split(':')[0]
+        )
+        config_data = config.try_resolve(combination_args(combination, tempfile.gettempdir()),
+                                         [])[0]
+        if config_data is None:
+            continue
+        requirements = ' '.join(sorted(config_data.requirements.split()))
+        wheel_jobs.setdefault(requirements, {
+            'name': 'wheels {0}'.format(name), 'requirements': requirements,
+            'cache_dir': cache.get_shared_cache_dir(cache_dir),
+        })
+        if not is_installed(combination):
+            continue
+        for project_name in project_names:
+            project_directory = tempfile.mkdtemp(prefix='djangocms-installer-warm-')
+            config_data = config.try_resolve(
+                combination_args(combination, project_directory, project_name) +
+                (['--cache-dir', cache_dir] if cache_dir else []), []
+            )[0]
+            if config_data is None:
+                shutil.rmtree(project_directory, True)
+                continue
+            config_data.warm_name = '{0} {1}'.format(project_name, name)
+            config_data.no_deps = True
+            config_data.no_user = True
+            config_data.quiet = True
+            if not combination['db'].startswith('sqlite'):
+                config_data.no_sync = True
+            project_jobs.append(config_data)
+    return list(wheel_jobs.values()), project_jobs
+
+
+def run(cache_dir=None, project_names=(), jobs_count=None, pool_class=multiprocessing.Pool):
+    """
+    Warm the caches for all the supported combinations, running the jobs in
+    parallel
+
+    :param cache_dir: value of the ``--cache-dir`` option
+    :param project_names: names of the projects whose files are cached
+    :param jobs_count: number of worker processes (defaults to the number of CPUs)
+    :param pool_class: pool class, for testing
+    :return: list of job results
+    """
+    wheel_jobs, project_jobs = jobs(cache_dir, project_names)
+    results = []
+    pool = pool_class(jobs_count or multiprocessing.cpu_count())
+    try:
+        for function, items in ((warm_wheels, wheel_jobs), (warm_project, project_jobs)):
+            for result in pool.imap_unordered(function, items):
+                results.append(result)
+                sys.stdout.write(format_result(result))
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+def format_result(result):
+    if result['status'] == 'ok':
+        return '[ OK ] {name} ({duration:.1f}s)\n'.format(**result)
+    return '[FAIL] {name}: {error}\n'.format(**result)
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+from . import install
+from .config import data
+
+
+def init_queue(queue_dir):
+    """
+    Create the queue directories, if missing
+    """
+    for name in data.QUEUE_DIRS:
+        path = os.path.join(queue_dir, name)
+        if not os.path.isdir(path):
+            try:
+                os.makedirs(path)
+            except OSError:  # pragma: no cover
+                # Created by a concurrent worker
+                if not os.path.isdir(path):
+                    raise
+
+
+def worker_id():
+    return '{0}:{1}'.format(socket.gethostname(), os.getpid())
+
+
+def _write_json(queue_dir, path, content):
+    """
+    Write the file in the queue temporary directory and rename it in place,
+    so that other nodes never read a partial file
+    """
+    tmp = os.path.join(queue_dir, 'tmp', '{0}.json'.format(uuid.uuid4().hex))
+    with open(tmp, 'w') as fd:
+        json.dump(content, fd, indent=2, sort_keys=True)
+    os.rename(tmp, path)
+
+
+def _read_json(path):
+    with open(path, 'r') as fd:
+        return json.load(fd)
+
+
+def submit(queue_dir, name, args, directory=None):
+    """
+    Add a job to the queue
+
+    :param queue_dir: queue directory
+    :param name: job name, used in the job identifier
+    :param args: installer command line arguments
+    :param directory: project directory created by the job, removed before
+                      running the job again if its worker died
+    :return: job identifier
+    """
+    init_queue(queue_dir)
+    job_id = '{0}-{1}-{2}'.format(
+        datetime.utcnow().strftime('%Y%m%d%H%M%S%f'), uuid.uuid4().hex[:8], name
+    )
+    _write_json(queue_dir, os.path.join(queue_dir, 'pending', '{0}.json'.format(job_id)), {
+        'id': job_id, 'name': name, 'args': list(args), 'submitted': time.time(), 'attempts': 0,
+        'directory': directory,
+    })
+    return job_id
+
+
+def _claiming_path(queue_dir, token, claimed):
+    return os.path.join(queue_dir, 'tmp', '{0}.{1:.0f}.claiming'.format(token, claimed))
+
+
+def claim(queue_dir, worker=None):
+    """
+    Claim the oldest pending job.
+
+    The job file is renamed from ``pending`` to the temporary directory: the
+    rename is atomic, so only one worker can claim each job. The claimed job
+    is then written in ``claimed``, where it never appears with the mtime it
+    had when it was submitted (that is, with an expired lease).
+
+    :param queue_dir: queue directory
+    :param worker: worker identifier
+    :return: job dictionary or None if there are no pending jobs or the
+             claim was lost to another worker
+    """
+    pending = os.path.join(queue_dir, 'pending')
+    for filename in sorted(os.listdir(pending)):
+        if not filename.endswith('.json'):
+            continue
+        # Identifies this claim: the job may be claimed again once the lease expired
+        token = uuid.uuid4().hex
+        now = time.time()
+        claiming = _claiming_path(queue_dir, token, now)
+        try:
+            os.rename(os.path.join(pending, filename), claiming)
+        except OSError:
+            # Claimed by another worker
+            continue
+        try:
+            job = _read_json(claiming)
+            job['attempts'] += 1
+            job.update({'worker': worker or worker_id(), 'claimed': now, 'token': token})
+            _write_json(queue_dir, os.path.join(queue_dir, 'claimed', filename), job)
+            os.unlink(claiming)
+        except (IOError, OSError, ValueError):
+            # Lost race: the job is requeued by requeue_expired if still claiming
+            return None
+        return job
+    return None
+
+
+def requeue_expired(queue_dir, lease=data.QUEUE_LEASE, max_attempts=data.QUEUE_MAX_ATTEMPTS):
+    """
+    Move back to pending the claimed jobs whose lease has not been renewed,
+    because their worker died; jobs which already used all their attempts are
+    marked as failed.
+
+    Lease expiration relies on the nodes clocks being synchronized.
+
+    :param queue_dir: queue directory
+    :param lease: lease duration in seconds
+    :param max_attempts: maximum number of claims of a job
+    :return: list of requeued job identifiers
+    """
+    requeued = []
+    claimed = os.path.join(queue_dir, 'claimed')
+    now = time.time()
+    # Jobs of the workers which died while claiming them
+    tmp = os.path.join(queue_dir, 'tmp')
+    for filename in sorted(os.listdir(tmp)):
+        if not filename.endswith('.claiming'):
+            continue
+        path = os.path.join(tmp, filename)
+        try:
+            if now - float(filename.split('.')[1]) < lease:
+                continue
+            job = _read_json(path)
+            os.rename(path, os.path.join(queue_dir, 'pending', '{0}.json'.format(job['id'])))
+        except (IOError, OSError, ValueError):
+            continue
+        requeued.append(job['id'])
+    for filename in sorted(os.listdir(claimed)):
+        path = os.path.join(claimed, filename)
+        try:
+            if now - os.stat(path).st_mtime < lease:
+                continue
+            job = _read_json(path)
+        except (IOError, OSError, ValueError):
+            # Completed or requeued in the meantime
+            continue
+        if job['attempts'] >= max_attempts:
+            job.update({
+                'status': 'error', 'error': 'Lease expired {0} times'.format(job['attempts']),
+            })
+            target = os.path.join(queue_dir, 'failed', filename)
+        else:
+            target = os.path.join(queue_dir, 'pending', filename)
+        try:
+            os.rename(path, target)
+        except OSError:
+            continue
+        if job.get('status') == 'error':
+            _write_json(queue_dir, target, job)
+        else:
+            requeued.append(job['id'])
+    return requeued
+
+
+def _owned(claimed, job):
+    """
+    Whether the claimed job file still belongs to the job claim
+    """
+    try:
+        return _read_json(claimed).get('token') == job['token']
+    except (IOError, OSError, ValueError):
+        return False
+
+
+def _release(queue_dir, claimed, job):
+    """
+    Remove the claimed job file, unless the job was claimed again by another
+    worker after the lease expired
+    """
+    # The file is moved out of the way first, so that it's never deleted after
+    # being claimed again
+    released = os.path.join(queue_dir, 'tmp', '{0}.released'.format(job['token']))
+    try:
+        os.rename(claimed, released)
+    except OSError:
+        return
+    if _owned(released, job):
+        os.unlink(released)
+    else:
+        os.rename(released, claimed)
+
+
+def run_job(queue_dir, job, lease=data.QUEUE_LEASE):
+    """
+    Run the installer for the job in a subprocess, renewing the job lease
+    until it completes; the result is written in the ``done`` or ``failed``
+    directory and the output in the ``logs`` directory.
+
+    :param queue_dir: queue directory
+    :param job: job dictionary as returned by ``claim``
+    :param lease: lease duration in seconds
+    :return: job result dictionary
+    """
+    filename = '{0}.json'.format(job['id'])
+    claimed = os.path.join(queue_dir, 'claimed', filename)
+    log = os.path.join(queue_dir, 'logs', '{0}.log'.format(job['id']))
+    job['log'] = log
+    job['started'] = time.time()
+    with open(log, 'w') as output:
+        directory = job.get('directory')
+        if job['attempts'] > 1 and directory and os.path.exists(directory):
+            # Partial project left by the worker which died
+            output.write('Removing {0} left by attempt {1}\n'.format(
+                directory, job['attempts'] - 1
+            ))
+            output.flush()
+            install.remove_directory(directory)
+        with open(os.devnull, 'r') as devnull:
+            process = subprocess.Popen(
+                [sys.executable, '-m', 'djangocms_installer'] + job['args'],
+                stdin=devnull, stdout=output, stderr=subprocess.STDOUT,
+                env=install.installer_env()
+            )
+        renewed = time.time()
+        while process.poll() is None:
+            time.sleep(0.1)
+            if time.time() - renewed > lease / 3.0:
+                renewed = time.time()
+                # Once the lease is lost, the job may be run again by another worker
+                if _owned(claimed, job):
+                    try:
+                        os.utime(claimed, None)
+                    except OSError:
+                        pass
+    job['finished'] = time.time()
+    job['duration'] = job['finished'] - job['started']
+    job['returncode'] = process.returncode
+    if process.returncode == 0:
+        job['status'] = 'ok'
+        target = os.path.join(queue_dir, 'done', filename)
+    else:
+        job['status'] = 'error'
+        job['error'] = 'Installer exited with status {0}, see {1}'.format(process.returncode, log)
+        target = os.path.join(queue_dir, 'failed', filename)
+    _write_json(queue_dir, target, job)
+    _release(queue_dir, claimed, job)
+    return job
+
+
+def work(queue_dir, lease=data.QUEUE_LEASE, poll=data.QUEUE_POLL,
+         max_attempts=data.QUEUE_MAX_ATTEMPTS, max_jobs=None, exit_when_empty=False):
+    """
+    Process the queue jobs until stopped
+
+    :param queue_dir: queue directory
+    :param lease: lease duration in seconds
+    :param poll: seconds to wait before checking again an empty queue
+    :param max_attempts: maximum number of claims of a job
+    :param max_jobs: exit after running this number of jobs
+    :param exit_when_empty: exit when there are no pending jobs
+    :return: list of job results
+    """
+    init_queue(queue_dir)
+    worker = worker_id()
+    results = []
+    while max_jobs is None or len(results) < max_jobs:
+        requeue_expired(queue_dir, lease, max_attempts)
+        job = claim(queue_dir, worker)
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll)
+            continue
+        result = run_job(queue_dir, job, lease)
+        results.append(result)
+        if result['status'] == 'ok':
+            sys.stdout.write('[ OK ] {id} ({duration:.1f}s)\n'.format(**result))
+        else:
+            sys.stdout.write('[FAIL] {id}: {error}\n'.format(**result))
+    return results
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+
+from mock import patch
+
+from djangocms_installer import api, config, django, exceptions, stages
+
+from .base import BaseTestClass
+
+
+class TestApi(BaseTestClass):
+
+    def setUp(self):
+        super(TestApi, self).setUp()
+        self.calls = []
+
+    def _stage(self, name, fail=False):
+        def stage(config_data):
+            self.calls.append((name, config_data.project_name))
+            if fail:
+                raise EnvironmentError('{0} failed'.format(name))
+            if not os.path.exists(config_data.project_directory):
+                os.makedirs(config_data.project_directory)
+            with open(os.path.join(config_data.project_directory, name), 'w') as fd:
+                fd.write(name)
+        return stage
+
+    def _create(self, options, fail=False):
+        test_stages = (
+            ('first', self._stage('first'), None),
+            ('skipped', self._stage('skipped'), lambda config_data: False),
+            ('second', self._stage('second', fail), None),
+        )
+        with patch('sys.stdout', self.stdout):
+            with patch.object(stages, 'STAGES', test_stages):
+                return api.create_project(options)
+
+    def test_options_to_args(self):
+        self.assertEqual(api.options_to_args({
+            'project_name': 'example_prj', 'project_directory': '/path', 'filer': True,
+            'bootstrap': False, 'languages': ['en', 'de'], 'template': None,
+        }), ['--bootstrap', 'no', '--filer', '--languages', 'en,de', '--parent-dir', '/path',
+             'example_prj'])
+        with self.assertRaises(exceptions.ConfigurationError):
+            api.options_to_args({'project_name': 'example_prj', 'unknown': True})
+        with self.assertRaises(exceptions.ConfigurationError):
+            api.options_to_args({'filer': True})
+
+    def test_create_project(self):
+        results = []
+        for name in ('first_prj', 'second_prj'):
+            results.append(self._create({
+                'project_name': name,
+                'project_directory': os.path.join(self.project_dir, name),
+                'languages': ['en', 'de'],
+            }))
+        self.assertEqual(self.calls, [('first', 'first_prj'), ('second', 'first_prj'),
+                                      ('first', 'second_prj'), ('second', 'second_prj')])
+        self.assertEqual(results[1].project_name, 'second_prj')
+        self.assertEqual(results[1].project_directory, os.path.join(self.project_dir,
+                                                                    'second_prj'))
+        self.assertEqual(results[1].config_data.languages, ['en', 'de'])
+        self.assertEqual([stage['name'] for stage in results[0].stages], ['first', 'second'])
+        self.assertTrue(results[0].duration >= 0)
+        self.assertTrue(os.path.exists(os.path.join(self.project_dir, 'first_prj', 'second')))
+
+        # Command line arguments are accepted as well
+        result = self._create(['-p', os.path.join(self.project_dir, 'third'), 'third_prj'])
+        self.assertEqual(result.project_name, 'third_prj')
+
+    def test_configuration_errors(self):
+        with self.assertRaises(exceptions.InvalidProjectNameError) as error:
+            self._create({'project_name': 'sys', 'project_directory': self.project_dir})
+        self.assertEqual(error.exception.code, 3)
+
+        with open(os.path.join(self.project_dir, 'file.txt'), 'w') as fd:
+            fd.write('content')
+        with self.assertRaises(exceptions.ProjectDirectoryError):
+            self._create({'project_name': 'example_prj', 'project_directory': self.project_dir})
+
+        with self.assertRaises(exceptions.ConfigurationError):
+            self._create({'project_name': 'example_prj', 'skip_project_dir_check': True,
+                          'project_directory': self.project_dir, 'django_version': '1.2'})
+
+        with self.assertRaises(exceptions.ConfigurationError) as error:
+            self._create({'project_name': 'example_prj', 'project_directory': self.project_dir,
+                          'db': 'unknown://localhost'})
+        with self.assertRaises(exceptions.ConfigurationError) as error:
+            self._create(['--unknown-option', 'example_prj'])
+        self.assertEqual(error.exception.code, 2)
+        self.assertEqual(self.calls, [])
+
+    def test_installation_error(self):
+        project_directory = os.path.join(self.project_dir, 'example')
+        with patch('djangocms_installer.install.remove_directory') as remove_directory:
+            with self.assertRaises(exceptions.InstallationError) as error:
+                self._create({'project_name': 'example_prj',
+                              'project_directory': project_directory}, fail=True)
+        self.assertEqual(error.exception.stage, 'second')
+        self.assertTrue(isinstance(error.exception.error, EnvironmentError))
+        remove_directory.assert_called_once_with(project_directory)
+
+    def test_missing_settings(self):
+        # Modules may have been reloaded by the isolated tests: exceptions must be the same
+        from djangocms_installer import api, config, django, exceptions, main
+
+        project_directory = os.path.join(self.project_dir, 'example')
+        args = ['--simulate', '--no-deps', '--no-cache', '-q', '-u', '-len',
+                '--db=sqlite://localhost/project.db', '-p', project_directory, 'example_prj']
+        # django-admin does not create the project
+        with patch.object(django, 'startproject_command', return_value=['true']):
+            with patch('sys.stdout', self.stdout):
+                with self.assertRaises(exceptions.ProjectStructureError) as error:
+                    api.create_project(args)
+            self.assertEqual(error.exception.stage, 'create_project')
+            self.assertFalse(os.path.exists(project_directory))
+
+            with patch('sys.stdout', self.stdout):
+                with patch('sys.stderr', self.stderr):
+                    with patch('sys.argv', ['djangocms'] + args):
+                        self.assertEqual(main.execute(), 5)
+        self.assertTrue('settings.py does not exist' in self.stderr.getvalue())
+
+        config_data = config.parse(args)
+        with self.assertRaises(exceptions.ProjectStructureError) as error:
+            django.patch_settings(config_data)
+        self.assertEqual(error.exception.stage, 'patch_settings')
+
+    def test_settings_not_modified(self):
+        middleware = list(config.get_settings().MIDDLEWARE_CLASSES)
+        config_data = config.parse(['-q', '-p' + self.project_dir, 'example_prj'])
+        with patch.object(django, '_detect_migration_layout', return_value={}):
+            first = django._build_settings(config_data)
+            second = django._build_settings(config_data)
+        self.assertEqual(first, second)
+        self.assertEqual(first.count(config.get_settings().APPHOOK_RELOAD_MIDDLEWARE_CLASS), 1)
+        self.assertEqual(config.get_settings().MIDDLEWARE_CLASSES, middleware)
+        config.get_settings().MIDDLEWARE_CLASSES.append('example.Middleware')
+        self.assertEqual(config.get_settings().MIDDLEWARE_CLASSES, middleware)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+
+from mock import patch
+
+from djangocms_installer import batch, stages
+
+from .base import BaseTestClass
+
+
+class DummyPool(object):
+    """
+    In process replacement of multiprocessing.Pool
+    """
+    def __init__(self, processes):
+        self.processes = processes
+
+    def imap_unordered(self, function, items):
+        return map(function, items)
+
+    def close(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class TestBatch(BaseTestClass):
+    config_dir = os.path.join(os.path.dirname(__file__), 'fixtures', 'configs')
+
+    def _configs(self, *names):
+        return [os.path.join(self.config_dir, 'config-{0}.ini'.format(name)) for name in names]
+
+    def test_project_name(self):
+        self.assertEqual(batch.project_name('/path/config-01.ini'), 'config_01')
+        self.assertEqual(batch.project_name('/path/01-Customer.ini'), 'project_01_customer')
+
+    def test_find_configs(self):
+        configs = batch.find_configs(self.config_dir)
+        self.assertEqual(len(configs), 31)
+        self.assertEqual(os.path.basename(configs[0]), 'config-01.ini')
+
+    def test_parse_configs(self):
+        projects, errors = batch.parse_configs(
+            self._configs('01', '11', '18') + [os.path.join(self.config_dir, 'missing.ini')],
+            self.project_dir, ['--no-sync']
+        )
+        self.assertEqual([config_data.project_name for config_data in projects],
+                         ['config_01', 'config_11', 'config_18'])
+        self.assertEqual(projects[1].project_directory,
+                         os.path.join(self.project_dir, 'config_11'))
+        self.assertTrue(projects[0].no_sync)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['name'], 'missing')
+        self.assertTrue(errors[0]['error'].find('doesn\'t exists') > -1)
+
+    def test_parse_configs_projects(self):
+        projects_dir = os.path.join(os.path.dirname(__file__), 'fixtures', 'projects')
+        projects, errors = batch.parse_configs(
+            [os.path.join(projects_dir, 'projects.ini'),
+             os.path.join(projects_dir, 'circular.ini')] + self._configs('01'),
+            self.project_dir
+        )
+        self.assertEqual([config_data.project_name for config_data in projects],
+                         ['customer_a', 'customer_b', 'customer_c', 'config_01'])
+        self.assertEqual(projects[2].project_directory,
+                         os.path.join(self.project_dir, 'customer_c'))
+        self.assertTrue(projects[2].bootstrap)
+        self.assertEqual(projects[0].languages, ['en', 'fr'])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0]['name'], 'circular')
+        self.assertTrue(errors[0]['error'].find('Circular inheritance') > -1)
+
+    def test_submit_configs(self):
+        projects_dir = os.path.join(os.path.dirname(__file__), 'fixtures', 'projects')
+        queue_dir = os.path.join(self.project_dir, 'queue')
+        with patch('sys.stdout'):
+            status = batch.submit_configs(
+                [os.path.join(projects_dir, 'projects.ini'),
+                 os.path.join(projects_dir, 'circular.ini')] + self._configs('01'),
+                self.project_dir, queue_dir, ['--no-sync']
+            )
+        self.assertEqual(status, 1)
+        jobs = []
+        for filename in sorted(os.listdir(os.path.join(queue_dir, 'pending'))):
+            with open(os.path.join(queue_dir, 'pending', filename)) as fd:
+                jobs.append(json.load(fd))
+        self.assertEqual(sorted(job['name'] for job in jobs),
+                         ['config_01', 'customer_a', 'customer_b', 'customer_c'])
+        job = [job for job in jobs if job['name'] == 'customer_b'][0]
+        self.assertEqual(job['args'], [
+            '--config-file', os.path.join(projects_dir, 'projects.ini'), '-q',
+            '-p', os.path.join(self.project_dir, 'customer_b'), '--no-sync', 'customer_b'
+        ])
+
+    def test_group_by_requirements(self):
+        projects, errors = batch.parse_configs(
+            self._configs('01', '02', '18', '20'), self.project_dir
+        )
+        groups = batch.group_by_requirements(projects)
+        # sqlite and postgres default projects differ by database driver,
+        # filer changes the plugins and no-deps has nothing to install
+        self.assertEqual(len(groups), 4)
+        projects, errors = batch.parse_configs(
+            self._configs('01', '03', '04', '05'), self.project_dir
+        )
+        self.assertEqual([len(group) for group in batch.group_by_requirements(projects).values()],
+                         [1, 3])
+
+    def test_run(self):
+        projects, errors = batch.parse_configs(
+            self._configs('01', '03', '04', '20'), self.project_dir
+        )
+        created = []
+        events = []
+
+        class RecordingPool(DummyPool):
+            def __init__(self, processes):
+                events.append('pool')
+                super(RecordingPool, self).__init__(processes)
+
+        def run(config_data):
+            if config_data.project_name == 'config_04':
+                raise EnvironmentError('migration failed')
+            self.assertTrue(config_data.no_deps)
+            created.append(config_data.project_name)
+            return [{'name': 'create_project', 'duration': 1}]
+
+        with patch('sys.stdout', self.stdout):
+            with patch.object(stages, 'install_requirements',
+                              side_effect=lambda config_data: events.append('install')):
+                with patch.object(stages, 'run', side_effect=run):
+                    results, installed = batch.run(projects, 2, pool_class=RecordingPool)
+        # The workers of each group are started after its requirements are installed
+        self.assertEqual(events, ['install', 'pool', 'install', 'pool', 'pool'])
+        self.assertEqual(len(installed), 2)
+        self.assertEqual(sorted(created), ['config_01', 'config_03', 'config_20'])
+        failed = [result for result in results if result['status'] != 'ok']
+        self.assertEqual(len(failed), 1)
+        self.assertTrue(failed[0]['error'].find('migration failed') > -1)
+        with open(failed[0]['log']) as log:
+            self.assertTrue(log.read().find('Traceback') > -1)
+
+        report = batch.format_report(results, installed, 60)
+        self.assertTrue(report.find('Projects: 3 created, 1 failed') > -1)
+        self.assertTrue(report.find('Requirement sets installed: 2') > -1)
+        self.assertTrue(report.find('Throughput: 3.00 projects/minute') > -1)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+
+from .base import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+
+import e2e  # NOQA
+import results  # NOQA
+import stress  # NOQA
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_percentile(self):
+        self.assertEqual(results.percentile([1.0], 95), 1.0)
+        self.assertEqual(results.percentile([1.0, 2.0, 3.0], 50), 2.0)
+        self.assertEqual(results.percentile([1.0, 2.0], 50), 1.5)
+        self.assertAlmostEqual(results.percentile([1.0, 2.0, 3.0, 4.0, 5.0], 90), 4.6)
+        self.assertEqual(results.percentile([1.0, 2.0, 3.0], 100), 3.0)
+
+    def test_stats(self):
+        stats = results.stats([3.0, 1.0, 2.0])
+        self.assertEqual((stats['min'], stats['median'], stats['max'], stats['runs']),
+                         (1.0, 2.0, 3.0, 3))
+        self.assertFalse('spread' in stats)
+
+        rounds = [[2.0, 2.0, 4.0], [1.0, 1.0], [3.0], [2.0]]
+        stats = results.stats(sum(rounds, []), rounds)
+        self.assertEqual(stats['min_median'], 1.0)
+        self.assertEqual(stats['spread'], 125.0)
+        # The machine was twice slower during the first round
+        stats = results.stats(sum(rounds, []), rounds, [2.0, 1.0, 3.0, 2.0])
+        self.assertEqual(stats['relative'], 1.0)
+        self.assertEqual(stats['spread'], 0.0)
+
+    def test_compare(self):
+        baseline = {
+            'same': {'median': 1.0}, 'slower': {'median': 1.0}, 'faster': {'median': 1.0},
+            'noisy': {'median': 1.0, 'spread': 30.0}, 'missing': {'median': 1.0},
+        }
+        current = {
+            'same': {'median': 1.05}, 'slower': {'median': 1.2}, 'faster': {'median': 0.5},
+            'noisy': {'median': 1.2}, 'new': {'median': 1.0},
+        }
+        rows = dict((row[0], row) for row in results.compare(baseline, current))
+        self.assertEqual(dict((name, row[4]) for name, row in rows.items()), {
+            'same': 'ok', 'slower': 'regression', 'faster': 'faster', 'noisy': 'noisy',
+            'missing': 'missing', 'new': 'new',
+        })
+        self.assertAlmostEqual(rows['slower'][3], 20.0)
+        self.assertEqual(rows['new'][1:4], (None, 1.0, None))
+        rows = dict((row[0], row) for row in results.compare(baseline, current, threshold=25))
+        self.assertEqual(rows['slower'][4], 'ok')
+
+    def _summaries(self, *throughputs):
+        return [{'concurrency': 2 ** position, 'throughput': throughput}
+                for position, throughput in enumerate(throughputs)]
+
+    def test_scaling_limit(self):
+        self.assertEqual(stress.scaling_limit(self._summaries(10, 19, 30, 31, 40)), 4)
+        self.assertEqual(stress.scaling_limit(self._summaries(10, 10.5)), 1)
+        self.assertEqual(stress.scaling_limit(self._summaries(10, 19, 30), gain=60), 2)
+        self.assertIsNone(stress.scaling_limit(self._summaries(10, 19, 30)))
+        self.assertIsNone(stress.scaling_limit(self._summaries(10)))
+        # No installation succeeds
+        self.assertEqual(stress.scaling_limit(self._summaries(0, 0)), 1)
+
+    def test_build_index(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        wheelhouse = os.path.join(directory, 'wheelhouse')
+        os.makedirs(wheelhouse)
+        wheels = ['Django-1.8.19-py2.py3-none-any.whl', 'django_cms-3.2.4-py2.py3-none-any.whl',
+                  'django_cms-3.2.5-py2.py3-none-any.whl']
+        for filename in wheels + ['build.log']:
+            open(os.path.join(wheelhouse, filename), 'w').close()
+
+        index = e2e.build_index(wheelhouse, directory)
+        self.assertEqual(index, os.path.join(directory, 'simple'))
+        self.assertEqual(sorted(os.listdir(index)), ['django', 'django-cms', 'index.html'])
+        with open(os.path.join(index, 'index.html')) as fd:
+            root = fd.read()
+        self.assertTrue('<a href="django/">django</a>' in root)
+        self.assertTrue('<a href="django-cms/">django-cms</a>' in root)
+        self.assertEqual(sorted(os.listdir(os.path.join(index, 'django-cms'))),
+                         ['django_cms-3.2.4-py2.py3-none-any.whl',
+                          'django_cms-3.2.5-py2.py3-none-any.whl', 'index.html'])
+        with open(os.path.join(index, 'django-cms', 'index.html')) as fd:
+            project = fd.read()
+        for filename in wheels[1:]:
+            self.assertTrue('<a href="{0}">{0}</a>'.format(filename) in project)
+            self.assertEqual(os.path.realpath(os.path.join(index, 'django-cms', filename)),
+                             os.path.realpath(os.path.join(wheelhouse, filename)))
+        self.assertFalse('Django' in project)
+
+    def test_wheelhouse_lock(self):
+        versions = e2e.locked_versions()
+        self.assertEqual(versions['django'], '1.8.19')
+        self.assertEqual(versions['django-cms'], '3.2.5')
+        requirements = (e2e.installer_requirements() +
+                        e2e.project_requirements(e2e.PROJECT_ARGS))
+        self.assertEqual(e2e.unlocked_requirements(requirements), [])
+        self.assertEqual(e2e.unlocked_requirements(['djangocms-unknown>=1.0', 'Django<1.9']),
+                         ['djangocms-unknown>=1.0'])
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import errno
+import os
+import shutil
+
+from mock import patch
+
+from djangocms_installer import config, install
+
+from .base import BaseTestClass
+
+
+class TestInstall(BaseTestClass):
+
+    def _parse(self, *args):
+        return config.parse(['-q', '-s', '-p' + self.project_dir] + list(args) + ['example_prj'])
+
+    def _fake_project(self, config_data):
+        os.makedirs(config_data.project_path)
+        with open(config_data.settings_path, 'w') as settings:
+            settings.write('SITE_ID = 1\n')
+
+    def test_stage_directory(self):
+        config_data = self._parse('--staging')
+        self.assertTrue(config_data.staging)
+        staging_directory = install.stage_directory(config_data)
+        try:
+            self.assertEqual(config_data.target_directory, self.project_dir)
+            self.assertEqual(config_data.project_directory, staging_directory)
+            self.assertEqual(config_data.settings_path,
+                             os.path.join(staging_directory, 'example_prj', 'settings.py'))
+            self.assertTrue(os.path.isdir(staging_directory))
+        finally:
+            shutil.rmtree(staging_directory, True)
+
+    def test_commit_staging_new_directory(self):
+        self._remove_project_dir()
+        self._create_project_dir()
+        target = os.path.join(self.project_dir, 'new', 'dir')
+        config_data = config.parse(['-q', '-p' + target, 'example_prj'])
+        staging_directory = install.stage_directory(config_data)
+        self._fake_project(config_data)
+        install.commit_staging(config_data)
+        self.assertFalse(os.path.exists(staging_directory))
+        self.assertEqual(config_data.project_directory, target)
+        self.assertTrue(os.path.exists(os.path.join(target, 'example_prj', 'settings.py')))
+
+    def test_commit_staging_cross_device(self):
+        target = os.path.join(self.project_dir, 'dir')
+        config_data = config.parse(['-q', '-p' + target, 'example_prj'])
+        staging_directory = install.stage_directory(config_data)
+        self._fake_project(config_data)
+        with patch('os.rename', side_effect=[OSError(errno.EXDEV, 'cross-device'), None]) as rename:
+            with patch('shutil.copytree') as copytree:
+                install.commit_staging(config_data)
+        self.assertEqual(copytree.call_count, 1)
+        self.assertEqual(rename.call_args[0][1], target)
+        self.assertFalse(os.path.exists(staging_directory))
+
+    def test_commit_staging_existing_directory(self):
+        with open(os.path.join(self.project_dir, 'README'), 'w') as readme:
+            readme.write('')
+        config_data = self._parse('--staging')
+        install.stage_directory(config_data)
+        self._fake_project(config_data)
+        install.commit_staging(config_data)
+        self.assertTrue(os.path.exists(os.path.join(self.project_dir, 'README')))
+        self.assertTrue(os.path.exists(os.path.join(self.project_dir, 'example_prj', 'settings.py')))
+
+    def test_cleanup_staging(self):
+        config_data = self._parse('--staging')
+        staging_directory = install.stage_directory(config_data)
+        self._fake_project(config_data)
+        with patch('sys.stdout', self.stdout):
+            install.cleanup_directory(config_data)
+        self.assertFalse(os.path.exists(staging_directory))
+        self.assertTrue(os.path.exists(self.project_dir))
+        self.assertEqual(config_data.project_directory, self.project_dir)
+
+    def _make_tree(self, root):
+        for path in ('a/b/c', 'a/d', 'e'):
+            os.makedirs(os.path.join(root, path))
+            with open(os.path.join(root, path, 'file.txt'), 'w') as fd:
+                fd.write(path)
+        os.symlink(os.path.join(root, 'e'), os.path.join(root, 'link'))
+        with open(os.path.join(root, 'top.txt'), 'w') as fd:
+            fd.write('top')
+
+    def test_remove_tree(self):
+        root = os.path.join(self.project_dir, 'tree')
+        self._make_tree(root)
+        install.remove_tree(root, jobs=2)
+        self.assertFalse(os.path.exists(root))
+
+    def test_bury_directory(self):
+        root = os.path.join(self.project_dir, 'example')
+        self._make_tree(root)
+        tombstone = install.bury_directory(root)
+        self.assertFalse(os.path.exists(root))
+        self.assertTrue(os.path.isdir(tombstone))
+        self.assertEqual(os.path.dirname(tombstone), self.project_dir)
+        self.assertTrue(os.path.basename(tombstone).startswith('.example.djangocms-tombstone-'))
+
+    def test_reap_tombstones(self):
+        for name in ('first', 'second'):
+            root = os.path.join(self.project_dir, name)
+            self._make_tree(root)
+            install.bury_directory(root)
+        os.makedirs(os.path.join(self.project_dir, 'keep'))
+        removed = install.reap_tombstones([self.project_dir])
+        self.assertEqual(len(removed), 2)
+        self.assertEqual(os.listdir(self.project_dir), ['keep'])
+
+    def test_remove_directory(self):
+        root = os.path.join(self.project_dir, 'example')
+        self._make_tree(root)
+        with patch.object(install, 'spawn_reaper') as reaper:
+            install.remove_directory(root)
+        self.assertFalse(os.path.exists(root))
+        tombstone = reaper.call_args[0][0][0]
+        self.assertTrue(os.path.isdir(tombstone))
+        self.assertEqual(install.reap_tombstones([tombstone]), [tombstone])
+
+    def test_spawn_reaper(self):
+        root = os.path.join(self.project_dir, 'example')
+        self._make_tree(root)
+        process = install.spawn_reaper([install.bury_directory(root)])
+        self.assertEqual(process.wait(), 0)
+        self.assertEqual(os.listdir(self.project_dir), [])
@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, print_function, unicode_literals
 
+import json
 import os
+import subprocess
 import sys
+import textwrap
 from subprocess import CalledProcessError
+from timeit import default_timer
 
 from mock import patch
 
 from djangocms_installer import config, install, main
 
-from .base import IsolatedTestClass, dj_ver, unittest
+from .base import BaseTestClass, IsolatedTestClass, dj_ver, unittest
 
 
 class TestMain(IsolatedTestClass):
@@ -106,3 +110,59 @@ class TestMain(IsolatedTestClass):
                                            'example_prj']
                     main.execute()
         self.assertFalse(os.path.exists(self.project_dir))
+
+
+class TestStartup(BaseTestClass):
+    # Informational commands may take this many times as long as starting a
+    # bare interpreter (about 5 times when importing only what they need):
+    # the comparison holds on slow or busy machines, while importing Django
+    # or pip at startup exceeds it
+    startup_factor = 10
+    # Runs of each command, the fastest one being compared
+    startup_runs = 5
+    # Modules only needed to create the project
+    lazy_modules = (
+        'django', 'cms', 'pip', 'tzlocal', 'multiprocessing', 'logging', 'packaging.specifiers',
+        'djangocms_installer.install', 'djangocms_installer.stages', 'djangocms_installer.django',
+        'djangocms_installer.batch', 'djangocms_installer.cache', 'djangocms_installer.server',
+    )
+
+    def _startup(self, *args):
+        script = textwrap.dedent("""
+            import json, sys
+            from djangocms_installer import main
+            sys.argv = ['djangocms'] + sys.argv[1:]
+            stdout, sys.stdout = sys.stdout, open('/dev/null', 'w')
+            main.execute()
+            sys.stdout = stdout
+            print(json.dumps({'modules': sorted(sys.modules)}))
+        """)
+        output = subprocess.check_output(
+            [sys.executable, '-c', script] + list(args), env=install.installer_env()
+        )
+        return json.loads(output.decode('utf-8').splitlines()[-1])
+
+    def _duration(self, args):
+        start = default_timer()
+        subprocess.check_call([sys.executable] + args, env=install.installer_env(),
+                              stdout=self.devnull)
+        return default_timer() - start
+
+    def test_startup_time(self):
+        command = ['-m', 'djangocms_installer', '-q', '--list-plugins', '-p', self.project_dir,
+                   'example_prj']
+        baseline = []
+        durations = []
+        with open(os.devnull, 'w') as self.devnull:
+            # Interleaved, so that both are slowed down alike by the machine load
+            for run in range(self.startup_runs):
+                baseline.append(self._duration(['-c', 'pass']))
+                durations.append(self._duration(command))
+        self.assertLess(min(durations), min(baseline) * self.startup_factor)
+
+    def test_info_commands_startup(self):
+        for option in ('--list-plugins', '--dump-requirements'):
+            result = self._startup('-q', option, '-p', self.project_dir, 'example_prj')
+            self.assertEqual(
+                [module for module in self.lazy_modules if module in result['modules']], []
+            )
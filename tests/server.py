@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import stat
+import subprocess
+import sys
+
+from mock import patch
+
+from djangocms_installer import install, main, server
+from djangocms_installer.config import data
+
+from .base import BaseTestClass
+
+
+class TestServer(BaseTestClass):
+
+    def _serve(self, max_requests):
+        socket_path = os.path.join(self.project_dir, 'installer.sock')
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'djangocms_installer', 'serve', '--socket', socket_path,
+             '--max-requests', str(max_requests)],
+            stdout=subprocess.PIPE, env=install.installer_env()
+        )
+        self.assertEqual(process.stdout.readline().decode('utf-8').strip(),
+                         'Listening on {0}'.format(socket_path))
+        return socket_path, process
+
+    def test_forward(self):
+        socket_path, process = self._serve(2)
+        project_path = os.path.join(self.project_dir, 'example_prj')
+
+        status = server.forward(socket_path, ['-q', '-P', '-p', project_path, 'example_prj'],
+                                self.stdout, self.stderr)
+        self.assertEqual(status, 0)
+        self.assertTrue('djangocms_installer will install and configure' in self.stdout.getvalue())
+
+        status = server.forward(socket_path, ['-q', '-p', project_path, 'test'],
+                                self.stdout, self.stderr)
+        self.assertEqual(status, 3)
+        self.assertTrue('Project name "test" is not a valid app name' in self.stderr.getvalue())
+
+        self.assertEqual(process.wait(), 0)
+        process.stdout.close()
+        self.assertFalse(os.path.exists(socket_path))
+
+    def test_forward_other_interpreter(self):
+        socket_path, process = self._serve(3)
+        project_path = os.path.join(self.project_dir, 'example_prj')
+        self.assertTrue(server.forward_available(socket_path))
+        other = {'executable': '/venv/bin/python', 'prefix': '/venv'}
+        with patch.object(server, '_interpreter', return_value=other):
+            self.assertFalse(server.forward_available(socket_path))
+            self.assertIsNone(server.forward(socket_path, ['-q', '-p', project_path, 'test'],
+                                             self.stdout, self.stderr))
+        self.assertEqual(self.stderr.getvalue(), '')
+        self.assertEqual(process.wait(), 0)
+        process.stdout.close()
+
+    def test_forward_removed_module(self):
+        modules_dir = os.path.join(self.project_dir, 'modules')
+        os.makedirs(modules_dir)
+        open(os.path.join(modules_dir, 'old_module.py'), 'w').close()
+        with patch.dict(os.environ, {'PYTHONPATH': modules_dir}):
+            socket_path, process = self._serve(1)
+        # Project names are checked against the modules found for each request
+        os.unlink(os.path.join(modules_dir, 'old_module.py'))
+        status = server.forward(
+            socket_path, ['-q', '-P', '-p', os.path.join(self.project_dir, 'old'), 'old_module'],
+            self.stdout, self.stderr
+        )
+        self.assertEqual(status, 0)
+        self.assertEqual(process.wait(), 0)
+        process.stdout.close()
+
+    def test_forward_unavailable(self):
+        socket_path = os.path.join(self.project_dir, 'installer.sock')
+        self.assertIsNone(server.forward(socket_path, ['-q', 'example_prj']))
+        self.assertFalse(server.forward_available(socket_path))
+
+    def test_forward_interactive(self):
+        socket_path = os.path.join(self.project_dir, 'installer.sock')
+        with patch.object(server.socket, 'socket') as client:
+            self.assertIsNone(server.forward(socket_path, ['-p', self.project_dir, 'example_prj']))
+            self.assertFalse(client.called)
+        self.assertTrue(server.non_interactive(['--no-input', 'example_prj'], {}))
+        self.assertTrue(server.non_interactive(['--config-file=project.ini', 'example_prj'], {}))
+        self.assertFalse(server.non_interactive(['--config-dump', 'project.ini'], {}))
+        self.assertTrue(server.non_interactive(
+            ['example_prj'], {'DJANGOCMS_INSTALLER_CONFIG_FILE': 'project.ini'}
+        ))
+
+    def test_bind_permissions(self):
+        socket_path = os.path.join(self.project_dir, 'installer.sock')
+        listener = server._bind(socket_path)
+        try:
+            self.assertEqual(stat.S_IMODE(os.stat(socket_path).st_mode), 0o600)
+        finally:
+            listener.close()
+            os.unlink(socket_path)
+
+    def test_execute_forward(self):
+        socket_path = os.path.join(self.project_dir, 'installer.sock')
+        argv = ['djangocms', '-q', '-p', self.project_dir, 'example_prj']
+        with patch.dict(os.environ, {data.SERVER_SOCKET_ENV: socket_path}):
+            with patch('sys.argv', argv):
+                # main imports the server module lazily
+                with patch('djangocms_installer.server.forward', return_value=5) as forward:
+                    self.assertEqual(main.execute(), 5)
+                    forward.assert_called_once_with(socket_path, argv[1:])
+
+    def test_preload(self):
+        self.assertEqual(server.preload(['djangocms_installer.api', 'not_installed_module']),
+                         ['djangocms_installer.api'])
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+from subprocess import CalledProcessError
+
+from mock import patch
+
+from djangocms_installer import main, simulate
+from djangocms_installer.config import data
+
+from .base import BaseTestClass
+
+
+class TestSimulate(BaseTestClass):
+
+    def _execute(self, *args):
+        project_directory = os.path.join(self.project_dir, 'project')
+        argv = ['djangocms', '--simulate', '--db=sqlite://localhost/project.db', '-len', '-q',
+                '-u', '--no-input', '--no-cache', '-p', project_directory] + list(args)
+        with patch('sys.stdout', self.stdout):
+            with patch('sys.stderr', self.stderr):
+                with patch('sys.argv', argv + ['example_prj']):
+                    main.execute()
+        return project_directory
+
+    def test_parse_latency(self):
+        self.assertEqual(simulate.parse_latency('0.5'),
+                         {'pip': 0.5, 'django-admin': 0.5, 'manage.py': 0.5})
+        self.assertEqual(simulate.parse_latency('1, pip=2'),
+                         {'pip': 2, 'django-admin': 1, 'manage.py': 1})
+        with self.assertRaises(ValueError):
+            simulate.parse_latency('python=1')
+        with self.assertRaises(ValueError):
+            simulate.parse_latency('-1')
+
+    def test_stub(self):
+        settings = {'latency': simulate.parse_latency('0'), 'fail': 'pip'}
+        with patch('sys.stderr', self.stderr):
+            self.assertEqual(simulate.stub('pip', ['install', 'django-cms'], settings), 1)
+        self.assertTrue('Simulated failure of pip install django-cms' in self.stderr.getvalue())
+
+        self.assertEqual(simulate.stub('django-admin', ['startproject', 'example_prj',
+                                                        self.project_dir], settings), 0)
+        for path in ('manage.py', 'example_prj/settings.py', 'example_prj/urls.py'):
+            self.assertTrue(os.path.exists(os.path.join(self.project_dir, path)))
+
+    def test_execute(self):
+        start = time.time()
+        project_directory = self._execute('--starting-page=yes', '--simulate-latency',
+                                          'pip=0.2')
+        self.assertTrue(time.time() - start >= 0.2)
+        self.assertTrue('All done!' in self.stdout.getvalue())
+        settings_path = os.path.join(project_directory, 'example_prj', 'settings.py')
+        with open(settings_path) as fd:
+            settings = fd.read()
+        compile(settings, settings_path, 'exec')
+        self.assertTrue('CMS_TEMPLATES = (' in settings)
+        for path in ('requirements.txt', 'example_prj/urls.py', 'example_prj/templates/base.html'):
+            self.assertTrue(os.path.exists(os.path.join(project_directory, path)))
+
+    def test_execute_failure(self):
+        with self.assertRaises(CalledProcessError):
+            self._execute('--simulate-fail', 'django-admin')
+        self.assertTrue('The installation failed.' in self.stdout.getvalue())
+        self.assertFalse(os.path.exists(os.path.join(self.project_dir, 'project')))
+
+    def test_stubs_directory(self):
+        class Options(object):
+            simulate = True
+            simulate_latency = '0.1'
+            simulate_fail = None
+            cache_dir = self.cache_dir
+
+        command = simulate.command(Options, 'manage.py')
+        self.assertEqual(command[0], sys.executable)
+        self.assertTrue(os.path.isfile(command[1]))
+        self.assertTrue(command[1].startswith(os.path.join(self.cache_dir, 'stubs')))
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(command[1])).st_mode), 0o700)
+        self.assertEqual(simulate.command(Options, 'manage.py'), command)
+        Options.simulate = False
+        self.assertIsNone(simulate.command(Options, 'manage.py'))
+
+    def test_stubs_directory_untrusted(self):
+        class Options(object):
+            simulate = True
+            simulate_latency = '0.2'
+            simulate_fail = None
+            cache_dir = self.cache_dir
+
+        # Shared directory writable by other users
+        shared = os.path.dirname(simulate.command(Options, 'pip')[1])
+        os.chmod(shared, 0o777)
+        with open(os.path.join(shared, 'pip'), 'w') as fd:
+            fd.write('raise SystemExit("Not the stand-in")')
+        with patch.object(simulate, '_private_directories', {}):
+            command = simulate.command(Options, 'pip')
+            self.assertFalse(command[1].startswith(shared))
+            self.assertTrue(os.path.basename(os.path.dirname(command[1])).startswith(
+                'djangocms-installer-stubs-'
+            ))
+            with open(command[1]) as fd:
+                self.assertTrue('simulate.stub' in fd.read())
+            self.assertEqual(simulate.command(Options, 'pip'), command)
+        shutil.rmtree(os.path.dirname(command[1]))
+
+    def setUp(self):
+        super(TestSimulate, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        # Stand-ins are written in the cache
+        self.environ = patch.dict(os.environ, {data.CACHE_DIR_ENV: self.cache_dir})
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.cache_dir, True)
+        super(TestSimulate, self).tearDown()
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+
+from mock import patch
+
+from djangocms_installer import config, stages
+from djangocms_installer.config.data import CHECKPOINT_FILE
+
+from .base import BaseTestClass
+
+
+class TestStages(BaseTestClass):
+
+    def setUp(self):
+        super(TestStages, self).setUp()
+        self.calls = []
+        self.fail_on = None
+        self.manifests = []
+
+    def _parse(self, *args):
+        return config.parse(['-q', '-p' + self.project_dir] + list(args) + ['example_prj'])
+
+    def _stage(self, name, filename=None):
+        def stage(config_data):
+            if self.fail_on == name:
+                raise EnvironmentError('{0} failed'.format(name))
+            self.calls.append(name)
+            self.manifests.append(stages.load_manifest(config_data))
+            if filename:
+                with open(os.path.join(config_data.project_directory, filename), 'w') as fd:
+                    fd.write(name)
+                return {'files': stages._file_outputs(config_data, [filename])}
+        return stage
+
+    def _stages(self):
+        return (
+            ('first', self._stage('first', 'first.txt'), None),
+            ('skipped', self._stage('skipped'), lambda config_data: False),
+            ('second', self._stage('second', 'second.txt'), None),
+            ('third', self._stage('third'), None),
+            ('fourth', self._stage('fourth', 'first.txt'), None),
+        )
+
+    def _run(self, config_data, progress=None):
+        with patch('sys.stdout', self.stdout):
+            with patch.object(stages, 'STAGES', self._stages()):
+                return stages.run(config_data, progress)
+
+    def test_run(self):
+        config_data = self._parse()
+        progress = []
+        executed = self._run(config_data, progress)
+        self.assertEqual(self.calls, ['first', 'second', 'third', 'fourth'])
+        self.assertEqual([stage['name'] for stage in executed],
+                         ['first', 'second', 'third', 'fourth'])
+        self.assertEqual(progress, ['first', 'second', 'third', 'fourth'])
+        # No checkpoint is written without --resume
+        self.assertEqual(self.manifests, [None] * 4)
+
+        # Manifest is updated after each stage and removed when done
+        self.manifests = []
+        config_data = self._parse('--resume', '-s')
+        self._run(config_data)
+        self.assertIsNone(self.manifests[0])
+        self.assertEqual([stage['name'] for stage in self.manifests[2]['stages']],
+                         ['first', 'second'])
+        self.assertEqual(self.manifests[2]['config'], stages.config_hash(config_data))
+        self.assertFalse(os.path.exists(os.path.join(self.project_dir, CHECKPOINT_FILE)))
+
+    def test_config_hash_simulate(self):
+        # A simulated failure is resumed without it
+        self.assertEqual(
+            stages.config_hash(self._parse('--simulate', '--simulate-fail', 'manage.py',
+                                           '--simulate-latency', '1')),
+            stages.config_hash(self._parse('--simulate'))
+        )
+
+    def test_resume(self):
+        config_data = self._parse('--resume')
+        self.fail_on = 'third'
+        with self.assertRaises(EnvironmentError):
+            self._run(config_data)
+        self.assertTrue(os.path.exists(os.path.join(self.project_dir, CHECKPOINT_FILE)))
+
+        # The non empty project directory is accepted when resuming
+        config_data = self._parse('--resume')
+        self.fail_on = None
+        self.calls = []
+        self._run(config_data)
+        self.assertEqual(self.calls, ['third', 'fourth'])
+        self.assertTrue(self.stdout.getvalue().find('Skipping second: already completed') > -1)
+
+    def test_resume_changed_output(self):
+        config_data = self._parse('--resume')
+        self.fail_on = 'third'
+        with self.assertRaises(EnvironmentError):
+            self._run(config_data)
+        with open(os.path.join(self.project_dir, 'second.txt'), 'w') as fd:
+            fd.write('changed')
+
+        self.fail_on = None
+        self.calls = []
+        self._run(self._parse('--resume'))
+        self.assertEqual(self.calls, ['second', 'third', 'fourth'])
+
+    def test_resume_rewritten_output(self):
+        config_data = self._parse('--resume')
+        self.fail_on = 'fourth'
+        with self.assertRaises(EnvironmentError):
+            self._run(config_data)
+        # fourth stage failed after rewriting a file created by the first one
+        with open(os.path.join(self.project_dir, 'first.txt'), 'w') as fd:
+            fd.write('fourth')
+
+        self.fail_on = None
+        self.calls = []
+        self._run(self._parse('--resume'))
+        self.assertEqual(self.calls, ['first', 'second', 'third', 'fourth'])
+
+    def test_resume_modified_settings(self):
+        args = ('--resume', '--simulate', '--no-cache', '-u', '--db=sqlite://localhost/project.db',
+                '-len')
+        with patch('sys.stdout', self.stdout):
+            with patch.object(stages.django, 'setup_database',
+                              side_effect=EnvironmentError('migrate failed')):
+                with self.assertRaises(EnvironmentError):
+                    stages.run(self._parse(*args))
+        package = os.path.join(self.project_dir, 'example_prj')
+        with open(os.path.join(package, 'settings.py'), 'a') as fd:
+            fd.write('\nDEBUG = False\n')
+        with open(os.path.join(package, 'local.py'), 'w') as fd:
+            fd.write('')
+
+        # The project is created again over the outputs of the previous run
+        with patch('sys.stdout', self.stdout):
+            executed = stages.run(self._parse(*args))
+        self.assertEqual([stage['name'] for stage in executed][:2],
+                         ['create_project', 'patch_settings'])
+        self.assertTrue(self.stdout.getvalue().find(
+            '{0} was modified after the create_project step'.format(
+                os.path.join('example_prj', 'settings.py'))
+        ) > -1)
+        with open(os.path.join(package, 'settings.py')) as fd:
+            self.assertFalse('DEBUG = False' in fd.read())
+        self.assertTrue(os.path.exists(os.path.join(package, 'local.py')))
+        self.assertFalse(os.path.exists(os.path.join(self.project_dir, CHECKPOINT_FILE)))
+
+    def test_resume_changed_config(self):
+        config_data = self._parse('--resume')
+        self.fail_on = 'third'
+        with self.assertRaises(EnvironmentError):
+            self._run(config_data)
+
+        with self.assertRaises(EnvironmentError) as error:
+            self._run(self._parse('--resume', '--bootstrap=yes'))
+        self.assertTrue(str(error.exception).find('different configuration') > -1)
+
+    def test_config_hash(self):
+        config_data = self._parse()
+        self.assertEqual(stages.config_hash(config_data),
+                         stages.config_hash(self._parse('--verbose')))
+        self.assertNotEqual(stages.config_hash(config_data),
+                            stages.config_hash(self._parse('--filer')))
+
+    def test_staging_resume_exclusive(self):
+        with patch('sys.stderr', self.stderr):
+            with self.assertRaises(SystemExit):
+                self._parse('--resume', '--staging')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+
+from mock import patch
+
+from djangocms_installer import install, stages, warm
+
+from .base import BaseTestClass
+from .batch import DummyPool
+
+
+class TestWarm(BaseTestClass):
+
+    def _cleanup(self, project_jobs):
+        for config_data in project_jobs:
+            shutil.rmtree(config_data.project_directory, True)
+
+    def test_combinations(self):
+        combinations = list(warm.combinations())
+        self.assertEqual(len(combinations), 24)
+        self.assertEqual(combinations[0], {
+            'cms_version': '3.2', 'django_version': '1.8', 'filer': False,
+            'db': 'sqlite://localhost/project.db',
+        })
+        self.assertEqual(len(set(
+            (combination['cms_version'], combination['django_version'])
+            for combination in combinations
+        )), 4)
+
+    def test_is_installed(self):
+        combination = {'cms_version': '3.2', 'django_version': '1.8'}
+        versions = {'Django': '1.8.13', 'django-cms': '3.2.5'}
+        with patch.object(warm, 'distribution_version', versions.get):
+            self.assertTrue(warm.is_installed(combination))
+            self.assertFalse(warm.is_installed({'cms_version': '3.3', 'django_version': '1.8'}))
+            self.assertFalse(warm.is_installed({'cms_version': '3.2', 'django_version': '1.9'}))
+        with patch.object(warm, 'distribution_version', return_value=None):
+            self.assertFalse(warm.is_installed(combination))
+
+    def test_jobs(self):
+        with patch.object(warm, 'is_installed', return_value=False):
+            wheel_jobs, project_jobs = warm.jobs('/shared')
+        self.assertEqual(len(wheel_jobs), 24)
+        self.assertEqual(project_jobs, [])
+        self.assertEqual(wheel_jobs[0]['cache_dir'], '/shared')
+        self.assertTrue('psycopg2' in wheel_jobs[1]['requirements'].split())
+        self.assertTrue(wheel_jobs[3]['name'].startswith('wheels cms-3.2 django-1.8 filer'))
+
+        with patch.object(warm, 'is_installed', return_value=True):
+            wheel_jobs, project_jobs = warm.jobs(None, ['example_prj'])
+        try:
+            self.assertEqual(len(project_jobs), 24)
+            self.assertIsNone(wheel_jobs[0]['cache_dir'])
+            self.assertEqual(project_jobs[0].project_name, 'example_prj')
+            self.assertTrue(project_jobs[0].no_deps)
+            # Output is not written by the workers, which may be threads
+            self.assertTrue(project_jobs[0].quiet)
+            self.assertFalse(project_jobs[0].no_sync)
+            self.assertTrue(project_jobs[1].no_sync)
+        finally:
+            self._cleanup(project_jobs)
+
+    def test_run(self):
+        def wheels(requirements, pip_options='', cache_dir=None):
+            if 'mysqlclient' in requirements.split():
+                raise EnvironmentError('mysql_config not found')
+
+        with patch.object(warm, 'is_installed', lambda combination: (
+                combination['cms_version'] == '3.2' and combination['django_version'] == '1.8')):
+            with patch.object(install, 'wheels', wheels):
+                with patch.object(stages, 'warm', return_value=[]) as stages_warm:
+                    with patch('sys.stdout'):
+                        results = warm.run(project_names=['example_prj'],
+                                           pool_class=DummyPool)
+        self.assertEqual(len(results), 30)
+        self.assertEqual(stages_warm.call_count, 6)
+        failed = [result for result in results if result['status'] != 'ok']
+        self.assertEqual(len(failed), 8)
+        self.assertTrue(failed[0]['error'].endswith('mysql_config not found'))
+        # Temporary projects are removed
+        for args, kwargs in stages_warm.call_args_list:
+            self.assertFalse(os.path.exists(args[0].project_directory))
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import os
+
+from mock import patch
+
+from djangocms_installer import workqueue
+
+from .base import BaseTestClass
+
+
+class TestWorkQueue(BaseTestClass):
+
+    def _queue(self, *names):
+        return os.path.join(self.project_dir, 'queue', *names)
+
+    def _jobs(self, name):
+        return sorted(os.listdir(self._queue(name)))
+
+    def test_claim(self):
+        first = workqueue.submit(self._queue(), 'first', ['first_prj'])
+        second = workqueue.submit(self._queue(), 'second', ['second_prj'])
+        self.assertEqual(self._jobs('pending'), sorted(['{0}.json'.format(first),
+                                                        '{0}.json'.format(second)]))
+
+        job = workqueue.claim(self._queue(), 'node:1')
+        self.assertEqual(job['id'], min(first, second))
+        self.assertEqual(job['attempts'], 1)
+        self.assertEqual(job['worker'], 'node:1')
+        self.assertEqual(self._jobs('claimed'), ['{0}.json'.format(job['id'])])
+        with open(self._queue('claimed', '{0}.json'.format(job['id']))) as fd:
+            self.assertEqual(json.load(fd)['worker'], 'node:1')
+
+        self.assertEqual(workqueue.claim(self._queue())['id'], max(first, second))
+        self.assertIsNone(workqueue.claim(self._queue()))
+        self.assertEqual(self._jobs('tmp'), [])
+
+    def test_requeue_expired(self):
+        job_id = workqueue.submit(self._queue(), 'first', ['first_prj'])
+        workqueue.claim(self._queue())
+        claimed = self._queue('claimed', '{0}.json'.format(job_id))
+        self.assertEqual(workqueue.requeue_expired(self._queue(), lease=60), [])
+
+        # The worker died: its lease is not renewed anymore
+        os.utime(claimed, (0, 0))
+        self.assertEqual(workqueue.requeue_expired(self._queue(), lease=60), [job_id])
+        self.assertEqual(self._jobs('pending'), ['{0}.json'.format(job_id)])
+
+        job = workqueue.claim(self._queue())
+        self.assertEqual(job['attempts'], 2)
+        os.utime(claimed, (0, 0))
+        self.assertEqual(workqueue.requeue_expired(self._queue(), lease=60, max_attempts=2), [])
+        self.assertEqual(self._jobs('claimed'), [])
+        with open(self._queue('failed', '{0}.json'.format(job_id))) as fd:
+            failed = json.load(fd)
+        self.assertEqual(failed['status'], 'error')
+        self.assertEqual(failed['error'], 'Lease expired 2 times')
+
+    def test_claim_stale_mtime(self):
+        job_id = workqueue.submit(self._queue(), 'first', ['first_prj'])
+        # Submitted long before being claimed
+        os.utime(self._queue('pending', '{0}.json'.format(job_id)), (0, 0))
+        job = workqueue.claim(self._queue(), 'node:1')
+        self.assertEqual(workqueue.requeue_expired(self._queue(), lease=60), [])
+        self.assertEqual(self._jobs('claimed'), ['{0}.json'.format(job_id)])
+        self.assertEqual(self._jobs('tmp'), [])
+
+        # The job file is requeued away while being claimed
+        workqueue._release(self._queue(), self._queue('claimed', '{0}.json'.format(job_id)), job)
+        workqueue.submit(self._queue(), 'second', ['second_prj'])
+        with patch.object(workqueue, '_read_json', side_effect=IOError):
+            self.assertIsNone(workqueue.claim(self._queue(), 'node:1'))
+
+        # The worker died while claiming the job
+        claiming = self._jobs('tmp')[0]
+        self.assertTrue(claiming.endswith('.claiming'))
+        self.assertEqual(workqueue.requeue_expired(self._queue(), lease=60), [])
+        token, claimed, suffix = claiming.split('.')
+        os.rename(self._queue('tmp', claiming),
+                  self._queue('tmp', '{0}.0.claiming'.format(token)))
+        second = workqueue.requeue_expired(self._queue(), lease=60)
+        self.assertEqual(self._jobs('pending'), ['{0}.json'.format(second[0])])
+        self.assertEqual(self._jobs('tmp'), [])
+
+    def test_work(self):
+        cleanup = workqueue.submit(self._queue(), 'cleanup', ['cleanup', self.project_dir])
+        invalid = workqueue.submit(self._queue(), 'invalid', ['--invalid-option'])
+        results = workqueue.work(self._queue(), lease=3, exit_when_empty=True)
+        self.assertEqual([(result['id'], result['status']) for result in results],
+                         [(cleanup, 'ok'), (invalid, 'error')])
+        self.assertEqual(self._jobs('done'), ['{0}.json'.format(cleanup)])
+        self.assertEqual(self._jobs('failed'), ['{0}.json'.format(invalid)])
+        self.assertEqual(self._jobs('claimed'), [])
+        with open(self._queue('failed', '{0}.json'.format(invalid))) as fd:
+            failed = json.load(fd)
+        self.assertEqual(failed['returncode'], 2)
+        self.assertTrue(failed['duration'] > 0)
+        with open(failed['log']) as fd:
+            self.assertTrue('--invalid-option' in fd.read())
+
+        workqueue.submit(self._queue(), 'cleanup', ['cleanup', self.project_dir])
+        workqueue.submit(self._queue(), 'cleanup', ['cleanup', self.project_dir])
+        self.assertEqual(len(workqueue.work(self._queue(), max_jobs=1)), 1)
+        self.assertEqual(len(self._jobs('pending')), 1)
+
+    def test_retry_removes_partial_project(self):
+        directory = os.path.join(self.project_dir, 'partial')
+        job_id = workqueue.submit(self._queue(), 'cleanup', ['cleanup', self.project_dir],
+                                  directory)
+        workqueue.claim(self._queue())
+        # The worker died while creating the project
+        os.makedirs(os.path.join(directory, 'example_prj'))
+        os.utime(self._queue('claimed', '{0}.json'.format(job_id)), (0, 0))
+        workqueue.requeue_expired(self._queue(), lease=60)
+
+        results = workqueue.work(self._queue(), lease=3, exit_when_empty=True)
+        self.assertEqual(results[0]['status'], 'ok')
+        self.assertEqual(results[0]['attempts'], 2)
+        self.assertFalse(os.path.exists(directory))
+        with open(results[0]['log']) as fd:
+            self.assertTrue('Removing {0} left by attempt 1'.format(directory) in fd.read())
+
+    def test_release_claimed_again(self):
+        job_id = workqueue.submit(self._queue(), 'first', ['first_prj'])
+        claimed = self._queue('claimed', '{0}.json'.format(job_id))
+        first = workqueue.claim(self._queue(), 'node:1')
+        os.utime(claimed, (0, 0))
+        workqueue.requeue_expired(self._queue(), lease=60)
+        second = workqueue.claim(self._queue(), 'node:2')
+
+        # The first worker completes after losing its lease: the new claim is kept
+        workqueue._release(self._queue(), claimed, first)
+        with open(claimed) as fd:
+            self.assertEqual(json.load(fd)['worker'], 'node:2')
+        workqueue._release(self._queue(), claimed, second)
+        self.assertEqual(self._jobs('claimed'), [])
+        self.assertEqual(self._jobs('tmp'), [])